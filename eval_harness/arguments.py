@@ -99,6 +99,110 @@ class WorkflowArguments:
         default=True,
         metadata={"help":"Allow code evaluation to execute external/untrusted Python code on your machine"}
     )
+    sandbox_backend: Optional[str] = field(
+        default="forkserver",
+        metadata={"help":"How Python code evaluation creates the disposable process of each execution, from: "
+                  + "fork, forkserver, spawn or subprocess"}
+    )
+    execution_cache_path: Optional[str] = field(
+        default="~/.cache/eval_harness/executions.sqlite",
+        metadata={"help":"Path of the on-disk cache of execution results shared across runs and tasks, "
+                  + "pass an empty string to disable it"}
+    )
+    execution_cache_size: Optional[int] = field(
+        default=2048,
+        metadata={"help":"Maximum size of the execution cache in MB, least recently used results are evicted first"}
+    )
+    deduplicate_candidates: Optional[bool] = field(
+        default=True,
+        metadata={"help":"Execute identical candidates, or Python candidates that only differ in comments or "
+                  + "formatting, once and share their result"}
+    )
+    calibrate_timeouts: Optional[bool] = field(
+        default=False,
+        metadata={"help":"Derive the timeout of every problem from the runtime of its canonical solution "
+                  + "(HumanEval, HumanEval+, MBPP, HumanEvalPack and Mercury)"}
+    )
+    timeout_multiplier: Optional[float] = field(
+        default=10.0,
+        metadata={"help":"Calibrated timeouts are this multiple of the runtime of the canonical solution"}
+    )
+    timeout_floor: Optional[float] = field(
+        default=0.5,
+        metadata={"help":"Smallest calibrated timeout in seconds"}
+    )
+    timeout_cache_path: Optional[str] = field(
+        default="~/.cache/eval_harness/reference_runtimes.json",
+        metadata={"help":"Path of the on-disk cache of canonical solution runtimes used for calibration"}
+    )
+    memory_limit: Optional[int] = field(
+        default=4096,
+        metadata={"help":"Memory in MB each executed candidate may use, 0 disables the limit"}
+    )
+    cpu_limit: Optional[float] = field(
+        default=None,
+        metadata={"help":"CPU seconds each executed candidate may use, defaults to one second above its timeout, 0 disables the limit"}
+    )
+    nproc_limit: Optional[int] = field(
+        default=0,
+        metadata={"help":"RLIMIT_NPROC of each executed candidate, which counts all processes and threads of the user, 0 disables the limit"}
+    )
+    cpu_budget: Optional[float] = field(
+        default=None,
+        metadata={"help":"Cores that concurrently executed MultiPL-E, HumanEval-XL, MxEval and HumanEvalPack candidates "
+                  + "may keep busy, defaults to all usable cores"}
+    )
+    memory_budget: Optional[int] = field(
+        default=None,
+        metadata={"help":"Memory in MB that concurrently executed candidates may use, defaults to 75% of the physical memory"}
+    )
+    language_costs_path: Optional[str] = field(
+        default="~/.cache/eval_harness/language_costs.json",
+        metadata={"help":"Path of the on-disk cores and memory used by executions of every language, "
+                  + "learned to admit executions against the budgets"}
+    )
+    evaluation_journal_path: Optional[str] = field(
+        default=None,
+        metadata={"help":"Path of an append-only JSON lines journal of every execution result as it arrives, "
+                  + "used by --resume_evaluation to skip candidates executed by an interrupted run"}
+    )
+    resume_evaluation: Optional[bool] = field(
+        default=False,
+        metadata={"help":"Reuse the results in evaluation_journal_path instead of executing their candidates again"}
+    )
+    persistent_workers: Optional[bool] = field(
+        default=False,
+        metadata={"help":"Run MultiPL-E candidates of languages with a persistent runner (Java, JavaScript, TypeScript, Scala, C#, F#, Julia, Clojure, R) on long-lived "
+                  + "worker processes instead of one process per candidate, once tests/test_worker_pools.py passes on the "
+                  + "installed toolchains"}
+    )
+    precompiled_headers: Optional[bool] = field(
+        default=True,
+        metadata={"help":"Compile C++ candidates against a precompiled header of the includes they start with"}
+    )
+    build_output_dir: Optional[str] = field(
+        default=None,
+        metadata={"help":"Directory the binaries of compiled candidates are written to, e.g. a tmpfs such as /dev/shm, "
+                  + "defaults to the directory of their source"}
+    )
+    native_compilation: Optional[bool] = field(
+        default=False,
+        metadata={"help":"Compile Haskell candidates with `ghc -O0` and OCaml candidates with `ocamlfind ocamlopt` instead of "
+                  + "running them with `runghc` and the `ocaml` toplevel"}
+    )
+    julia_sysimage: Optional[str] = field(
+        default=None,
+        metadata={"help":"Sysimage Julia candidates are run with, e.g. one built with PackageCompiler with `Test` compiled ahead of time"}
+    )
+    execution_results_path: Optional[str] = field(
+        default=None,
+        metadata={"help":"Directory to save the execution results of every completion of MultiPL-E, HumanEval-XL "
+                  + "and MxEval tasks, as one <task>.jsonl file per task"}
+    )
+    resource_report_path: Optional[str] = field(
+        default=None,
+        metadata={"help":"Path to save a JSON report of the slowest and most memory-hungry problems of every task"}
+    )
     generation_only: Optional[bool] = field(
         default=False,
         metadata={"help":"Do code generation but no evaluation"}
@@ -5,6 +5,7 @@ import warnings
 from typing import List
 from eval_harness import tasks
 from eval_harness.generation import get_generations
+from eval_harness.tasks.custom_metrics import resource_report
 
 _WARNING = """
 ################################################################################
@@ -77,8 +78,43 @@ class Evaluator:
 
         if self.allow_code_execution and task.requires_execution:
             os.environ["HF_ALLOW_CODE_EVAL"] = "1"
+            os.environ["EVAL_HARNESS_SANDBOX_BACKEND"] = self.args.sandbox_backend
+            os.environ["EVAL_HARNESS_EXECUTION_CACHE"] = self.args.execution_cache_path or ""
+            os.environ["EVAL_HARNESS_EXECUTION_CACHE_SIZE"] = str(self.args.execution_cache_size)
+            os.environ["EVAL_HARNESS_DEDUPLICATE"] = "1" if self.args.deduplicate_candidates else "0"
+            os.environ["EVAL_HARNESS_CALIBRATE_TIMEOUTS"] = "1" if self.args.calibrate_timeouts else "0"
+            os.environ["EVAL_HARNESS_TIMEOUT_MULTIPLIER"] = str(self.args.timeout_multiplier)
+            os.environ["EVAL_HARNESS_TIMEOUT_FLOOR"] = str(self.args.timeout_floor)
+            os.environ["EVAL_HARNESS_TIMEOUT_CACHE"] = self.args.timeout_cache_path
+            os.environ["EVAL_HARNESS_MEMORY_LIMIT"] = str(self.args.memory_limit)
+            os.environ["EVAL_HARNESS_CPU_LIMIT"] = "" if self.args.cpu_limit is None else str(self.args.cpu_limit)
+            os.environ["EVAL_HARNESS_NPROC_LIMIT"] = str(self.args.nproc_limit)
+            os.environ["EVAL_HARNESS_CPU_BUDGET"] = "" if self.args.cpu_budget is None else str(self.args.cpu_budget)
+            os.environ["EVAL_HARNESS_MEMORY_BUDGET"] = "" if self.args.memory_budget is None else str(self.args.memory_budget)
+            os.environ["EVAL_HARNESS_LANGUAGE_COSTS"] = self.args.language_costs_path
+            if self.args.resume_evaluation and not self.args.evaluation_journal_path:
+                raise ValueError("--resume_evaluation requires the --evaluation_journal_path of the interrupted run")
+            os.environ["EVAL_HARNESS_TASK"] = task_name
+            os.environ["EVAL_HARNESS_JOURNAL"] = self.args.evaluation_journal_path or ""
+            os.environ["EVAL_HARNESS_RESUME"] = "1" if self.args.resume_evaluation else "0"
+            os.environ["EVAL_HARNESS_PERSISTENT_WORKERS"] = "1" if self.args.persistent_workers else "0"
+            os.environ["EVAL_HARNESS_PRECOMPILED_HEADERS"] = "1" if self.args.precompiled_headers else "0"
+            os.environ["EVAL_HARNESS_BUILD_OUTPUT_DIR"] = self.args.build_output_dir or ""
+            os.environ["EVAL_HARNESS_NATIVE_COMPILATION"] = "1" if self.args.native_compilation else "0"
+            os.environ["EVAL_HARNESS_JULIA_SYSIMAGE"] = self.args.julia_sysimage or ""
+            os.environ["EVAL_HARNESS_EXECUTION_RESULTS"] = (
+                os.path.join(self.args.execution_results_path, f"{task_name}.jsonl")
+                if self.args.execution_results_path
+                else ""
+            )
         print("Evaluating generations...")
+        resource_report.reset()
         results = task.process_results(generations, references)
+        report = resource_report.summary()
+        if report is not None:
+            resource_report.print_summary(task_name, report)
+            if self.args.resource_report_path:
+                resource_report.save(self.args.resource_report_path, task_name, report)
         return results
 
     def save_json_files(
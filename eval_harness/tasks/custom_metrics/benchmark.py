@@ -0,0 +1,188 @@
+"""Micro-benchmarks for the code execution layer.
+
+Usage:
+    python -m eval_harness.tasks.custom_metrics.benchmark sandbox --backends fork forkserver spawn subprocess
+    python -m eval_harness.tasks.custom_metrics.benchmark subprocess --n_runs 200
+    python -m eval_harness.tasks.custom_metrics.benchmark native --languages hs ml --n_runs 5
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from eval_harness.tasks.custom_metrics.execute import BACKENDS, run_job
+from eval_harness.tasks.custom_metrics.multiple_metrics import safe_subprocess
+from eval_harness.tasks.custom_metrics.multiple_metrics.containerized_eval import eval_string_script
+
+SANDBOX_PROGRAMS = {
+    "passed": "def add(a, b):\n    return a + b\n\nassert add(1, 2) == 3\n",
+    "failed": "def add(a, b):\n    return a - b\n\nassert add(1, 2) == 3\n",
+    "timed out": "while True:\n    pass\n",
+}
+
+# MultiPL-E style programs of the languages with a native compilation mode: a
+# typical candidate, and one whose run time dominates.
+NATIVE_PROGRAMS = {
+    "hs": {
+        "typical": (
+            "add :: Int -> Int -> Int\n"
+            "add a b = a + b\n\n"
+            "main :: IO ()\n"
+            "main = do\n"
+            "  let candidate = add\n"
+            "  if candidate 1 2 == 3 then pure () else error \"candidate 1 2 == 3\"\n"
+            "  if candidate 7 5 == 12 then pure () else error \"candidate 7 5 == 12\"\n"
+        ),
+        "busy": (
+            "collatz :: Int -> Int\n"
+            "collatz n = go n 0 where\n"
+            "  go 1 k = k\n"
+            "  go m k = go (if even m then m `div` 2 else 3 * m + 1) (k + 1)\n\n"
+            "main :: IO ()\n"
+            "main = do\n"
+            "  let candidate = collatz\n"
+            "  if maximum (map candidate [1 .. 100000]) == 350 then pure () else error \"collatz\"\n"
+        ),
+    },
+    "ml": {
+        "typical": (
+            "let add (a : int) (b : int) : int = a + b\n\n"
+            "let assertions =\n"
+            "  assert (add 1 2 = 3);\n"
+            "  assert (add 7 5 = 12);\n"
+            "  ()\n"
+        ),
+        "busy": (
+            "let collatz (n : int) : int =\n"
+            "  let rec go m k = if m = 1 then k else go (if m mod 2 = 0 then m / 2 else 3 * m + 1) (k + 1) in\n"
+            "  go n 0\n\n"
+            "let assertions =\n"
+            "  let longest = ref 0 in\n"
+            "  for n = 1 to 100000 do longest := max !longest (collatz n) done;\n"
+            "  assert (!longest = 350);\n"
+            "  ()\n"
+        ),
+    },
+}
+
+# The commands each mode of the evaluators of NATIVE_PROGRAMS needs.
+NATIVE_TOOLCHAINS = {
+    "hs": {"interpreted": ["runghc"], "native": ["ghc"]},
+    "ml": {"interpreted": ["ocaml"], "native": ["ocamlfind"]},
+}
+
+
+def benchmark_sandbox(backends, n_jobs, num_workers, timeout):
+    """Runs `n_jobs` check programs on every backend and prints the throughput."""
+    programs = [SANDBOX_PROGRAMS["passed"], SANDBOX_PROGRAMS["failed"]]
+    for backend in backends:
+        # Warm up, so that the forkserver backend is measured with its zygotes started.
+        for expected, program in SANDBOX_PROGRAMS.items():
+            result = run_job("check_program", (program, timeout), timeout, backend=backend) or "timed out"
+            if result.split(":")[0] != expected.split(":")[0]:
+                raise RuntimeError(f"{backend}: expected {expected!r}, got {result!r}")
+
+        def job(i):
+            return run_job("check_program", (programs[i % len(programs)], timeout), timeout, backend=backend)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            results = list(executor.map(job, range(n_jobs)))
+        elapsed = time.perf_counter() - start
+        n_passed = sum(result == "passed" for result in results)
+        print(
+            f"{backend:>10}: {n_jobs} jobs in {elapsed:.2f}s "
+            f"({n_jobs / elapsed:.1f} jobs/s, {n_passed} passed)"
+        )
+
+
+def benchmark_subprocess(n_runs, num_workers):
+    """Runs `n_runs` trivial programs with safe_subprocess.run and prints the latency."""
+    commands = [["true"], ["bash", "-c", "echo ok"]]
+    for command in commands:
+        def job(i):
+            start = time.perf_counter()
+            safe_subprocess.run(command, timeout_seconds=5)
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            latencies = sorted(executor.map(job, range(n_runs)))
+        elapsed = time.perf_counter() - start
+        print(
+            f"{' '.join(command):>14}: {n_runs} runs in {elapsed:.2f}s "
+            f"(median {1000 * latencies[len(latencies) // 2]:.1f}ms, max {1000 * latencies[-1]:.1f}ms)"
+        )
+
+
+def benchmark_native(languages, n_runs):
+    """
+    Evaluates the NATIVE_PROGRAMS of `languages` `n_runs` times with and
+    without EVAL_HARNESS_NATIVE_COMPILATION and prints the median timings of
+    each mode, and which one is faster.
+    """
+    previous = os.environ.get("EVAL_HARNESS_NATIVE_COMPILATION")
+    try:
+        for language in languages:
+            for name, program in NATIVE_PROGRAMS[language].items():
+                wall_times = {}
+                for mode, commands in NATIVE_TOOLCHAINS[language].items():
+                    missing = [command for command in commands if shutil.which(command) is None]
+                    if missing:
+                        print(f"{language:>3} {name:>8} {mode:>11}: skipped, {', '.join(missing)} not installed")
+                        continue
+                    os.environ["EVAL_HARNESS_NATIVE_COMPILATION"] = "1" if mode == "native" else "0"
+                    results = [eval_string_script(language, program) for _ in range(n_runs)]
+                    statuses = sorted({result["status"] for result in results})
+                    wall_times[mode] = statistics.median(result["wall_time"] for result in results)
+                    compile_time = statistics.median(result["compile_time"] for result in results)
+                    run_time = statistics.median(result["run_time"] for result in results)
+                    print(
+                        f"{language:>3} {name:>8} {mode:>11}: median {wall_times[mode]:.2f}s "
+                        f"(compile {compile_time:.2f}s, run {run_time:.2f}s), status {', '.join(statuses)}"
+                    )
+                if len(wall_times) == 2:
+                    fastest = min(wall_times, key=wall_times.get)
+                    ratio = max(wall_times.values()) / max(min(wall_times.values()), 1e-9)
+                    print(f"{language:>3} {name:>8}: {fastest} is {ratio:.1f}x faster")
+    finally:
+        if previous is None:
+            os.environ.pop("EVAL_HARNESS_NATIVE_COMPILATION", None)
+        else:
+            os.environ["EVAL_HARNESS_NATIVE_COMPILATION"] = previous
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    sandbox = subparsers.add_parser("sandbox", help="Compare the Python sandbox backends")
+    sandbox.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    sandbox.add_argument("--n_jobs", type=int, default=500)
+    sandbox.add_argument("--num_workers", type=int, default=min(16, max(1, os.cpu_count() - 1)))
+    sandbox.add_argument("--timeout", type=float, default=3.0)
+
+    subprocess = subparsers.add_parser("subprocess", help="Measure the latency of safe_subprocess.run")
+    subprocess.add_argument("--n_runs", type=int, default=200)
+    subprocess.add_argument("--num_workers", type=int, default=min(16, max(1, os.cpu_count() - 1)))
+
+    native = subparsers.add_parser(
+        "native", help="Compare interpreting Haskell and OCaml with compiling them to native binaries"
+    )
+    native.add_argument("--languages", nargs="+", choices=list(NATIVE_PROGRAMS), default=list(NATIVE_PROGRAMS))
+    native.add_argument("--n_runs", type=int, default=5)
+
+    args = parser.parse_args()
+    if args.benchmark == "sandbox":
+        benchmark_sandbox(args.backends, args.n_jobs, args.num_workers, args.timeout)
+    elif args.benchmark == "subprocess":
+        benchmark_subprocess(args.n_runs, args.num_workers)
+    elif args.benchmark == "native":
+        benchmark_native(args.languages, args.n_runs)
+
+
+if __name__ == "__main__":
+    main()
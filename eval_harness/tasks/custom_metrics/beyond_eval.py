@@ -1,30 +1,20 @@
 # coding: utf-8
 
 # The Beyond metric estimates the Beyond@k metric for code synthesis efficiency.
-# The sandbox is inspired by OpenAI's release
+# Samples are executed in the shared sandbox of custom_metrics/execute.py, which
+# is inspired by OpenAI's release
 # https://github.com/openai/human-eval/blob/master/human_eval/execution.py
 
-from concurrent.futures import ProcessPoolExecutor
-from multiprocessing import (
-    Manager, 
-    Process
-)
-from typing import (
-    Optional, 
-    Dict
-)
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
 from tqdm import tqdm
+from eval_harness.tasks.custom_metrics import resource_report
+from eval_harness.tasks.custom_metrics.execute import run_job_with_resources
+from eval_harness.tasks.custom_metrics.timeout_calibration import calibrated_timeout
 import numpy as np
-import faulthandler
-import contextlib
 import itertools
-import platform
-import tempfile
-import signal
 import json
-import time
 import os
-import io
 
 CITATION = """
 @article{du2024mercury,
@@ -35,278 +25,30 @@ CITATION = """
 }
 """
 
-# Timeout Exception
-class TimeoutException(Exception):
-    """ Raise for TimeoutException """
-    pass
-
-# Redirect stdin
-class RedirectStdin(contextlib._RedirectStream):
-    """Context manager for temporarily receiving stdin from another source."""
-    _stream = 'stdin'
-
-# WriteOnly IO
-class WriteOnlyStringIO(io.StringIO):
-    """ StringIO that throws an exception when it's read from """
-
-    def read(self, *args, **kwargs):
-        raise IOError
-
-    def readline(self, *args, **kwargs):
-        raise IOError
-
-    def readlines(self, *args, **kwargs):
-        raise IOError
-
-    def readable(self, *args, **kwargs):
-        """ Returns True if the IO object can be read. """
-        return False
-
 class Sandbox(object):
-    @staticmethod
-    @contextlib.contextmanager
-    def time_limit(seconds: float):
-        def signal_handler(signum, frame):
-            raise TimeoutException("Timed out!")
-
-        signal.setitimer(signal.ITIMER_REAL, seconds)
-        signal.signal(signal.SIGALRM, signal_handler)
-        try:
-            yield
-        finally:
-            signal.setitimer(signal.ITIMER_REAL, 0)
-
-    @staticmethod
-    @contextlib.contextmanager
-    def swallow_io():
-        stream = WriteOnlyStringIO()
-        with contextlib.redirect_stdout(stream):
-            with contextlib.redirect_stderr(stream):
-                with RedirectStdin(stream):
-                    yield
-
-    @staticmethod
-    @contextlib.contextmanager
-    def create_tempdir():
-        with tempfile.TemporaryDirectory() as dirname:
-            with Sandbox.chdir(dirname):
-                yield dirname
-
-    @staticmethod
-    @contextlib.contextmanager
-    def chdir(root):
-        if root == ".":
-            yield
-            return
-        cwd = os.getcwd()
-        os.chdir(root)
-        try:
-            yield
-        except BaseException as exc:
-            raise exc
-        finally:
-            os.chdir(cwd)
-
-    @staticmethod
-    def reliability_guard(maximum_memory_bytes: Optional[int] = None):
-        """
-        This disables various destructive functions and prevents the generated code from interfering with the test 
-        (e.g. fork bomb, killing other processes, removing filesystem files, etc.)
-
-        ## WARNING ##
-        This function is NOT a security sandbox. Untrusted code, including, model-generated code, should not be blindly executed outside of one. 
-        See the Codex paper for more information about OpenAI's code sandbox, and proceed with caution.
-        """
-
-        if maximum_memory_bytes is not None:
-            import resource
-            resource.setrlimit(resource.RLIMIT_AS,
-                               (maximum_memory_bytes, maximum_memory_bytes))
-            resource.setrlimit(resource.RLIMIT_DATA,
-                               (maximum_memory_bytes, maximum_memory_bytes))
-            if platform.uname().system != 'Darwin':
-                resource.setrlimit(resource.RLIMIT_STACK,
-                                   (maximum_memory_bytes, maximum_memory_bytes))
-
-        faulthandler.disable()
-
-        import builtins
-        builtins.exit = None
-        builtins.quit = None
-
-        import os
-        os.environ['OMP_NUM_THREADS'] = '1'
-
-        os.kill = None
-        os.system = None
-        os.putenv = None
-        os.remove = None
-        os.removedirs = None
-        os.rmdir = None
-        os.fchdir = None
-        os.setuid = None
-        os.fork = None
-        os.forkpty = None
-        os.killpg = None
-        os.rename = None
-        os.renames = None
-        os.truncate = None
-        os.replace = None
-        os.unlink = None
-        os.fchmod = None
-        os.fchown = None
-        os.chmod = None
-        os.chown = None
-        os.chroot = None
-        os.fchdir = None
-        os.lchflags = None
-        os.lchmod = None
-        os.lchown = None
-        os.getcwd = None
-        os.chdir = None
-
-        import shutil
-        shutil.rmtree = None
-        shutil.move = None
-        shutil.chown = None
-
-        import subprocess
-        subprocess.Popen = None  # type: ignore
-
-        __builtins__['help'] = None
-
-        import sys
-        sys.modules['ipdb'] = None
-        sys.modules['joblib'] = None
-        sys.modules['resource'] = None
-        sys.modules['psutil'] = None
-        sys.modules['tkinter'] = None
-
-    @staticmethod
-    def unsafe_execute(sample, result):
-        with Sandbox.create_tempdir():
-
-            # These system calls are needed when cleaning up tempdir.
-            import os
-            import shutil
-            rmtree = shutil.rmtree
-            rmdir = os.rmdir
-            chdir = os.chdir
-
-            # Disable functionalities that can make destructive changes to the test.
-            Sandbox.reliability_guard()
-
-            try:
-                # Global Namespace
-                namespace = {}
-                exec("import re", namespace)
-                exec("import itertools", namespace)
-                exec("import collections", namespace)
-                exec("import heapq", namespace)
-                exec("import bisect", namespace)
-                exec("import string", namespace)
-                exec("import sys", namespace)
-                exec("import lctk", namespace)
-                exec("import functools", namespace)
-                exec("import math", namespace)
-                exec("import copy", namespace)
-                exec("import heapq", namespace)
-                exec("import sortedcontainers", namespace)
-
-                exec("from math import floor, ceil, factorial, sqrt, inf", namespace)
-                exec("from sys import maxsize, stdin", namespace)
-                exec("from bisect import bisect_left, bisect_right", namespace)
-                exec("from itertools import permutations, zip_longest", namespace)
-                exec("from heapq import heappush, heappop, heapify", namespace)
-                exec("from collections import deque, defaultdict, OrderedDict", namespace)
-                exec("from typing import List, Optional, Tuple", namespace)
-                exec("from functools import lru_cache, cache", namespace)
-
-                exec("class ListNode(object):\n\tdef __init__(self, val=0, next=None):\n\t\tself.val = val\n\t\tself.next = next", namespace)
-                exec("class TreeNode(object):\n\tdef __init__(self, val=0, left=None, right=None):\n\t\tself.val = val\n\t\tself.left = left\n\t\tself.right = right", namespace)
-
-                exec("def print(*args):pass", namespace)
-
-                total, passed = 0, 0
-                runtime = 0
-                with Sandbox.swallow_io():
-                    with Sandbox.time_limit(sample['timeout']):
-                        try:
-                            exec(sample['solution'], namespace)
-                            exec(f"solution=Solution()", namespace)
-                            exec(sample['convert_offline'], namespace)
-                            exec(sample['evaluate_offline'], namespace)
-                        except Exception as e:
-                            result.append(
-                                {"status": "failed@load", "runtime": runtime, "error": e})
-
-                        try:
-                            start_time = time.time()
-                            for test_case in sample['test_cases']:
-                                namespace['inputs'] = test_case['input']
-                                namespace['expected'] = test_case['expected']
-                                exec(
-                                    "inputs, expected = convert_offline((inputs, expected))", namespace)
-                                exec(
-                                    f"outputs = solution.{sample['entry_point']}(*inputs)", namespace)
-                                exec(
-                                    f"passed = evaluate_offline(inputs, outputs, expected)", namespace)
-                                total += 1
-                                passed += (1 if namespace['passed'] else 0)
-                            end_time = time.time()
-                            runtime = end_time-start_time
-                        except Exception as e:
-                            result.append(
-                                {"status": "failed@eval", "runtime": runtime, "error": e})
-
-                if total == passed:
-                    result.append(
-                        {"status": "passed", "runtime": runtime, "error": "None"})
-                else:
-                    result.append({"status": "failed@cases",
-                                  "runtime": runtime, "error": "case error"})
-            except TimeoutException:
-                result.append(
-                    {"status": "failed@timeout", "runtime": runtime, "error": "execution time out"})
-            except BaseException as e:
-                result.append({"status": "failed@error",
-                              "runtime": runtime, "error": e})
-
-            # Needed for cleaning up.
-            shutil.rmtree = rmtree
-            os.rmdir = rmdir
-            os.chdir = chdir
-
     @staticmethod
     def run_sample(sample) -> Dict:
         """
         Evaluates the functional correctness of a completion by running the test suite provided in the problem. 
         """
 
-        with Manager() as manager:
-            result = manager.list()
-
-            p = Process(target=Sandbox.unsafe_execute, args=(sample, result))
-            p.start()
-            p.join(timeout=sample['timeout']+1)
-            if p.is_alive():
-                p.kill()
+        result, resources = run_job_with_resources("mercury_sample", (sample,), sample['timeout'])
 
-            if not result:
-                result.append(
-                    {"status": "failed@timeout", "runtime": sample['timeout'], "error": "sandbox time out"})
+        if result is None:
+            result = {"status": "failed@timeout", "runtime": sample['timeout'], "error": "sandbox time out"}
 
-            return dict(
-                result=result[0]['status'],
-                runtime=result[0]['runtime'],
-                index=sample['solution_index'],
-                error=result[0]['error'],
-            )
+        return dict(
+            result=result['status'],
+            runtime=result['runtime'],
+            index=sample['solution_index'],
+            error=result['error'],
+            **resources,
+        )
 
     @staticmethod
     def run_samples(samples, n_workers=12):
         n_workers = min(n_workers, os.cpu_count() - 2, len(samples))
-        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
             results = list(executor.map(Sandbox.run_sample, samples))
         return results
 
@@ -344,9 +86,9 @@ def compute_beyond_eval(generations_list, reference_list, timeout=10, n_workers=
     }
 
     errors = {
-        "Easy": {"failed@load": 0, "failed@eval": 0, 'failed@cases': 0, "failed@timeout": 0, "failed@error": 0, "passed": 0},
-        "Medium": {"failed@load": 0, "failed@eval": 0, "failed@cases": 0, "failed@timeout": 0, "failed@error": 0, "passed": 0},
-        "Hard": {"failed@load": 0, "failed@eval": 0, "failed@cases": 0, "failed@timeout": 0, "failed@error": 0, "passed": 0},
+        "Easy": {"failed@load": 0, "failed@eval": 0, 'failed@cases': 0, "failed@timeout": 0, "failed@error": 0, "failed@memory_exceeded": 0, "failed@cpu_exceeded": 0, "passed": 0},
+        "Medium": {"failed@load": 0, "failed@eval": 0, "failed@cases": 0, "failed@timeout": 0, "failed@error": 0, "failed@memory_exceeded": 0, "failed@cpu_exceeded": 0, "passed": 0},
+        "Hard": {"failed@load": 0, "failed@eval": 0, "failed@cases": 0, "failed@timeout": 0, "failed@error": 0, "failed@memory_exceeded": 0, "failed@cpu_exceeded": 0, "passed": 0},
     }
 
     for generations, instance in tqdm(zip(generations_list, reference_list), total=len(generations_list), desc='compute_beyond_eval'):
@@ -376,6 +118,9 @@ def compute_beyond_eval(generations_list, reference_list, timeout=10, n_workers=
         min_runtime = min(runtimes)
         max_runtime = max(runtimes)
 
+        # The reference solutions double as the timeout calibration
+        instance_timeout = calibrated_timeout(max_runtime, timeout)
+
         # Evaluate generated solutions
         t_c, p_c = 0, 0
         b_l = list()
@@ -390,12 +135,14 @@ def compute_beyond_eval(generations_list, reference_list, timeout=10, n_workers=
                 "entry_point": instance['entry_point'],
                 "test_cases": json.loads(instance['test_cases']),
                 "solution_index": index,
-                "timeout": timeout,
+                "timeout": instance_timeout,
             }
             for _ in range(5):
                 request_list.append(sample) 
 
         all_results = sandbox.run_samples(request_list, n_workers=n_workers)
+        for result in all_results:
+            resource_report.record(instance.get('slug_name', instance.get('id')), result)
 
         for i in range(0, len(all_results), 5):
             sample_results = all_results[i:i+5]
@@ -23,13 +23,19 @@ from collections import (
     defaultdict
 )
 from concurrent.futures import (
+    FIRST_COMPLETED,
     ThreadPoolExecutor, 
-    as_completed
+    as_completed,
+    wait
 )
 from tqdm import tqdm
 import numpy as np
 
+from .dedup import canonicalize, deduplication_enabled
 from .execute import check_correctness
+from .execution_cache import cache_key, get_execution_cache, is_cacheable
+from .results_journal import get_results_journal
+from . import resource_report
 
 
 _CITATION = """\
@@ -74,7 +80,8 @@ Args:
         correctness of a code candidate.
     k: number of code candidates to consider in the evaluation (Default: [1, 10, 25, 100])
     num_workers: number of workers used to evaluate the canidate programs (Default: 4).
-    timeout:
+    timeout: seconds after which a candidate is killed, either a single value or a list
+        with the timeout of every prediction (Default: 3.0).
 Returns:
     pass_at_k: dict with pass rates for each k
     results: dict with granular results of each unittest
@@ -135,39 +142,120 @@ THE SOFTWARE."""
 def compute_code_eval(predictions, references, k=[1, 10, 25, 100], num_workers=4, timeout=3.0):
     """Returns the scores"""
 
+    jobs = (
+        (task_id, candidate, test_case, timeout[task_id] if isinstance(timeout, (list, tuple)) else timeout)
+        for task_id, (candidates, test_case) in enumerate(zip(predictions, references))
+        for candidate in candidates
+    )
+
+    results = defaultdict(list)
+    with tqdm(total=len(references), desc="Evaluating") as pbar:
+        for count, result in enumerate(stream_code_eval(jobs, num_workers=num_workers), 1):
+            if count % len(predictions[0]) == 0:
+                pbar.update(1)
+            results[result["task_id"]].append((result["completion_id"], result))
+
+    pass_at_k = compute_pass_at_k(results, k)
+
+    return pass_at_k, results
+
+
+def stream_code_eval(jobs, num_workers=4, timeout=3.0):
+    """
+    Evaluates a stream of candidates on a single pool of workers and yields the
+    result of every candidate as soon as it is known.
+
+    :param jobs: iterable of `(task_id, candidate, test)` or `(task_id, candidate, test, timeout)`
+        tuples, consumed lazily. The candidates of a task are numbered with a
+        `completion_id` in the order they appear.
+    :param timeout: timeout of the jobs that do not specify one
+    :yield: dicts with the `task_id`, `completion_id`, `passed` and `result` of a candidate
+        and the resources used to execute it (see `run_job_with_resources`), in completion order
+    """
+
     if os.getenv("HF_ALLOW_CODE_EVAL", 0) != "1":
         raise ValueError(_WARNING)
 
     if os.name == "nt":
         raise NotImplementedError("This metric is currently not supported on Windows.")
 
+    cache = get_execution_cache()
+    journal = get_results_journal()
+    deduplicate = deduplication_enabled()
+    completion_id = Counter()
+    # Equivalent candidates of a task share a group, which holds the completion ids
+    # and programs waiting for the result while its first candidate executes,
+    # then the result.
+    groups = {}
+    futures = {}
+    # Bound the number of submitted jobs, so that `jobs` can be consumed lazily.
+    max_pending = 4 * num_workers
+
+    def emit(result, task_id, job_id, program, job_timeout):
+        if journal:
+            journal.append(task_id, job_id, program, result, dict(timeout=job_timeout))
+        return dict(result, task_id=task_id, completion_id=job_id)
+
+    def finish(future):
+        result = future.result()
+        group, key = futures.pop(future)
+        waiting = groups[group]
+        groups[group] = {k: v for k, v in result.items() if k not in ("task_id", "completion_id")}
+        resource_report.record(result["task_id"], result)
+        if cache and is_cacheable(groups[group]):
+            cache.set(key, groups[group])
+        for waiting_id, test_program in waiting:
+            yield emit(groups[group], result["task_id"], waiting_id, test_program, group[2])
+
     with ThreadPoolExecutor(max_workers=num_workers) as executor:
-        futures = []
-        completion_id = Counter()
-        n_samples = 0
-        results = defaultdict(list)
-
-        for task_id, (candidates, test_case) in enumerate(zip(predictions, references)):
-            for candidate in candidates:
-                test_program = candidate + "\n" + test_case
-                args = (test_program, timeout, task_id, completion_id[task_id])
-                future = executor.submit(check_correctness, *args)
-                futures.append(future)
-                completion_id[task_id] += 1
-                n_samples += 1
-
-        with tqdm(total=len(references), desc="Evaluating") as pbar:
-            count = 0
-            for future in as_completed(futures):
-                result = future.result()
-                count += 1
-                if count % len(predictions[0]) == 0:
-                    pbar.update(1)
-                results[result["task_id"]].append((result["completion_id"], result))
+        for job in jobs:
+            task_id, candidate, test_case = job[:3]
+            job_timeout = job[3] if len(job) > 3 else timeout
+            job_id = completion_id[task_id]
+            completion_id[task_id] += 1
+            test_program = candidate + "\n" + test_case
+
+            journaled = journal.get(task_id, job_id, test_program, dict(timeout=job_timeout)) if journal else None
+            if journaled is not None:
+                yield dict(journaled, task_id=task_id, completion_id=job_id)
+                continue
+
+            group = (task_id, test_case, job_timeout, canonicalize(candidate, "python") if deduplicate else job_id)
+            if group in groups:
+                if isinstance(groups[group], list):
+                    groups[group].append((job_id, test_program))
+                else:
+                    yield emit(groups[group], task_id, job_id, test_program, job_timeout)
+                continue
+
+            key = cache_key(candidate, test_case, "sandbox", job_timeout) if cache else None
+            cached = cache.get(key) if cache else None
+            if cached is not None:
+                groups[group] = cached
+                yield emit(cached, task_id, job_id, test_program, job_timeout)
+                continue
+
+            groups[group] = [(job_id, test_program)]
+            args = (test_program, job_timeout, task_id, job_id)
+            futures[executor.submit(check_correctness, *args)] = (group, key)
 
+            if len(futures) >= max_pending:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from finish(future)
+
+        for future in as_completed(list(futures)):
+            yield from finish(future)
+
+
+def compute_pass_at_k(results, k=[1, 10, 25, 100]):
+    """
+    Returns pass@k over the problems of `results`, a dict mapping every task_id
+    to its list of `(completion_id, result)`, sorted in place.
+    """
     total, correct = [], []
     for result in results.values():
-        result.sort()
+        result.sort(key=lambda r: r[0])
         passed = [r[1]["passed"] for r in result]
         total.append(len(passed))
         correct.append(sum(passed))
@@ -177,9 +265,7 @@ def compute_code_eval(predictions, references, k=[1, 10, 25, 100], num_workers=4
     ks = k
     if not isinstance(ks, (list, tuple)):
         ks = [ks]
-    pass_at_k = {f"pass@{k}": estimate_pass_at_k(total, correct, k).mean() for k in ks if (total >= k).all()}
-
-    return pass_at_k, results
+    return {f"pass@{k}": estimate_pass_at_k(total, correct, k).mean() for k in ks if (total >= k).all()}
 
 
 def estimate_pass_at_k(num_samples, num_correct, k):
@@ -0,0 +1,46 @@
+"""Grouping of candidates that are guaranteed to behave the same when executed.
+
+Candidates are mapped to a canonical form and only one candidate of every
+canonical form is executed, its result standing for all of them. Python
+candidates are canonicalized by their AST, which drops comments and
+formatting. Stripping comments or whitespace from the other languages would
+need a tokenizer for each of them, since comment markers and whitespace are
+part of many literals (regular expressions, raw and verbatim strings, quoted
+words, long brackets, multi-line strings, here documents...), so their
+candidates are only merged when their text is identical.
+
+Deduplication can be disabled by setting the EVAL_HARNESS_DEDUPLICATE
+environment variable to "0".
+"""
+
+import ast
+import os
+
+PYTHON_LANGUAGES = ["py", "python"]
+
+
+def deduplication_enabled():
+    return os.getenv("EVAL_HARNESS_DEDUPLICATE", "1") != "0"
+
+
+def canonicalize(program, language):
+    """Returns a canonical form of `program`, equal for programs that behave the same."""
+    if language in PYTHON_LANGUAGES:
+        try:
+            return ast.dump(ast.parse(program))
+        except (SyntaxError, ValueError, RecursionError, MemoryError):
+            return program
+    return program
+
+
+def group_candidates(candidates, language):
+    """
+    Groups the indices of `candidates` by canonical form, in order of first
+    appearance. Every candidate is its own group when deduplication is disabled.
+    """
+    if not deduplication_enabled():
+        return [[i] for i in range(len(candidates))]
+    groups = {}
+    for i, candidate in enumerate(candidates):
+        groups.setdefault(canonicalize(candidate, language), []).append(i)
+    return list(groups.values())
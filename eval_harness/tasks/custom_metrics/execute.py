@@ -14,15 +14,74 @@
 
 # This code is adapted from OpenAI's release
 # https://github.com/openai/human-eval/blob/master/human_eval/execution.py
+#
+# It is the single sandbox of every metric that executes Python in-process
+# (code_eval, the PAL metric and Mercury's beyond_eval): a job is one of the
+# functions in `JOBS`, run under the reliability guard in a disposable process
+# created by one of the `BACKENDS`.
 
+import atexit
 import contextlib
+import errno
 import faulthandler
 import io
+import json
+import math
 import multiprocessing
 import os
+import pickle
 import platform
+import queue
+import select
+import shutil
 import signal
+import subprocess
+import sys
 import tempfile
+import threading
+import time
+from multiprocessing.connection import Connection, Pipe
+
+# Ways of creating the disposable process a job runs in:
+#   fork        fork the evaluation process for every job
+#   forkserver  fork a long-lived, preloaded zygote for every job (see `ZygotePool`)
+#   spawn       start a fresh multiprocessing "spawn" process for every job
+#   subprocess  start a fresh interpreter running this file for every job
+BACKENDS = ["fork", "forkserver", "spawn", "subprocess"]
+DEFAULT_BACKEND = "forkserver"
+
+# A zygote is replaced after this many jobs, so that whatever state leaks into
+# it over a long run is bounded.
+MAX_JOBS_PER_ZYGOTE = 1000
+
+# Modules imported once by every zygote, so that forked jobs find them
+# already loaded instead of paying the import on every execution.
+PRELOAD_MODULES = [
+    "bisect",
+    "collections",
+    "copy",
+    "datetime",
+    "functools",
+    "hashlib",
+    "heapq",
+    "itertools",
+    "math",
+    "random",
+    "re",
+    "statistics",
+    "string",
+    "typing",
+    "numpy",
+    "sortedcontainers",
+]
+
+# Resource limits of every job, which the evaluator sets from its arguments:
+#   EVAL_HARNESS_MEMORY_LIMIT  memory of a job in MB, 0 for no limit
+#   EVAL_HARNESS_CPU_LIMIT     CPU seconds of a job, empty for its timeout, 0 for no limit
+#   EVAL_HARNESS_NPROC_LIMIT   RLIMIT_NPROC of a job, 0 for no limit
+# The MultiPL-E evaluators apply the same limits to their processes, see
+# multiple_metrics/safe_subprocess.py.
+DEFAULT_MEMORY_LIMIT_MB = 4096
 
 
 def check_correctness(check_program, timeout, task_id, completion_id):
@@ -33,28 +92,202 @@ def check_correctness(check_program, timeout, task_id, completion_id):
     :param completion_id: an optional completion ID so we can match
         the results later even if execution finishes asynchronously.
     """
-    manager = multiprocessing.Manager()
-    result = manager.list()
-
-    p = multiprocessing.Process(target=unsafe_execute, args=(check_program, result, timeout))
-    p.start()
-    p.join(timeout=timeout + 1)
-    if p.is_alive():
-        p.kill()
+    result, resources = run_job_with_resources("check_program", (check_program, timeout), timeout)
 
-    if not result:
-        result.append("timed out")
+    if result is None:
+        result = "timed out"
 
     return dict(
         task_id=task_id,
-        passed=result[0] == "passed",
-        result=result[0],
+        passed=result == "passed",
+        result=result,
         completion_id=completion_id,
+        **resources,
     )
 
 
-def unsafe_execute(check_program, result, timeout):
+def get_backend():
+    """Returns the backend selected with the EVAL_HARNESS_SANDBOX_BACKEND environment variable."""
+    backend = os.getenv("EVAL_HARNESS_SANDBOX_BACKEND", DEFAULT_BACKEND)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown sandbox backend {backend}, choose from: {', '.join(BACKENDS)}")
+    return backend
+
+
+def run_job(kind, args, timeout, backend=None):
+    """
+    Runs the job `JOBS[kind](*args)` in a disposable sandboxed process and
+    returns its result, or None if the job produced no result, e.g. because it
+    was killed after running for more than `timeout + 1` seconds.
+
+    :param backend: one of `BACKENDS`, defaults to `get_backend()`
+    """
+    return run_job_with_resources(kind, args, timeout, backend)[0]
+
+
+def run_job_with_resources(kind, args, timeout, backend=None):
+    """
+    Like `run_job`, but returns `(result, resources)`, where resources is a dict
+    with the `wall_time`, `user_time` and `sys_time` in seconds and the
+    `peak_rss` in bytes of the process that ran the job. Values the backend
+    could not measure are None.
+    """
+    backend = backend or get_backend()
+    limits = resource_limits(timeout)
+    start = time.monotonic()
+    if backend == "forkserver":
+        result, usage = get_zygote_pool().run(kind, args, timeout, limits)
+    elif backend == "fork":
+        result, usage = _run_forked(kind, args, timeout, limits)
+    elif backend == "spawn":
+        result, usage = _run_spawned(kind, args, timeout, limits)
+    elif backend == "subprocess":
+        result, usage = _run_subprocess(kind, args, timeout, limits)
+    else:
+        raise ValueError(f"Unknown sandbox backend {backend}, choose from: {', '.join(BACKENDS)}")
+    resources = dict(wall_time=time.monotonic() - start, user_time=None, sys_time=None, peak_rss=None)
+    if usage is not None:
+        resources.update(usage)
+    return result, resources
+
+
+def usage_from_rusage(rusage):
+    """Converts a `resource.struct_rusage` to the CPU time and peak RSS of `run_job_with_resources`."""
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    peak_rss = rusage.ru_maxrss if platform.system() == "Darwin" else rusage.ru_maxrss * 1024
+    return dict(user_time=rusage.ru_utime, sys_time=rusage.ru_stime, peak_rss=peak_rss)
+
+
+def memory_limit_bytes():
+    """Returns the memory limit of a job in bytes, or None."""
+    limit_mb = float(os.getenv("EVAL_HARNESS_MEMORY_LIMIT", DEFAULT_MEMORY_LIMIT_MB))
+    return int(limit_mb * 1024 * 1024) if limit_mb > 0 else None
+
+
+def cpu_limit_seconds(timeout):
+    """
+    Returns the CPU time limit of a job whose timeout is `timeout`, or None. By
+    default it is a second above the timeout, so that a single-threaded job
+    always hits the timeout first and only jobs burning several cores at once
+    are stopped by the CPU limit.
+    """
+    limit = os.getenv("EVAL_HARNESS_CPU_LIMIT", "")
+    seconds = float(limit) if limit else (timeout + 1 if timeout else None)
+    return math.ceil(seconds) if seconds and seconds > 0 else None
+
+
+def nproc_limit():
+    """Returns the RLIMIT_NPROC of a job, or None."""
+    return int(os.getenv("EVAL_HARNESS_NPROC_LIMIT", 0)) or None
+
+
+def resource_limits(timeout):
+    """
+    Returns the `(memory, cpu, nproc)` limits of a job with the given timeout,
+    None standing for no limit. They are read in the evaluation process and
+    sent with the job, since zygotes keep the environment they started with.
+    """
+    return memory_limit_bytes(), cpu_limit_seconds(timeout), nproc_limit()
+
+
+def set_resource_limits(limits, address_space=True, memory_baseline=0):
+    """
+    Applies `limits`, see `resource_limits`, to the current process.
+
+    The memory limit bounds the address space, or only the data segment when
+    `address_space` is False, for runtimes such as the JVM that reserve far
+    more virtual memory than they use. It is counted on top of
+    `memory_baseline` bytes already mapped by the process. The CPU limit raises
+    SIGXCPU, and SIGKILLs the process one second later. The process limit
+    counts every process and thread of the user, not only the children of the
+    job.
+    """
+    import resource
 
+    memory, cpu, nproc = limits
+    if memory is not None:
+        memory += memory_baseline
+        _lower_rlimit(resource.RLIMIT_AS if address_space else resource.RLIMIT_DATA, memory, memory)
+    if cpu is not None:
+        _lower_rlimit(resource.RLIMIT_CPU, cpu, cpu + 1)
+    if nproc is not None:
+        _lower_rlimit(resource.RLIMIT_NPROC, nproc, nproc)
+
+
+def _address_space_size():
+    """Returns the bytes mapped by the current process, so that a forked job is not bound by its parent's size."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def _lower_rlimit(limit, soft, hard):
+    import resource
+
+    resource.setrlimit(limit, _lowered_rlimit(limit, soft, hard))
+
+
+def _lowered_rlimit(limit, soft, hard):
+    """Returns `(soft, hard)` capped by the current hard limit, which an unprivileged process cannot raise."""
+    import resource
+
+    _, current_hard = resource.getrlimit(limit)
+    if current_hard != resource.RLIM_INFINITY:
+        hard = min(hard, current_hard)
+        soft = min(soft, hard)
+    return soft, hard
+
+
+# Sets the limits given as JSON in its first argument and executes the rest of
+# its arguments, for systems without the prlimit command of util-linux.
+_LIMITS_WRAPPER = (
+    "import json, os, resource, sys\n"
+    "for name, soft, hard in json.loads(sys.argv[1]):\n"
+    "    resource.setrlimit(getattr(resource, name), (soft, hard))\n"
+    "os.execv(sys.argv[2], sys.argv[2:])\n"
+)
+
+
+def limited_command(args, limits, address_space=True, env=None):
+    """
+    Returns a command running `args` under `limits` (see `set_resource_limits`),
+    to be started as a subprocess.
+
+    The limits are set by a wrapper that then executes `args` in the same
+    process: `prlimit`, or a Python interpreter where it is not installed.
+    Setting them in `preexec_fn` instead can deadlock callers with several
+    threads, such as the thread pools of the evaluators. The executable is
+    looked up in the PATH of `env` beforehand, so that a missing one raises
+    FileNotFoundError as it would without the wrapper.
+    """
+    import resource
+
+    memory, cpu, nproc = limits
+    rlimits = []
+    if memory is not None:
+        rlimits.append(("RLIMIT_AS" if address_space else "RLIMIT_DATA", memory, memory))
+    if cpu is not None:
+        rlimits.append(("RLIMIT_CPU", cpu, cpu + 1))
+    if nproc is not None:
+        rlimits.append(("RLIMIT_NPROC", nproc, nproc))
+    if not rlimits:
+        return list(args)
+
+    executable = shutil.which(str(args[0]), path=os.pathsep.join(os.get_exec_path(env)))
+    if executable is None:
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), str(args[0]))
+    rlimits = [(name, *_lowered_rlimit(getattr(resource, name), soft, hard)) for name, soft, hard in rlimits]
+    prlimit = shutil.which("prlimit")
+    if prlimit is not None:
+        options = [f"--{name[len('RLIMIT_'):].lower()}={soft}:{hard}" for name, soft, hard in rlimits]
+        return [prlimit, *options, "--", executable, *args[1:]]
+    return [sys.executable, "-S", "-c", _LIMITS_WRAPPER, json.dumps(rlimits), executable, *args[1:]]
+
+
+def execute_job(kind, args, limits):
+    """Runs a job in the current process, which must be disposable, under `limits`."""
     with create_tempdir():
 
         # These system calls are needed when cleaning up tempdir.
@@ -65,25 +298,407 @@ def unsafe_execute(check_program, result, timeout):
         rmdir = os.rmdir
         chdir = os.chdir
 
+        # Bound the memory, CPU time and processes of the job. Exceeding the
+        # memory limit raises MemoryError, exceeding the CPU limit raises
+        # CPULimitException.
+        set_resource_limits(limits, memory_baseline=_address_space_size())
+        signal.signal(signal.SIGXCPU, _cpu_limit_handler)
+
         # Disable functionalities that can make destructive changes to the test.
         reliability_guard()
 
-        # Run program.
         try:
-            exec_globals = {}
-            with swallow_io():
-                with time_limit(timeout):
-                    exec(check_program, exec_globals)
-            result.append("passed")
-        except TimeoutException:
-            result.append("timed out")
-        except BaseException as e:
-            result.append(f"failed: {e}")
-
-        # Needed for cleaning up.
-        shutil.rmtree = rmtree
-        os.rmdir = rmdir
-        os.chdir = chdir
+            return JOBS[kind](*args)
+        finally:
+            # Needed for cleaning up.
+            shutil.rmtree = rmtree
+            os.rmdir = rmdir
+            os.chdir = chdir
+
+
+def unsafe_execute(check_program, timeout):
+    try:
+        exec_globals = {}
+        with swallow_io():
+            with time_limit(timeout):
+                exec(check_program, exec_globals)
+        return "passed"
+    except TimeoutException:
+        return "timed out"
+    except MemoryError:
+        return "memory_exceeded"
+    except CPULimitException:
+        return "cpu_exceeded"
+    except BaseException as e:
+        return f"failed: {e}"
+
+
+def unsafe_execute_pal(program, timeout, answer_symbol=None):
+    try:
+        exec_globals = {}
+        program_io = io.StringIO()
+        with swallow_io(program_io):
+            with time_limit(timeout):
+                exec(program, exec_globals)
+        if answer_symbol:
+            return exec_globals[answer_symbol]
+        program_io.seek(0)
+        return program_io.readlines()[-1].strip()
+    except TimeoutException:
+        return "failed: timed out"
+    except MemoryError:
+        return "failed: memory_exceeded"
+    except CPULimitException:
+        return "failed: cpu_exceeded"
+    except BaseException as e:
+        return f"failed: {e}"
+
+
+def unsafe_execute_mercury(sample):
+    result = []
+    runtime = 0
+    try:
+        # Global Namespace
+        namespace = {}
+        exec("import re", namespace)
+        exec("import itertools", namespace)
+        exec("import collections", namespace)
+        exec("import heapq", namespace)
+        exec("import bisect", namespace)
+        exec("import string", namespace)
+        exec("import sys", namespace)
+        exec("import lctk", namespace)
+        exec("import functools", namespace)
+        exec("import math", namespace)
+        exec("import copy", namespace)
+        exec("import heapq", namespace)
+        exec("import sortedcontainers", namespace)
+
+        exec("from math import floor, ceil, factorial, sqrt, inf", namespace)
+        exec("from sys import maxsize, stdin", namespace)
+        exec("from bisect import bisect_left, bisect_right", namespace)
+        exec("from itertools import permutations, zip_longest", namespace)
+        exec("from heapq import heappush, heappop, heapify", namespace)
+        exec("from collections import deque, defaultdict, OrderedDict", namespace)
+        exec("from typing import List, Optional, Tuple", namespace)
+        exec("from functools import lru_cache, cache", namespace)
+
+        exec("class ListNode(object):\n\tdef __init__(self, val=0, next=None):\n\t\tself.val = val\n\t\tself.next = next", namespace)
+        exec("class TreeNode(object):\n\tdef __init__(self, val=0, left=None, right=None):\n\t\tself.val = val\n\t\tself.left = left\n\t\tself.right = right", namespace)
+
+        exec("def print(*args):pass", namespace)
+
+        total, passed = 0, 0
+        with swallow_io():
+            with time_limit(sample['timeout']):
+                try:
+                    exec(sample['solution'], namespace)
+                    exec(f"solution=Solution()", namespace)
+                    exec(sample['convert_offline'], namespace)
+                    exec(sample['evaluate_offline'], namespace)
+                except (MemoryError, CPULimitException):
+                    raise
+                except Exception as e:
+                    result.append(
+                        {"status": "failed@load", "runtime": runtime, "error": str(e)})
+
+                try:
+                    start_time = time.time()
+                    for test_case in sample['test_cases']:
+                        namespace['inputs'] = test_case['input']
+                        namespace['expected'] = test_case['expected']
+                        exec(
+                            "inputs, expected = convert_offline((inputs, expected))", namespace)
+                        exec(
+                            f"outputs = solution.{sample['entry_point']}(*inputs)", namespace)
+                        exec(
+                            f"passed = evaluate_offline(inputs, outputs, expected)", namespace)
+                        total += 1
+                        passed += (1 if namespace['passed'] else 0)
+                    end_time = time.time()
+                    runtime = end_time-start_time
+                except (MemoryError, CPULimitException):
+                    raise
+                except Exception as e:
+                    result.append(
+                        {"status": "failed@eval", "runtime": runtime, "error": str(e)})
+
+        if total == passed:
+            result.append(
+                {"status": "passed", "runtime": runtime, "error": "None"})
+        else:
+            result.append({"status": "failed@cases",
+                          "runtime": runtime, "error": "case error"})
+    except TimeoutException:
+        result.append(
+            {"status": "failed@timeout", "runtime": runtime, "error": "execution time out"})
+    except MemoryError:
+        result.append(
+            {"status": "failed@memory_exceeded", "runtime": runtime, "error": "memory limit exceeded"})
+    except CPULimitException:
+        result.append(
+            {"status": "failed@cpu_exceeded", "runtime": runtime, "error": "cpu time limit exceeded"})
+    except BaseException as e:
+        result.append({"status": "failed@error",
+                      "runtime": runtime, "error": str(e)})
+    return result[0]
+
+
+JOBS = {
+    "check_program": unsafe_execute,
+    "pal_program": unsafe_execute_pal,
+    "mercury_sample": unsafe_execute_mercury,
+}
+
+
+class ZygotePool:
+    """
+    A pool of long-lived zygote processes that execute jobs.
+
+    Each zygote is a fresh interpreter running this file as a script, so it
+    does not inherit the (possibly huge) address space of the evaluation
+    process and has `PRELOAD_MODULES` already imported. For every job the
+    zygote forks a child that runs `execute_job` and reports the result back
+    over a pipe, which is much cheaper than starting a new process per job.
+
+    Zygotes are created on demand, so the number of zygotes follows the
+    number of threads calling `run` concurrently.
+    """
+
+    def __init__(self, max_jobs_per_zygote=MAX_JOBS_PER_ZYGOTE):
+        self.max_jobs_per_zygote = max_jobs_per_zygote
+        self._idle = queue.LifoQueue()
+        self._zygotes = set()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def run(self, kind, args, timeout, limits):
+        """Runs a job in a child of an idle zygote, returns its result and resource usage."""
+        zygote = self._acquire()
+        try:
+            result, usage = zygote.run(kind, args, timeout, limits)
+        finally:
+            self._release(zygote)
+        return result, usage
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            zygotes = list(self._zygotes)
+            self._zygotes.clear()
+        for zygote in zygotes:
+            zygote.close()
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            zygote = _Zygote(self.max_jobs_per_zygote)
+            with self._lock:
+                self._zygotes.add(zygote)
+            return zygote
+
+    def _release(self, zygote):
+        with self._lock:
+            reusable = not self._closed and zygote.is_usable()
+            if not reusable:
+                self._zygotes.discard(zygote)
+        if reusable:
+            self._idle.put(zygote)
+        else:
+            zygote.close()
+
+
+class _Zygote:
+    """Handle on a single zygote process, see `_script_main`."""
+
+    def __init__(self, max_jobs):
+        self.jobs_left = max_jobs
+        self.process, self.conn = _start_script("zygote", str(max_jobs))
+
+    def run(self, kind, args, timeout, limits):
+        try:
+            self.conn.send((kind, args, timeout, limits))
+            # The zygote kills the job after `timeout + 1` seconds, this only
+            # guards against the zygote itself hanging.
+            if not self.conn.poll(timeout + 10):
+                raise TimeoutError("zygote did not answer")
+            result, usage, alive = self.conn.recv()
+        except (OSError, EOFError, TimeoutError):
+            self.close()
+            return None, None
+        self.jobs_left -= 1
+        if not alive:
+            self.close()
+        return result, usage
+
+    def is_usable(self):
+        return self.jobs_left > 0 and not self.conn.closed and self.process.poll() is None
+
+    def close(self):
+        if not self.conn.closed:
+            self.conn.close()
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+
+
+_ZYGOTE_POOL = None
+_ZYGOTE_POOL_LOCK = threading.Lock()
+
+
+def get_zygote_pool():
+    """Returns the module-level `ZygotePool`, creating it on first use."""
+    global _ZYGOTE_POOL
+    with _ZYGOTE_POOL_LOCK:
+        if _ZYGOTE_POOL is None:
+            _ZYGOTE_POOL = ZygotePool()
+            atexit.register(_ZYGOTE_POOL.close)
+        return _ZYGOTE_POOL
+
+
+def _start_script(mode, *argv):
+    """Starts a fresh interpreter running this file in `mode`, connected over a pipe."""
+    parent_conn, child_conn = Pipe()
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), mode, str(child_conn.fileno()), *argv],
+        stdin=subprocess.DEVNULL,
+        pass_fds=(child_conn.fileno(),),
+    )
+    child_conn.close()
+    return process, parent_conn
+
+
+def _run_forked(kind, args, timeout, limits, conn=None):
+    """
+    Forks the current process to run a job, closing `conn` in the child.
+    Returns the result and the resource usage of the child.
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        if conn is not None:
+            conn.close()
+        os.close(read_fd)
+        try:
+            data = pickle.dumps(execute_job(kind, args, limits))
+            while data:
+                data = data[os.write(write_fd, data):]
+        finally:
+            os._exit(0)
+
+    os.close(write_fd)
+    chunks = []
+    deadline = time.monotonic() + timeout + 1
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([read_fd], [], [], remaining)[0]:
+                break
+            chunk = os.read(read_fd, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        os.close(read_fd)
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        _, _, rusage = os.wait4(pid, 0)
+
+    try:
+        result = pickle.loads(b"".join(chunks))
+    except Exception:
+        result = None
+    return result, usage_from_rusage(rusage)
+
+
+def _run_spawned(kind, args, timeout, limits):
+    parent_conn, child_conn = multiprocessing.get_context("spawn").Pipe()
+    p = multiprocessing.get_context("spawn").Process(target=_spawned_main, args=(kind, args, limits, child_conn))
+    p.start()
+    child_conn.close()
+    try:
+        if parent_conn.poll(timeout + 1):
+            return parent_conn.recv()
+        return None, None
+    except (EOFError, OSError):
+        return None, None
+    finally:
+        parent_conn.close()
+        if p.is_alive():
+            p.kill()
+        p.join()
+
+
+def _spawned_main(kind, args, limits, conn):
+    # The process is reaped by multiprocessing, so it reports its own usage.
+    import resource
+
+    result = execute_job(kind, args, limits)
+    conn.send((result, usage_from_rusage(resource.getrusage(resource.RUSAGE_SELF))))
+
+
+def _run_subprocess(kind, args, timeout, limits):
+    process, conn = _start_script("job")
+    result = None
+    try:
+        conn.send((kind, args, limits))
+        if conn.poll(timeout + 1):
+            result = conn.recv()
+    except (EOFError, OSError):
+        pass
+    finally:
+        conn.close()
+        # Not process.kill(), which would reap the process before wait4 can.
+        os.kill(process.pid, signal.SIGKILL)
+        _, status, rusage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    return result, usage_from_rusage(rusage)
+
+
+def _script_main(mode, fd, *argv):
+    """
+    Entry point when this file runs as a script, see `_start_script`.
+
+    In "zygote" mode it receives `(kind, args, timeout, limits)` jobs on the connection
+    `fd`, forks a child per job and answers `(result, usage, alive)`, where
+    `alive` is False once the zygote is about to exit. In "job" mode it receives a
+    single `(kind, args, limits)` job, runs it in this process and sends the result.
+    """
+    conn = Connection(fd)
+    # Keep the protocol clear of anything written to the standard streams.
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    os.close(devnull)
+
+    if mode == "job":
+        kind, args, limits = conn.recv()
+        conn.send(execute_job(kind, args, limits))
+        return
+
+    for module in PRELOAD_MODULES:
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+
+    max_jobs = int(argv[0])
+    for jobs_done in range(1, max_jobs + 1):
+        try:
+            kind, args, timeout, limits = conn.recv()
+        except EOFError:
+            return
+        # Only the forked children run jobs and apply the reliability guard,
+        # so nothing they do can reach the state of the zygote. It is still
+        # replaced after `max_jobs`, which bounds what it accumulates itself.
+        result, usage = _run_forked(kind, args, timeout, limits, conn)
+        alive = jobs_done < max_jobs
+        conn.send((result, usage, alive))
+        if not alive:
+            return
 
 
 @contextlib.contextmanager
@@ -100,8 +715,9 @@ def time_limit(seconds):
 
 
 @contextlib.contextmanager
-def swallow_io():
-    stream = WriteOnlyStringIO()
+def swallow_io(stream=None):
+    if stream is None:
+        stream = WriteOnlyStringIO()
     with contextlib.redirect_stdout(stream):
         with contextlib.redirect_stderr(stream):
             with redirect_stdin(stream):
@@ -119,6 +735,14 @@ class TimeoutException(Exception):
     pass
 
 
+class CPULimitException(Exception):
+    pass
+
+
+def _cpu_limit_handler(signum, frame):
+    raise CPULimitException("CPU time limit exceeded!")
+
+
 class WriteOnlyStringIO(io.StringIO):
     """StringIO that throws an exception when it's read from"""
 
@@ -225,7 +849,7 @@ def reliability_guard(maximum_memory_bytes=None):
 
     subprocess.Popen = None  # type: ignore
 
-    __builtins__["help"] = None
+    builtins.help = None
 
     import sys
 
@@ -234,3 +858,9 @@ def reliability_guard(maximum_memory_bytes=None):
     sys.modules["resource"] = None
     sys.modules["psutil"] = None
     sys.modules["tkinter"] = None
+
+
+if __name__ == "__main__":
+    # Running this file as a script starts a zygote or runs a single job, see `_start_script`.
+    sys.path.pop(0)
+    _script_main(sys.argv[1], int(sys.argv[2]), *sys.argv[3:])
@@ -0,0 +1,216 @@
+"""Persistent, content-addressed cache of execution results.
+
+Results are stored in a SQLite database keyed by a hash of everything that
+determines them: the program, its tests, the language, the timeout, the
+resource limits and the version of the toolchain that runs the language. The
+cache is shared by every task and every run pointing at the same database, and
+is bounded in size by evicting the least recently used results.
+
+Timeouts and results exceeding a resource limit are not cached (see
+`is_cacheable`), since they may be caused by the load of the machine rather
+than by the program.
+
+The cache is enabled by setting the EVAL_HARNESS_EXECUTION_CACHE environment
+variable to the path of the database (the evaluator does this from the
+`execution_cache_path` argument); EVAL_HARNESS_EXECUTION_CACHE_SIZE bounds its
+size in megabytes.
+"""
+
+import atexit
+import functools
+import hashlib
+import os
+import pickle
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+DEFAULT_MAX_SIZE_MB = 2048
+
+# Bump to invalidate every cached result when the format of results changes.
+CACHE_VERSION = "3"
+
+# The "result" of the Python sandbox (and of the HumanEvalPack metric), and the
+# "status" of the MultiPL-E evaluators, of a program that timed out or exceeded
+# a resource limit.
+TRANSIENT_RESULTS = [
+    "timed out",
+    "failed: timed out",
+    "memory_exceeded",
+    "failed: memory_exceeded",
+    "cpu_exceeded",
+    "failed: cpu_exceeded",
+]
+TRANSIENT_STATUSES = ["Timeout", "MemoryExceeded", "CPUExceeded"]
+
+RESOURCE_LIMIT_VARIABLES = ["EVAL_HARNESS_MEMORY_LIMIT", "EVAL_HARNESS_CPU_LIMIT", "EVAL_HARNESS_NPROC_LIMIT"]
+
+# Commands printing the version of the toolchain of each MultiPL-E language,
+# see multiple_metrics/containerized_eval.py.
+TOOLCHAIN_VERSION_COMMANDS = {
+    "clj": [["clojure", "--version"]],
+    "cpp": [["g++", "--version"]],
+    "cs": [["csc", "-version"], ["mono", "--version"]],
+    "d": [["dmd", "--version"]],
+    "fs": [["dotnet", "--version"]],
+    "go": [["go", "version"]],
+    "hs": [["ghc", "--numeric-version"]],
+    "java": [["javac", "-version"], ["java", "-version"]],
+    "javascript": [["node", "--version"]],
+    "jl": [["julia", "--version"]],
+    "js": [["node", "--version"]],
+    "lua": [["lua", "-v"]],
+    "ml": [["ocaml", "-version"]],
+    "php": [["php", "--version"]],
+    "pl": [["perl", "--version"]],
+    "py": [["python3", "--version"]],
+    "python": [["python3", "--version"]],
+    "r": [["Rscript", "--version"]],
+    "rb": [["ruby", "--version"]],
+    "rs": [["rustc", "--version"]],
+    "rust": [["rustc", "--version"]],
+    "scala": [["scalac", "-version"]],
+    "sh": [["bash", "--version"]],
+    "swift": [["swiftc", "--version"]],
+    "ts": [["tsc", "--version"], ["node", "--version"]],
+}
+
+
+@functools.lru_cache(maxsize=None)
+def toolchain_version(language):
+    """
+    Returns a string identifying the toolchain that executes `language`.
+    Languages starting with "sandbox" are run by the Python sandbox of
+    execute.py, i.e. by the current interpreter.
+    """
+    if language.startswith("sandbox"):
+        return sys.version
+    outputs = []
+    for command in TOOLCHAIN_VERSION_COMMANDS.get(language, []):
+        try:
+            output = subprocess.run(command, capture_output=True, timeout=60)
+            outputs.append((output.stdout + output.stderr).decode("utf-8", errors="ignore").strip())
+        except (OSError, subprocess.TimeoutExpired):
+            outputs.append(f"{command[0]} unavailable")
+    return "\n".join(outputs)
+
+
+def cache_key(program, tests, language, timeout, options=None):
+    """
+    Hashes everything that determines the result of running `program` against
+    `tests`, including the `options` dict of the evaluator, if any.
+    """
+    # The resource limits of execute.py decide whether a candidate exceeds them.
+    limits = [os.getenv(name, "") for name in RESOURCE_LIMIT_VARIABLES]
+    parts = [CACHE_VERSION, language, toolchain_version(language), repr(timeout), repr(limits), program, tests]
+    if options:
+        parts.append(repr(sorted(options.items())))
+    h = hashlib.sha256()
+    for part in parts:
+        data = str(part).encode("utf-8")
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+    return h.hexdigest()
+
+
+def is_cacheable(result):
+    """Returns whether the result dict of an execution may be cached, i.e. did not time out or exceed a limit."""
+    # The result of a PAL program is the value it computed, of any type.
+    outcome = result.get("result")
+    if isinstance(outcome, str) and outcome in TRANSIENT_RESULTS:
+        return False
+    return result.get("status") not in TRANSIENT_STATUSES
+
+
+class ExecutionCache:
+    """
+    A size-bounded LRU store of execution results in a SQLite database.
+
+    Results are pickled, so any picklable object can be cached. The object is
+    safe to use from several threads, and several processes can share the
+    same database.
+    """
+
+    # Check the size of the database after this many insertions.
+    EVICTION_INTERVAL = 256
+
+    def __init__(self, path, max_size_mb=DEFAULT_MAX_SIZE_MB):
+        self.path = os.path.expanduser(path)
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        self._inserts = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Returns the result cached under `key`, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        return pickle.loads(row[0])
+
+    def set(self, key, result):
+        value = pickle.dumps(result)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, len(value) + len(key), time.time()),
+            )
+            self._inserts += 1
+            if self._inserts % self.EVICTION_INTERVAL == 0:
+                self._evict()
+
+    def close(self):
+        with self._lock:
+            self._evict()
+            self._conn.close()
+
+    def _evict(self):
+        """Drops the least recently used results until the cache is below 90% of its size."""
+        size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if size <= self.max_size:
+            return
+        target = size - int(self.max_size * 0.9)
+        freed = 0
+        keys = []
+        for key, entry_size in self._conn.execute("SELECT key, size FROM results ORDER BY last_used"):
+            keys.append((key,))
+            freed += entry_size
+            if freed >= target:
+                break
+        self._conn.executemany("DELETE FROM results WHERE key = ?", keys)
+
+
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_execution_cache():
+    """
+    Returns the cache configured by the EVAL_HARNESS_EXECUTION_CACHE environment
+    variable, or None when caching is disabled.
+    """
+    path = os.getenv("EVAL_HARNESS_EXECUTION_CACHE")
+    if not path:
+        return None
+    max_size_mb = float(os.getenv("EVAL_HARNESS_EXECUTION_CACHE_SIZE", DEFAULT_MAX_SIZE_MB))
+    with _CACHES_LOCK:
+        if path not in _CACHES:
+            _CACHES[path] = ExecutionCache(path, max_size_mb)
+            atexit.register(_CACHES[path].close)
+        return _CACHES[path]
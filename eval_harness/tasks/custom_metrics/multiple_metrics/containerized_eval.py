@@ -3,7 +3,9 @@ NOTE: Nothing containerized about this any more. This is just a helper
 function that evaluates a string script in a given language. The function
 is used by the custom_metrics/multiple_metrics/evaluation.py script to
 evaluate the output of a model on a given problem. This function is
-called by the cached_eval_script function in the same script.
+called by the cached_eval_script function in the same script, and its
+asynchronous variant eval_string_script_async runs the evaluators on an
+asyncio event loop (see engine.py).
 """
 
 import tempfile
@@ -33,6 +35,11 @@ from . import (
     eval_swift, 
     eval_ts, 
 )
+from .safe_subprocess import record_resources
+
+# Statuses of programs that failed by exceeding a resource limit, see
+# `Result.limit_exceeded` in safe_subprocess.py.
+LIMIT_STATUSES = {"memory": "MemoryExceeded", "cpu": "CPUExceeded"}
 
 EVALUATORS = {
     "clj": (eval_clj.eval_script, ".clj"),
@@ -62,33 +69,103 @@ EVALUATORS = {
     "ts": (eval_ts.eval_script, ".ts"),
 }
 
+# Evaluators of programs whose tests are #[test] functions run by the test
+# harness rather than assertions in `main`, as in HumanEvalPack.
+TEST_FUNCTION_EVALUATORS = {
+    "rs": (eval_rust.eval_test_script, ".rs"),
+    "rust": (eval_rust.eval_test_script, ".rs"),
+}
+
+# Blocking setup of the evaluators, done once per process: measuring the
+# startup of julia, building the crates of the Rust test harness. Evaluations
+# on an event loop run it beforehand with `prepare_evaluator`, since the
+# evaluators would otherwise do it from the loop.
+SETUPS = {
+    "jl": eval_julia.startup_seconds,
+}
+TEST_FUNCTION_SETUPS = {
+    "rs": eval_rust.dependency_flags,
+    "rust": eval_rust.dependency_flags,
+}
+
+
+def prepare_evaluator(language, test_functions=False):
+    """Runs the setup of the evaluator of `language`, if any."""
+    setup = (TEST_FUNCTION_SETUPS if test_functions else SETUPS).get(language)
+    if setup is not None:
+        setup()
+
 
-def eval_string_script(language, program):
-    if language in EVALUATORS:
-        (eval_script, file_ext) = EVALUATORS[language]
-    else:
-        raise ValueError(f"Unsupported language: {language}")
+def eval_string_script(language, program, test_functions=False, timeout_seconds=None):
+    (eval_script, file_ext) = get_evaluator(language, test_functions)
     with tempfile.NamedTemporaryFile(suffix=file_ext, delete=True) as f:
         f.write(program.encode("utf-8"))
         f.flush()
-        result = eval_script(Path(f.name))
-        # Only save the first 4K of output from the running program. Any futher
-        # output is very likely an exceptionally long stack trace or a long
-        # series of prints.
-        if type(result["stdout"]) == bytes:
-            result["stdout"] = result["stdout"].decode("utf-8", errors="ignore")
-        if result["stdout"] is None:
-            result["stdout"] = ""
-        if result["stderr"] is None:
-            result["stderr"] = ""
-        if type(result["stderr"]) == bytes:
-            result["stderr"] = result["stderr"].decode("utf-8", errors="ignore")
-        assert type(result["stdout"]) == str
-        assert type(result["stderr"]) == str
-        return {
-            "program": program,
-            "stdout": result["stdout"].replace("!!int", "")[:4096],
-            "stderr": result["stderr"][:4096],
-            "exit_code": result["exit_code"],
-            "status": result["status"],
-        }
+        with record_resources() as runs:
+            result = eval_script(Path(f.name), timeout_seconds)
+        return format_result(program, result, runs)
+
+
+async def eval_string_script_async(language, program, test_functions=False, timeout_seconds=None):
+    """Like `eval_string_script`, but runs the processes of the evaluator on the event loop."""
+    (eval_script, file_ext) = get_evaluator(language, test_functions)
+    with tempfile.NamedTemporaryFile(suffix=file_ext, delete=True) as f:
+        f.write(program.encode("utf-8"))
+        f.flush()
+        with record_resources() as runs:
+            result = await eval_script.run_async(Path(f.name), timeout_seconds)
+        return format_result(program, result, runs)
+
+
+def get_evaluator(language, test_functions=False):
+    evaluators = TEST_FUNCTION_EVALUATORS if test_functions else EVALUATORS
+    if language in evaluators:
+        return evaluators[language]
+    raise ValueError(f"Unsupported language: {language}" + (" with test functions" if test_functions else ""))
+
+
+def format_result(program, result, runs):
+    # Only save the first 4K of output from the running program. Any futher
+    # output is very likely an exceptionally long stack trace or a long
+    # series of prints.
+    if type(result["stdout"]) == bytes:
+        result["stdout"] = result["stdout"].decode("utf-8", errors="ignore")
+    if result["stdout"] is None:
+        result["stdout"] = ""
+    if result["stderr"] is None:
+        result["stderr"] = ""
+    if type(result["stderr"]) == bytes:
+        result["stderr"] = result["stderr"].decode("utf-8", errors="ignore")
+    assert type(result["stdout"]) == str
+    assert type(result["stderr"]) == str
+    limit_exceeded = next((r.limit_exceeded for _, r in runs if r.limit_exceeded), None)
+    if limit_exceeded is not None and result["status"] != "OK":
+        result["status"] = LIMIT_STATUSES[limit_exceeded]
+    return {
+        "program": program,
+        "stdout": result["stdout"].replace("!!int", "")[:4096],
+        "stderr": result["stderr"][:4096],
+        "exit_code": result["exit_code"],
+        "status": result["status"],
+        **summarize_resources(runs),
+    }
+
+
+def summarize_resources(runs):
+    """
+    Sums the resources of the processes run to evaluate a program, splitting
+    the wall time between compilation and execution. Unknown values are None,
+    and so is the peak RSS when that of one of the runs is unknown, as for
+    requests to persistent workers, so that the scheduler does not learn the
+    memory cost of a language from the compiler alone.
+    """
+    if not runs:
+        return dict(wall_time=None, user_time=None, sys_time=None, peak_rss=None, compile_time=None, run_time=None)
+    return dict(
+        wall_time=sum(r.wall_time for _, r in runs),
+        user_time=sum(r.user_time for _, r in runs),
+        sys_time=sum(r.sys_time for _, r in runs),
+        peak_rss=None if any(r.peak_rss is None for _, r in runs) else max(r.peak_rss for _, r in runs),
+        compile_time=sum(r.wall_time for phase, r in runs if phase == "compile"),
+        run_time=sum(r.wall_time for phase, r in runs if phase == "run"),
+    )
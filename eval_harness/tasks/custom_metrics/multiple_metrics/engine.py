@@ -0,0 +1,123 @@
+"""
+Execution engine of the MultiPL-E evaluators.
+
+An evaluator is a generator function decorated with `evaluator`. It yields a
+`Command` for every process it needs (a compilation, a test run, ...), or a
+`Request` to a persistent worker (see worker_pool.py), receives the `Result`
+of each one (see safe_subprocess.py), and returns the result dict of the
+program. The same evaluator can then be driven in two ways:
+
+    eval_script(path)                  runs the commands with safe_subprocess.run
+    await eval_script.run_async(path)  runs them with safe_subprocess.run_async
+
+The asynchronous variant lets a single event loop supervise hundreds of
+concurrent compile and run processes, each command with its own deadline,
+instead of blocking one thread per process.
+
+Both take an optional `timeout_seconds`, e.g. the timeout of a HumanEvalPack
+problem, which replaces the timeout of the "run" steps of the evaluator. The
+compile steps keep their own timeout.
+"""
+
+import functools
+import os
+from typing import List
+
+from .safe_subprocess import record_run, run, run_async
+from .worker_pool import Request
+
+
+class Command:
+    """A process to run for an evaluator, with the arguments of `safe_subprocess.run`."""
+
+    def __init__(
+        self,
+        args: List[str],
+        timeout_seconds: int = 50,
+        max_output_size: int = 2048,
+        env=None,
+        phase: str = "run",
+    ):
+        self.args = args
+        self.timeout_seconds = timeout_seconds
+        self.max_output_size = max_output_size
+        self.env = env
+        self.phase = phase
+
+    def options(self):
+        return dict(
+            timeout_seconds=self.timeout_seconds,
+            max_output_size=self.max_output_size,
+            env=self.env,
+            phase=self.phase,
+        )
+
+
+def build_output_dir():
+    """
+    Returns the directory compiled candidates are written to, e.g. a tmpfs,
+    or None to write them next to their source.
+    """
+    return os.getenv("EVAL_HARNESS_BUILD_OUTPUT_DIR") or None
+
+
+def native_compilation():
+    """
+    Returns whether languages run by an interpreter by default (Haskell,
+    OCaml) are compiled to native binaries instead.
+    """
+    return os.getenv("EVAL_HARNESS_NATIVE_COMPILATION", "0") == "1"
+
+
+def evaluator(eval_script):
+    """
+    Turns a generator function `eval_script(path)` yielding `Command`s into a
+    function running it synchronously, with a `run_async` coroutine function
+    running it on the event loop.
+    """
+
+    @functools.wraps(eval_script)
+    def run_sync(path, timeout_seconds=None):
+        steps = eval_script(path)
+        try:
+            step = next(steps)
+            while True:
+                step = _with_timeout(step, timeout_seconds)
+                if isinstance(step, Request):
+                    result = step.pool.request(step.payload, **step.options())
+                    step = steps.send(_recorded(step, result))
+                else:
+                    step = steps.send(run(step.args, **step.options()))
+        except StopIteration as stop:
+            return stop.value
+
+    async def run_on_loop(path, timeout_seconds=None):
+        steps = eval_script(path)
+        try:
+            step = next(steps)
+            while True:
+                step = _with_timeout(step, timeout_seconds)
+                if isinstance(step, Request):
+                    result = await step.pool.request_async(step.payload, **step.options())
+                    step = steps.send(_recorded(step, result))
+                else:
+                    step = steps.send(await run_async(step.args, **step.options()))
+        except StopIteration as stop:
+            return stop.value
+
+    run_sync.run_async = run_on_loop
+    return run_sync
+
+
+def _with_timeout(step, timeout_seconds):
+    if timeout_seconds is not None and step.phase == "run":
+        step.timeout_seconds = timeout_seconds
+    return step
+
+
+def _recorded(request, result):
+    # Requests are served from threads of the pool, so their results are
+    # recorded here, in the context of the evaluation.
+    if result is not None:
+        record_run(request.phase, result)
+    return result
@@ -1,18 +1,67 @@
 """
 Evaluates a generated Clojure program (.clj).
 """
+import re
 from pathlib import Path
-from .safe_subprocess import run
 
+from ..execute import memory_limit_bytes
+from .engine import Command, evaluator
+from .worker_pool import Request, WorkerPool, WorkerResult
 
+RUNNER_PATH = Path(__file__).parent / "runners" / "ClojureRunner.clj"
+
+
+def runner_command(prepared):
+    # See eval_java.runner_command.
+    memory_limit = memory_limit_bytes()
+    heap = [f"-J-Xmx{memory_limit // 2 // 2**20}m"] if memory_limit else []
+    return ["clojure", "-J-XX:+UseSerialGC", "-J-XX:-UsePerfData", *heap, "-M", str(RUNNER_PATH)]
+
+
+# Clojure processes loading every candidate into a fresh namespace, see
+# runners/ClojureRunner.clj. Removing the namespaces of a candidate does not
+# undo what it changed globally, such as methods added to multimethods or
+# protocols extended to core types, so the workers are recycled more often.
+POOL = WorkerPool("clojure", runner_command, recycle_after=100)
+
+# The line clojure.test prints after running tests.
+SUMMARY = re.compile(r"^(\d+) failures, (\d+) errors\.$", re.MULTILINE)
+
+# Output kept from `clojure -M`, enough for the summary of the tests to follow
+# whatever the candidate prints. The result is cut as usual afterwards.
+CLI_OUTPUT_SIZE = 2**20
+
+
+def count_tests(result):
+    """
+    Returns the number of test summaries, failures and errors of a candidate:
+    counted by the worker, or read from the summaries `clojure -M` printed.
+    """
+    if isinstance(result, WorkerResult):
+        tests = result.response.get("tests") or {}
+        return tests.get("summary", 0), tests.get("fail", 0), tests.get("error", 0)
+    summaries = SUMMARY.findall(result.stdout)
+    return (
+        len(summaries),
+        sum(int(failures) for failures, _ in summaries),
+        sum(int(errors) for _, errors in summaries),
+    )
+
+
+@evaluator
 def eval_script(path: Path):
-    result = run(["clojure", "-J-Dclojure.main.report=stderr", "-M", str(path)])
+    result = yield Request(POOL, {"filename": str(path)})
+    if result is None:
+        result = yield Command(
+            ["clojure", "-J-Dclojure.main.report=stderr", "-M", str(path)], max_output_size=CLI_OUTPUT_SIZE
+        )
 
+    summaries, failures, errors = count_tests(result)
     if result.timeout:
         status = "Timeout"
     elif result.exit_code != 0:
         status = "Exception"
-    elif "\n0 failures, 0 errors.\n" in result.stdout:
+    elif summaries and not failures and not errors:
         status = "OK"
     else: # test failure
         status = "Exception"
@@ -22,4 +71,4 @@ def eval_script(path: Path):
         "exit_code": result.exit_code,
         "stdout": result.stdout,
         "stderr": result.stderr,
-    }
\ No newline at end of file
+    }
@@ -1,24 +1,122 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
 from pathlib import Path
 
+from ..execution_cache import toolchain_version
 from .generic_eval import main
-from .safe_subprocess import run
+from .engine import Command, build_output_dir, evaluator
 
 LANG_NAME = "C++"
 LANG_EXT = ".cpp"
 
+CXXFLAGS = ["-std=c++17", "-pipe"]
 
+# Directory of the precompiled headers, one per distinct include prelude,
+# compiler and flags.
+PCH_DIR = "~/.cache/eval_harness/pch"
+
+# The leading #include and `using namespace std;` lines of a program. Programs
+# of a benchmark share them, e.g. HumanEvalPack prefixes every candidate with
+# the same ~20 includes, so they are precompiled once and every candidate only
+# parses its own code.
+PRELUDE = re.compile(r"\A(?:[ \t]*(?:#include[ \t]*[<\"][^>\"\n]+[>\"]|using namespace std;)?[ \t]*\n)+")
+
+# Smallest number of included headers worth precompiling.
+MIN_PRELUDE_INCLUDES = 2
+
+# prelude: str => "building", "failed" or the directory of its precompiled header
+PRECOMPILED = {}
+
+
+def precompiled_headers_enabled():
+    return os.getenv("EVAL_HARNESS_PRECOMPILED_HEADERS", "1") != "0"
+
+
+def link_flags(program: str):
+    # As the HumanEvalPack metric, which links the problem computing MD5 sums with OpenSSL.
+    return ["-lcrypto", "-lssl"] if "<openssl/" in program else []
+
+
+def precompile_prelude(prelude: str):
+    """
+    Yields the commands building the precompiled header of `prelude` and
+    returns its directory, or None if it is being built by another candidate
+    or cannot be built.
+    """
+    state = PRECOMPILED.get(prelude)
+    if state is not None:
+        return None if state in ("building", "failed") else state
+    key = hashlib.sha256("\0".join([prelude, toolchain_version("cpp"), *CXXFLAGS]).encode("utf-8")).hexdigest()
+    directory = Path(PCH_DIR).expanduser() / key[:16]
+    if (directory / "prelude.h.gch").exists():
+        PRECOMPILED[prelude] = directory
+        return directory
+    # Candidates compiled while the header is built do without it.
+    PRECOMPILED[prelude] = "building"
+    directory.parent.mkdir(parents=True, exist_ok=True)
+    build_dir = Path(tempfile.mkdtemp(prefix=".pch-", dir=directory.parent))
+    try:
+        (build_dir / "prelude.h").write_text(prelude, encoding="utf-8")
+        result = yield Command(
+            ["g++", *CXXFLAGS, "-x", "c++-header", str(build_dir / "prelude.h"), "-o", str(build_dir / "prelude.h.gch")],
+            phase="compile",
+        )
+        if result.exit_code != 0:
+            PRECOMPILED[prelude] = "failed"
+            return None
+        try:
+            os.rename(build_dir, directory)
+        except OSError:
+            # Built concurrently by another run.
+            if not (directory / "prelude.h.gch").exists():
+                PRECOMPILED[prelude] = "failed"
+                return None
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+    PRECOMPILED[prelude] = directory
+    return directory
+
+
+@evaluator
 def eval_script(path: Path):
-    basename = ".".join(str(path).split(".")[:-1])
-    build_result = run(["g++", path, "-o", basename, "-std=c++17"])
-    if build_result.exit_code != 0:
-        return {
-            "status": "SyntaxError",
-            "exit_code": build_result.exit_code,
-            "stdout": build_result.stdout,
-            "stderr": build_result.stderr,
-        }
-
-    run_result = run([basename])
+    program = path.read_text(encoding="utf-8")
+    source = path
+    include_dirs = []
+    match = PRELUDE.match(program)
+    if precompiled_headers_enabled() and match and match.group().count("#include") >= MIN_PRELUDE_INCLUDES:
+        pch_dir = yield from precompile_prelude(match.group())
+        if pch_dir is not None:
+            # GCC uses prelude.h.gch in place of the first header the program
+            # includes, which keeps the line numbers of the program.
+            source = path.with_name(path.stem + "_pch" + LANG_EXT)
+            lines = match.group().count("\n")
+            source.write_text('#include "prelude.h"' + "\n" * lines + program[match.end():], encoding="utf-8")
+            include_dirs = ["-I", str(pch_dir)]
+
+    if build_output_dir():
+        basename = os.path.join(build_output_dir(), path.stem)
+    else:
+        basename = ".".join(str(path).split(".")[:-1])
+    try:
+        build_result = yield Command(
+            ["g++", *CXXFLAGS, *include_dirs, source, "-o", basename, *link_flags(program)], phase="compile"
+        )
+        if build_result.exit_code != 0:
+            return {
+                "status": "SyntaxError",
+                "exit_code": build_result.exit_code,
+                "stdout": build_result.stdout,
+                "stderr": build_result.stderr,
+            }
+
+        run_result = yield Command([basename])
+    finally:
+        if source != path:
+            source.unlink(missing_ok=True)
+        Path(basename).unlink(missing_ok=True)
     if "In file included from /shared/centos7/gcc/9.2.0-skylake/" in run_result.stderr:
         raise Exception("Skylake bug encountered")
     if "/4.8.2" in run_result.stderr:
@@ -1,7 +1,13 @@
 import os
+import shutil
 import subprocess
+from pathlib import Path
 
+from ..execute import memory_limit_bytes
+from ..execution_cache import toolchain_version
 from .generic_eval import main
+from .engine import Command, evaluator
+from .worker_pool import Request, WorkerPool, build_once
 
 LANG_NAME = "CSharp"
 LANG_EXT = ".cs"
@@ -11,64 +17,106 @@ LANG_EXT = ".cs"
 # 22: Any
 # 148: Elipsis
 
+# The .NET host shared by the C# and F# evaluators.
+RUNNER_DIR = Path(__file__).parent / "runners" / "dotnet"
+RUNNER_FILES = ["DotnetRunner.csproj", "Program.cs"]
 
+
+def build_runner(directory):
+    source = directory / "src"
+    source.mkdir()
+    for name in RUNNER_FILES:
+        shutil.copy(RUNNER_DIR / name, source / name)
+    subprocess.run(
+        ["dotnet", "build", str(source), "-c", "Release", "-o", str(directory / "bin"), "--nologo"],
+        env=dict(os.environ, DOTNET_CLI_TELEMETRY_OPTOUT="1"),
+        capture_output=True,
+        check=True,
+    )
+
+
+def prepare_runner():
+    inputs = [(RUNNER_DIR / name).read_text() for name in RUNNER_FILES] + [toolchain_version("fs")]
+    return build_once("dotnet-runner", inputs, build_runner)
+
+
+def dotnet_pool(language):
+    """
+    Returns a pool of .NET hosts compiling `language` ("cs" or "fs") in
+    memory and running each candidate in a collectible AssemblyLoadContext,
+    see runners/dotnet/Program.cs.
+    """
+
+    def command(directory):
+        # The GC heap is bounded below the memory limit of the worker, so that a
+        # candidate exhausting it gets an OutOfMemoryException the host can report.
+        memory_limit = memory_limit_bytes()
+        heap = [f"DOTNET_GCHeapHardLimit={memory_limit // 2:x}"] if memory_limit else []
+        return ["env", *heap, "dotnet", str(directory / "bin" / "DotnetRunner.dll"), language]
+
+    return WorkerPool(f"dotnet-{language}", command, prepare=prepare_runner)
+
+
+POOL = dotnet_pool("cs")
+
+
+@evaluator
 def eval_script(path: str):
     if ".cs" not in path.name:
         return
+    result = yield Request(POOL, {"source": path.read_text(encoding="utf-8"), "filename": str(path)})
+    if result is not None:
+        if result.response.get("phase") == "compile":
+            status = "SyntaxError"
+        elif result.timeout:
+            status = "Timeout"
+        elif result.exit_code != 0 or "Unhandled Exception" in result.stderr:
+            status = "Exception"
+        else:
+            status = "OK"
+        return {
+            "status": status,
+            "exit_code": result.exit_code,
+            "stdout": result.stdout or "None",
+            "stderr": result.stderr or "None",
+        }
+
     basename = ".".join(str(path).split(".")[:-1])
     binaryname = basename + ".exe"
-    build = subprocess.run(
+    build = yield Command(
         ["csc", "/d:DEBUG", "-r:System.Numerics.dll", path, f"/out:{binaryname}"],
-        capture_output=True,
+        timeout_seconds=120,
+        phase="compile",
     )
-    status = None
-    returncode = -1
-    output = None
-    if build.returncode != 0:
+    if build.exit_code != 0:
         # Well, it's a compile error. May be a type error or
         # something. But, why break the set convention
         status = "SyntaxError"
-        returncode = build.returncode
         output = build
     else:
-        try:
-            output = subprocess.run(
-                ["mono", binaryname],
-                env={"PATH": os.getenv("PATH"), "MONO_TRACE_LISTENER": "Console.Error"},
-                capture_output=True,
-                timeout=50,
-            )
-            returncode = output.returncode
-            output.stderr = str(output.stderr, "utf-8")
-            # mono return 0 even when failing
-            fail = (
-                "System.Diagnostics.DefaultTraceListener.Fail" in output.stderr
-                or "Unhandled Exception" in output.stderr
-            )
-            output.returncode = 1 if fail else 0
-            if output.returncode == 0:
-                status = "OK"
-            else:
-                # Well, it's a panic
-                status = "Exception"
-        except subprocess.TimeoutExpired as exc:
+        output = yield Command(
+            ["mono", binaryname],
+            env={"PATH": os.getenv("PATH"), "MONO_TRACE_LISTENER": "Console.Error"},
+        )
+        # mono return 0 even when failing
+        fail = (
+            "System.Diagnostics.DefaultTraceListener.Fail" in output.stderr
+            or "Unhandled Exception" in output.stderr
+        )
+        if output.timeout:
             status = "Timeout"
-            output = exc
+        elif not fail:
+            status = "OK"
+        else:
+            # Well, it's a panic
+            status = "Exception"
         os.remove(binaryname)
 
-    if output.stdout is not None:
-        output.stdout = output.stdout.decode("utf-8")
-    else:
-        output.stdout = "None"
-
-    if output.stderr == "":
-        output.stderr = "None"
-
     return {
         "status": status,
-        "exit_code": returncode,
-        "stdout": output.stdout,
-        "stderr": output.stderr,
+        "exit_code": output.exit_code,
+        "stdout": output.stdout or "None",
+        "stderr": output.stderr or "None",
     }
 
 
@@ -2,13 +2,14 @@ import os
 import re
 from pathlib import Path
 
-from .safe_subprocess import run
+from .engine import Command, evaluator
 
 ENABLE_SYNTAX_CHECK = False
 
 
+@evaluator
 def eval_script(path: Path):
-    result = run(["rdmd", "-unittest", str(path)], timeout_seconds=15)
+    result = yield Command(["rdmd", "-unittest", str(path)], timeout_seconds=15)
     if "might not be correctly installed" in result.stderr:
         raise Exception("D is not correctly installed")
 
@@ -1,8 +1,19 @@
 from pathlib import Path
-from .safe_subprocess import run
+from .engine import Command, evaluator
+from .eval_cs import dotnet_pool
+from .worker_pool import Request
 
+# .NET hosts compiling every script with the F# compiler loaded once, see runners/dotnet/Program.cs.
+POOL = dotnet_pool("fs")
+
+@evaluator
 def eval_script(path: Path):
-    r = run(["dotnet", "fsi", "-d:DEBUG", str(path)])
+    r = yield Request(POOL, {"source": path.read_text(encoding="utf-8"), "filename": str(path)})
+    if r is None:
+        r = yield Command(["dotnet", "fsi", "-d:DEBUG", str(path)])
+    elif r.response.get("phase") == "compile":
+        # dotnet fsi fails like any other error.
+        r.exit_code = r.exit_code or 1
     if r.timeout:
         status = "Timeout"
     elif r.exit_code == 0:
@@ -1,42 +1,49 @@
-import subprocess
+import os
+import tempfile
 from pathlib import Path
-from sys import exit
 
 from .generic_eval import main as gmain
+from .engine import Command, build_output_dir, evaluator
 
+# Build cache shared by all candidates, which only compile their own package
+# against the cached standard library and testing harness.
+GO_CACHE_DIR = "~/.cache/eval_harness/go-build"
 
-def eval_script(path: Path):
-    status = None
-    stdout = None
-    stderr = None
-    exit_code = None
-    try:
-        build = subprocess.run(
-            ["go", "test", path],
-            timeout=120,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
 
-        stdout = build.stdout.decode("utf-8", errors="ignore")
-        stderr = build.stderr.decode("utf-8", errors="ignore")
-        exit_code = build.returncode
-        # write to stderr just so that we can redirect stdout to a csv
+def go_env():
+    return dict(os.environ, GOCACHE=os.path.expanduser(GO_CACHE_DIR))
+
 
-        if "[setup failed]" in stdout or "[build failed]" in stdout:
+@evaluator
+def eval_script(path: Path):
+    # The test binary is compiled and run separately, so that building and
+    # testing have their own timeouts and resources.
+    with tempfile.TemporaryDirectory(dir=build_output_dir()) as outdir:
+        binary = os.path.join(outdir, "test")
+        build = yield Command(
+            ["go", "test", "-c", "-o", binary, str(path)], timeout_seconds=120, env=go_env(), phase="compile"
+        )
+        if build.timeout:
+            status = "Timeout"
+            result = build
+        elif build.exit_code != 0:
             status = "SyntaxError"
-        elif "FAIL" in stdout:
-            status = "Exception"
+            result = build
         else:
-            status = "OK"
-    except subprocess.TimeoutExpired:
-        status = "Timeout"
+            # As `go test` runs it.
+            result = yield Command([binary, "-test.paniconexit0"], timeout_seconds=120)
+            if result.timeout:
+                status = "Timeout"
+            elif "FAIL" in result.stdout or result.exit_code != 0:
+                status = "Exception"
+            else:
+                status = "OK"
 
     return {
         "status": status,
-        "exit_code": exit_code,
-        "stdout": stdout,
-        "stderr": stderr,
+        "exit_code": None if result.timeout else result.exit_code,
+        "stdout": None if result.timeout else result.stdout,
+        "stderr": None if result.timeout else result.stderr,
     }
 
 
@@ -1,8 +1,22 @@
+import os
+import tempfile
 from pathlib import Path
-from .safe_subprocess import run
+from .engine import Command, build_output_dir, evaluator, native_compilation
 
+@evaluator
 def eval_script(path: Path):
-    r = run(["runghc", str(path)])
+    if native_compilation():
+        # The interface and object files go to a directory of the candidate,
+        # so that concurrent compilations do not share them.
+        with tempfile.TemporaryDirectory(dir=build_output_dir()) as outdir:
+            binary = os.path.join(outdir, "main")
+            r = yield Command(
+                ["ghc", "-O0", "-outputdir", outdir, "-o", binary, str(path)], timeout_seconds=120, phase="compile"
+            )
+            if r.exit_code == 0:
+                r = yield Command([binary])
+    else:
+        r = yield Command(["runghc", str(path)])
     if r.timeout:
         status = "Timeout"
     elif r.exit_code == 0:
@@ -16,4 +30,4 @@ def eval_script(path: Path):
         "exit_code": r.exit_code,
         "stdout": r.stdout,
         "stderr": r.stderr,
-    }
\ No newline at end of file
+    }
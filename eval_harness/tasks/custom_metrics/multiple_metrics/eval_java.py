@@ -1,39 +1,105 @@
 import os
+import re
+import subprocess
 import tempfile
 from pathlib import Path
 
+from ..execute import memory_limit_bytes
+from ..execution_cache import toolchain_version
 from .generic_eval import main
-from .safe_subprocess import run
+from .engine import Command, evaluator
+from .worker_pool import Request, WorkerPool, build_once
 
 LANG_NAME = "Java"
 LANG_EXT = ".java"
 
+JAVATUPLES_PATH = Path("/container/multipl-e/javatuples-1.2.jar")
+
+RUNNER_SOURCE = Path(__file__).parent / "runners" / "JavaRunner.java"
+
+# MultiPL-E programs define a class Problem, HumanEvalPack ones a public class Main.
+PUBLIC_CLASS = re.compile(r"^public\s+(?:final\s+)?class\s+(\w+)", re.M)
+
 # Following files have problems:
 # 137,
 # 22: Any
 # 148: Elipsis
 
 
+def build_runner(directory):
+    subprocess.run(
+        ["javac", "-encoding", "UTF8", "-d", str(directory), str(RUNNER_SOURCE)],
+        capture_output=True,
+        check=True,
+    )
+
+
+def runner_command(directory):
+    # The heap is bounded below the memory limit of the worker, so that a
+    # candidate exhausting it gets an OutOfMemoryError the runner can report.
+    memory_limit = memory_limit_bytes()
+    heap = [f"-Xmx{memory_limit // 2 // 2**20}m"] if memory_limit else []
+    return [
+        "java", "-ea", "-XX:+UseSerialGC", "-XX:-UsePerfData", *heap,
+        "-cp", f"{directory}:{JAVATUPLES_PATH}", "JavaRunner",
+    ]
+
+
+# JVMs compiling candidates in memory with javax.tools and running each in a
+# class loader of its own, see runners/JavaRunner.java.
+POOL = WorkerPool(
+    "java",
+    runner_command,
+    prepare=lambda: build_once("java-runner", [RUNNER_SOURCE.read_text(), toolchain_version("java")], build_runner),
+)
+
+
+def main_class(program: str) -> str:
+    match = PUBLIC_CLASS.search(program)
+    return match.group(1) if match else "Problem"
+
+
+@evaluator
 def eval_script(path: Path):
+    program = path.read_text(encoding="utf-8")
+    result = yield Request(POOL, {"source": program, "class": main_class(program)})
+    if result is not None:
+        if result.response.get("phase") == "compile":
+            status = "SyntaxError"
+        elif result.timeout:
+            status = "Timeout"
+        elif result.exit_code == 0:
+            status = "OK"
+        else:
+            status = "Exception"
+        return {
+            "status": status,
+            "exit_code": result.exit_code,
+            "stdout": result.stdout,
+            "stderr": result.stderr,
+        }
 
     sys_env = os.environ.copy()
-    javatuples_path = Path("/container/multipl-e/javatuples-1.2.jar")
 
-    sys_env["CLASSPATH"] = f"{javatuples_path}"
+    sys_env["CLASSPATH"] = f"{JAVATUPLES_PATH}"
 
     with tempfile.TemporaryDirectory() as outdir:
         # Each Java file contains the class with same name `JAVA_CLASS_NAME`
         # Hence, javac will same JAVA_CLASS_NAME.class file for each problem
         # Write class for each problem to a different temp dir
         # Use UTF8 encoding with javac
-        result = run(["javac", "-encoding", "UTF8", "-d", outdir, path], env=sys_env)
+        # A public class must be compiled from a file of the same name.
+        if PUBLIC_CLASS.search(program):
+            path = Path(outdir) / f"{main_class(program)}.java"
+            path.write_text(program, encoding="utf-8")
+        result = yield Command(["javac", "-encoding", "UTF8", "-d", outdir, path], env=sys_env, phase="compile")
 
         if result.exit_code != 0:
             # Well, it's a compile error. May be a type error or
             # something. But, why break the set convention
             status = "SyntaxError"
         else:
-            result = run(["java", "-ea", "-cp", f"{outdir}", "Problem"], env=sys_env)
+            result = yield Command(["java", "-ea", "-cp", f"{outdir}", main_class(program)], env=sys_env)
             if result.timeout:
                 status = "Timeout"
             elif result.exit_code == 0:
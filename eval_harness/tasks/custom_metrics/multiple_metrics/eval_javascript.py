@@ -1,39 +1,40 @@
 import os
-import subprocess
 from pathlib import Path
 
+from .engine import Command, evaluator
+from .worker_pool import Request, WorkerPool
 
-def eval_script(path: Path):
-    try:
-        # Assumes exit-code 0 is all okay
-        output = subprocess.run(["node", str(path)], capture_output=True, timeout=5)
+RUNNER_PATH = Path(__file__).parent / "runners" / "NodeRunner.js"
 
-        if output.returncode == 0:
-            status = "OK"
-        else:
-            outmessage = str(output)
-            if "ERR_ASSERTION" in outmessage:
-                status = "AssertionError"
-            elif "SyntaxError" in outmessage:
-                status = "SyntaxError"
-            elif "ReferenceError" in outmessage:
-                status = "ReferenceError"
-            else:
-                status = "Exception"
-        returncode = output.returncode
-    except subprocess.TimeoutExpired as exc:
+# Node processes running every candidate in a fresh vm context, see runners/NodeRunner.js.
+POOL = WorkerPool("node", lambda prepared: ["node", str(RUNNER_PATH)])
+
+
+@evaluator
+def eval_script(path: Path):
+    # Assumes exit-code 0 is all okay
+    output = yield Request(POOL, {"source": path.read_text(encoding="utf-8"), "filename": str(path)}, timeout_seconds=5)
+    if output is None:
+        output = yield Command(["node", str(path)], timeout_seconds=5)
+    if output.timeout:
         status = "Timeout"
-        output = exc
-        returncode = -1
-    except subprocess.CalledProcessError as exc:
-        status = "Exception"
-        returncode = exc.returncode
-        output = exc
+    elif output.exit_code == 0:
+        status = "OK"
+    else:
+        outmessage = output.stdout + output.stderr
+        if "ERR_ASSERTION" in outmessage:
+            status = "AssertionError"
+        elif "SyntaxError" in outmessage:
+            status = "SyntaxError"
+        elif "ReferenceError" in outmessage:
+            status = "ReferenceError"
+        else:
+            status = "Exception"
     return {
         "status": status,
-        "exit_code": returncode,
-        "stdout": "" if output.stdout is None else output.stdout.decode("utf-8"),
-        "stderr": "" if output.stderr is None else output.stderr.decode("utf-8"),
+        "exit_code": output.exit_code,
+        "stdout": output.stdout,
+        "stderr": output.stderr,
     }
 
 
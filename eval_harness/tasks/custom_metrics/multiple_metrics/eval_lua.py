@@ -1,10 +1,11 @@
 from pathlib import Path
 
-from .safe_subprocess import run
+from .engine import Command, evaluator
 
 
+@evaluator
 def eval_script(path: Path):
-    r = run(["lua", str(path)])
+    r = yield Command(["lua", str(path)])
     if r.timeout:
         status = "Timeout"
     elif r.exit_code == 0:
@@ -1,8 +1,24 @@
+import os
+import shutil
+import tempfile
 from pathlib import Path
-from .safe_subprocess import run
+from .engine import Command, build_output_dir, evaluator, native_compilation
 
+@evaluator
 def eval_script(path: Path):
-    r = run(["ocaml", str(path)])
+    if native_compilation():
+        # ocamlopt writes the .cmi, .cmx and .o files next to the source, so
+        # it compiles a copy in a directory of the candidate.
+        with tempfile.TemporaryDirectory(dir=build_output_dir()) as outdir:
+            source = shutil.copy(path, outdir)
+            binary = os.path.join(outdir, "main")
+            r = yield Command(
+                ["ocamlfind", "ocamlopt", "-linkpkg", source, "-o", binary], timeout_seconds=120, phase="compile"
+            )
+            if r.exit_code == 0:
+                r = yield Command([binary])
+    else:
+        r = yield Command(["ocaml", str(path)])
     if r.timeout:
         status = "Timeout"
     elif r.exit_code == 0:
@@ -18,4 +34,4 @@ def eval_script(path: Path):
         "exit_code": r.exit_code,
         "stdout": r.stdout,
         "stderr": r.stderr,
-    }
\ No newline at end of file
+    }
@@ -1,13 +1,14 @@
 from pathlib import Path
 
-from .safe_subprocess import run
+from .engine import Command, evaluator
 
 LANG_NAME = "PHP"
 LANG_EXT = ".php"
 
 
+@evaluator
 def eval_script(path: Path):
-    r = run(["php", path])
+    r = yield Command(["php", path])
     if "PHP Parse error" in r.stdout:
         status = "SyntaxError"
     elif r.exit_code != 0:
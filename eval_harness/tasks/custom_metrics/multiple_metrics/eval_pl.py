@@ -1,10 +1,11 @@
 from pathlib import Path
 
-from .safe_subprocess import run
+from .engine import Command, evaluator
 
 
+@evaluator
 def eval_script(path: Path):
-    r = run(["perl", path])
+    r = yield Command(["perl", path])
 
     if r.timeout:
         status = "Timeout"
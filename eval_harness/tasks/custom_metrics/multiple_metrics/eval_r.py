@@ -1,35 +1,56 @@
 import os
-import subprocess
 from pathlib import Path
 
+from .engine import Command, evaluator
+from .worker_pool import Request, WorkerPool
 
+RUNNER_PATH = Path(__file__).parent / "runners" / "RRunner.R"
+
+# R processes evaluating every candidate in a new environment, see runners/RRunner.R.
+POOL = WorkerPool("r", lambda prepared: ["Rscript", str(RUNNER_PATH)])
+
+# Statuses of the "error_class" reported by the workers.
+ERROR_CLASS_STATUSES = {
+    "syntax": "SyntaxError",
+    "assertion": "AssertionError",
+    "runtime": "Exception",
+    "timeout": "Timeout",
+}
+
+
+@evaluator
 def eval_script(path: Path):
-    try:
-        # Assumes exit-code 0 is all okay
-        # Run R on the file, capturing stderr
-        output = subprocess.run(["Rscript", str(path)], capture_output=True, timeout=5)
-        if output.returncode == 0:
+    output = yield Request(POOL, {"filename": str(path)}, timeout_seconds=5)
+    if output is not None:
+        if output.timeout:
+            status = "Timeout"
+        elif output.exit_code == 0:
             status = "OK"
         else:
-            outmessage = str(output)
-            if "unexpected" in outmessage:
-                status = "SyntaxError"
-            elif "err=b''" in outmessage:
-                status = "AssertionError"
-            else:
-                status = "Exception"
-        returncode = output.returncode
-    except subprocess.TimeoutExpired as exc:
+            status = ERROR_CLASS_STATUSES.get(output.response.get("error_class"), "Exception")
+        return {
+            "status": status,
+            "exit_code": output.exit_code,
+            "stdout": output.stdout,
+            "stderr": output.stderr,
+        }
+
+    # Assumes exit-code 0 is all okay
+    # Run R on the file, capturing stderr
+    output = yield Command(["Rscript", str(path)], timeout_seconds=5)
+    if output.timeout:
         status = "Timeout"
-        output = exc
-        returncode = -1
-    except subprocess.CalledProcessError as exc:
+    elif output.exit_code == 0:
+        status = "OK"
+    elif "unexpected" in output.stdout + output.stderr:
+        status = "SyntaxError"
+    elif output.stderr == "":
+        status = "AssertionError"
+    else:
         status = "Exception"
-        returncode = exc.returncode
-        output = exc
     return {
         "status": status,
-        "exit_code": returncode,
+        "exit_code": output.exit_code,
         "stdout": output.stdout,
         "stderr": output.stderr,
     }
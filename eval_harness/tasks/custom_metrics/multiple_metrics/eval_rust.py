@@ -1,54 +1,140 @@
+import json
 import os
 import subprocess
+import threading
 from pathlib import Path
 
+from ..execution_cache import toolchain_version
 from .generic_eval import main
+from .engine import Command, evaluator
+from .worker_pool import WorkerUnavailable, build_once
 
 LANG_NAME = "Rust"
 LANG_EXT = ".rs"
 
+# The crates of the cargo project of the HumanEvalPack metric, which its Rust
+# candidates use (`use rand::Rng;`, `use regex::Regex;`, `use md5;`).
+DEPENDENCIES = {
+    "rand": "0.4",
+    "regex": "1",
+    "md5": "0.7.0",
+}
 
+EDITION = "2021"
+
+# Seconds cargo may take to fetch and build DEPENDENCIES.
+DEPENDENCY_BUILD_TIMEOUT = 600
+
+_DEPENDENCY_FLAGS = None
+_DEPENDENCY_FLAGS_LOCK = threading.Lock()
+
+
+def build_dependencies(directory: Path):
+    """Builds DEPENDENCIES with cargo in `directory` and saves the rlib of each one in externs.json."""
+    manifest = "\n".join(
+        [
+            "[package]",
+            'name = "eval_harness_dependencies"',
+            'version = "0.1.0"',
+            f'edition = "{EDITION}"',
+            "",
+            "[dependencies]",
+            *(f'{name} = "{version}"' for name, version in DEPENDENCIES.items()),
+        ]
+    )
+    (directory / "Cargo.toml").write_text(manifest + "\n")
+    (directory / "src").mkdir()
+    (directory / "src" / "lib.rs").write_text("")
+    build = subprocess.run(
+        ["cargo", "build", "--message-format=json"],
+        cwd=directory,
+        env=dict(os.environ, CARGO_TARGET_DIR=str(directory / "target")),
+        capture_output=True,
+        check=True,
+        timeout=DEPENDENCY_BUILD_TIMEOUT,
+    )
+    externs = {}
+    for line in build.stdout.decode("utf-8").splitlines():
+        message = json.loads(line)
+        if message.get("reason") != "compiler-artifact" or message["target"]["name"] not in DEPENDENCIES:
+            continue
+        for filename in message["filenames"]:
+            if filename.endswith(".rlib"):
+                # Relative, since the directory is moved into place after the build.
+                externs[message["target"]["name"]] = os.path.relpath(filename, directory)
+    (directory / "externs.json").write_text(json.dumps(externs))
+
+
+def dependency_flags():
+    """
+    Returns the rustc flags linking candidates against DEPENDENCIES, which are
+    built once per toolchain and shared by all candidates, or [] if they
+    cannot be built, e.g. without access to crates.io.
+    """
+    global _DEPENDENCY_FLAGS
+    with _DEPENDENCY_FLAGS_LOCK:
+        if _DEPENDENCY_FLAGS is None:
+            try:
+                directory = build_once(
+                    "rust-dependencies", [json.dumps(DEPENDENCIES), EDITION, toolchain_version("rust")], build_dependencies
+                )
+                externs = json.loads((directory / "externs.json").read_text())
+                _DEPENDENCY_FLAGS = ["-L", f"dependency={directory / 'target' / 'debug' / 'deps'}"]
+                for name, rlib in externs.items():
+                    _DEPENDENCY_FLAGS += ["--extern", f"{name}={directory / rlib}"]
+            except WorkerUnavailable as e:
+                print(f"Rust dependencies are unavailable, compiling candidates without them: {e}")
+                _DEPENDENCY_FLAGS = []
+        return _DEPENDENCY_FLAGS
+
+
+@evaluator
 def eval_script(path: Path):
+    """Evaluates a MultiPL-E program, whose tests are assertions in `main`."""
+    return (yield from compile_and_run(path, []))
+
+
+@evaluator
+def eval_test_script(path: Path):
+    """
+    Evaluates a HumanEvalPack program, whose tests are #[test] functions,
+    built and run like `cargo test` would in the metric's project. The
+    dependencies are built by HumanEvalPack before the evaluation starts.
+    """
+    return (yield from compile_and_run(path, ["--test", "--edition", EDITION, *dependency_flags()]))
+
+
+def compile_and_run(path: Path, flags):
     basename = ".".join(str(path).split(".")[:-1])
-    try:
-        build = subprocess.run(
-            ["rustc", path, "-o", basename], capture_output=True, timeout=150
-        )
-    except subprocess.TimeoutExpired as exc:
+    build = yield Command(["rustc", path, *flags, "-o", basename], timeout_seconds=150, phase="compile")
+    if build.timeout:
         return {
             "status": "Timeout",
             "exit_code": -1,
             "stdout": "Compiler timeout",
             "stderr": "Compiler timeout",
         }
-    status = None
-    returncode = -1
-    output = None
-    if build.returncode != 0:
+    if build.exit_code != 0:
         # Well, it's a compile error. May be a type error or
         # something. But, why break the set convention
         status = "SyntaxError"
-        returncode = build.returncode
         output = build
     else:
-        try:
-            # Assumes exit-code 0 is all okay
-            output = subprocess.run([basename], capture_output=True, timeout=50)
-            returncode = output.returncode
-            if output.returncode == 0:
-                status = "OK"
-            else:
-                # Well, it's a panic
-                status = "Exception"
-        except subprocess.TimeoutExpired as exc:
+        # Assumes exit-code 0 is all okay
+        output = yield Command([basename])
+        if output.timeout:
             status = "Timeout"
-            output = exc
+        elif output.exit_code == 0:
+            status = "OK"
+        else:
+            # Well, it's a panic
+            status = "Exception"
         os.remove(basename)
     return {
         "status": status,
-        "exit_code": returncode,
-        "stdout": "" if output.stdout is None else output.stdout.decode("utf-8"),
-        "stderr": "" if output.stderr is None else output.stderr.decode("utf-8"),
+        "exit_code": output.exit_code,
+        "stdout": output.stdout,
+        "stderr": output.stderr,
     }
 
 
@@ -1,36 +1,88 @@
+import shutil
+import subprocess
 import tempfile
 from pathlib import Path
 
-from .safe_subprocess import run
+from ..execute import memory_limit_bytes
+from ..execution_cache import toolchain_version
+from .engine import Command, evaluator
+from .worker_pool import Request, WorkerPool, WorkerUnavailable, build_once
 
 LANG_NAME = "Scala"
 LANG_EXT = ".scala"
 
+RUNNER_SOURCE = Path(__file__).parent / "runners" / "ScalaRunner.scala"
 
+
+def scala_classpath():
+    """Returns the jars of the Scala distribution providing `scalac`, which include the compiler."""
+    scalac = shutil.which("scalac")
+    if scalac is None:
+        raise WorkerUnavailable("scalac is not installed")
+    # scalac links to bin/scalac of the distribution, e.g. /usr/share/scala-2.11.
+    jars = sorted(str(jar) for jar in (Path(scalac).resolve().parent.parent / "lib").glob("*.jar"))
+    if not jars:
+        raise WorkerUnavailable(f"no Scala distribution found next to {scalac}")
+    return ":".join(jars)
+
+
+def build_runner(directory):
+    subprocess.run(["scalac", "-d", str(directory), str(RUNNER_SOURCE)], capture_output=True, check=True)
+
+
+def prepare_runner():
+    classpath = scala_classpath()
+    directory = build_once("scala-runner", [RUNNER_SOURCE.read_text(), toolchain_version("scala")], build_runner)
+    return f"{directory}:{classpath}"
+
+
+def runner_command(classpath):
+    # See eval_java.runner_command.
+    memory_limit = memory_limit_bytes()
+    heap = [f"-Xmx{memory_limit // 2 // 2**20}m"] if memory_limit else []
+    return ["java", "-XX:+UseSerialGC", "-XX:-UsePerfData", *heap, "-cp", classpath, "ScalaRunner"]
+
+
+# JVMs running the Scala compiler and each candidate in a class loader of its
+# own, see runners/ScalaRunner.scala.
+POOL = WorkerPool("scala", runner_command, prepare=prepare_runner)
+
+
+@evaluator
 def eval_script(path: Path):
-    with tempfile.TemporaryDirectory() as outdir:
-        # Each Scala file contains the class with same name `JAVA_CLASS_NAME`
-        # Hence, scalac will same JAVA_CLASS_NAME.class file for each problem
-        # Write class for each problem to a different temp dir
-        build = run(["scalac", "-d", outdir, path], timeout_seconds=60)
-        if build.exit_code != 0:
-            # Well, it's a compile error. May be a type error or
-            # something. But, why break the set convention
+    # "Problem" is the name of the class we emit.
+    r = yield Request(POOL, {"source": path.read_text(encoding="utf-8"), "class": "Problem"})
+    if r is not None:
+        if r.response.get("phase") == "compile":
             return {
                 "status": "SyntaxError",
-                "exit_code": build.exit_code,
-                "stdout": build.stdout,
-                "stderr": build.stderr,
+                "exit_code": r.exit_code,
+                "stdout": r.stdout,
+                "stderr": r.stderr,
             }
-        # "Problem" is the name of the class we emit.
-        r = run(["scala", "-cp", f"{outdir}", "Problem"])
-        if r.timeout:
-            status = "Timeout"
-        elif r.exit_code == 0 and r.stderr == "":
-            status = "OK"
-        else:
-            # Well, it's a panic
-            status = "Exception"
+    else:
+        with tempfile.TemporaryDirectory() as outdir:
+            # Each Scala file contains the class with same name `JAVA_CLASS_NAME`
+            # Hence, scalac will same JAVA_CLASS_NAME.class file for each problem
+            # Write class for each problem to a different temp dir
+            build = yield Command(["scalac", "-d", outdir, path], timeout_seconds=60, phase="compile")
+            if build.exit_code != 0:
+                # Well, it's a compile error. May be a type error or
+                # something. But, why break the set convention
+                return {
+                    "status": "SyntaxError",
+                    "exit_code": build.exit_code,
+                    "stdout": build.stdout,
+                    "stderr": build.stderr,
+                }
+            r = yield Command(["scala", "-cp", f"{outdir}", "Problem"])
+    if r.timeout:
+        status = "Timeout"
+    elif r.exit_code == 0 and r.stderr == "":
+        status = "OK"
+    else:
+        # Well, it's a panic
+        status = "Exception"
     return {
         "status": status,
         "exit_code": r.exit_code,
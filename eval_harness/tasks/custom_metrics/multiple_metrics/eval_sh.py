@@ -1,14 +1,15 @@
 from pathlib import Path
 
-from .safe_subprocess import run
+from .engine import Command, evaluator
 
 LANG_NAME = "bash"
 LANG_EXT = ".sh"
 
 
+@evaluator
 def eval_script(path: Path):
     # Capture output - will be generated regardless of success, fail, or syntax error
-    p = run(["bash", path])
+    p = yield Command(["bash", path])
     if p.timeout:
         status = "Timeout"
     elif p.exit_code == 0:
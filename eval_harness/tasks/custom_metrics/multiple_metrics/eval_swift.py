@@ -1,12 +1,13 @@
 import os
 from pathlib import Path
 
-from .safe_subprocess import run
+from .engine import Command, evaluator
 
 
+@evaluator
 def eval_script(path: Path):
     basename = ".".join(str(path).split(".")[:-1])
-    r = run(["swiftc", path, "-o", basename], timeout_seconds=45)
+    r = yield Command(["swiftc", path, "-o", basename], timeout_seconds=45, phase="compile")
     if r.timeout:
         status = "Timeout"
     elif r.exit_code != 0:
@@ -14,7 +15,7 @@ def eval_script(path: Path):
         # something. But, why break the set convention
         status = "SyntaxError"
     else:
-        r = run([basename], timeout_seconds=5)
+        r = yield Command([basename], timeout_seconds=5)
         if r.timeout:
             status = "Timeout"
         elif r.exit_code != 0:
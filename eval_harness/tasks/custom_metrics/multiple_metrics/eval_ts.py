@@ -1,11 +1,41 @@
+import shutil
 from pathlib import Path
 
-from .safe_subprocess import run
+from .engine import Command, evaluator
+from .worker_pool import Request, WorkerPool, WorkerUnavailable
 
+RUNNER_PATH = Path(__file__).parent / "runners" / "NodeRunner.js"
 
+
+def typescript_package():
+    """Returns the directory of the typescript package providing `tsc`."""
+    tsc = shutil.which("tsc")
+    if tsc is None:
+        raise WorkerUnavailable("tsc is not installed")
+    # tsc links to bin/tsc of the package.
+    return Path(tsc).resolve().parent.parent
+
+
+# Node processes type checking and transpiling every candidate with the
+# TypeScript compiler loaded once, see runners/NodeRunner.js.
+POOL = WorkerPool(
+    "typescript",
+    lambda package: ["node", str(RUNNER_PATH), f"--typescript={package}"],
+    prepare=typescript_package,
+)
+
+
+@evaluator
 def eval_script(path: Path):
-    r = run(["tsc", "--target", "esnext", str(path)], timeout_seconds=50)
-    if r.exit_code != 0:
+    r = yield Request(POOL, {"source": path.read_text(encoding="utf-8"), "filename": str(path)}, timeout_seconds=50)
+    if r is not None:
+        compiled = r.response.get("phase") != "compile"
+    else:
+        r = yield Command(["tsc", "--target", "esnext", str(path)], timeout_seconds=50, phase="compile")
+        compiled = r.exit_code == 0
+        if compiled:
+            r = yield Command(["node", str(path).replace(".ts", ".js")], timeout_seconds=50)
+    if not compiled:
         return {
             "status": "SyntaxError",
             "exit_code": r.exit_code,
@@ -13,7 +43,6 @@ def eval_script(path: Path):
             "stderr": r.stderr,
         }
 
-    r = run(["node", str(path).replace(".ts", ".js")], timeout_seconds=50)
     if r.timeout:
         status = "Timeout"
     elif r.exit_code == 0:
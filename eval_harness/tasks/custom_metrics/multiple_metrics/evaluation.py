@@ -1,51 +1,114 @@
+import asyncio
 import json
+import os
 import time
-from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from threading import Lock
-from typing import Optional
+from typing import List, Optional, Tuple, Union
 
-from .containerized_eval import eval_string_script
+from tqdm import tqdm
+
+from ..dedup import group_candidates
+from ..execution_cache import cache_key, get_execution_cache, is_cacheable
+from .. import resource_report
+from ..results_journal import get_results_journal
+from ..scheduler import AdmissionScheduler
+from .containerized_eval import eval_string_script_async, prepare_evaluator
 
 # Get working directory
 WORKING_DIR = Path(__file__).parent.parent
 
-# program: str => Result
+# Keys of a problem that change how its completions are evaluated, passed on
+# to the evaluator (see containerized_eval.py). HumanEvalPack problems set the
+# "timeout_seconds" of their runs, and Rust ones "test_functions", since their
+# tests are #[test] functions.
+EVALUATION_OPTIONS = ["test_functions", "timeout_seconds"]
+
+# (program: str, options) => Result, or the future of its evaluation while it runs
 CACHE = dict()
 CACHE_LOCK = Lock()
 
 
-def cache_get(program: str) -> Optional[dict]:
-    if program in CACHE:
-        result = CACHE[program]
+def cache_get(key: Tuple[str, tuple]) -> Optional[Union[dict, asyncio.Future]]:
+    if key in CACHE:
+        result = CACHE[key]
         return result
     else:
         return None
 
 
-def cache_set(program: str, result: dict):
-    if program in CACHE:
+def cache_set(key: Tuple[str, tuple], result: Union[dict, asyncio.Future]):
+    if key in CACHE:
         print("Setting already-existing cache")
-    CACHE[program] = result
+    CACHE[key] = result
 
 
 def cached_eval_script(problem, index) -> dict:
-    # here prompt is already included in completions
-    program = problem["completions"][index] + "\n" + problem["tests"]
-    CACHE_LOCK.acquire(True)
-    cached = cache_get(program)
-    if cached is not None:
-        CACHE_LOCK.release()
-        return cached
+    return asyncio.run(cached_eval_script_async(problem, index))
+
+
+async def cached_eval_script_async(problem, index, scheduler: Optional[AdmissionScheduler] = None) -> dict:
+    program = get_program(problem, index)
+    key = (program, tuple(sorted(evaluation_options(problem).items())))
+    with CACHE_LOCK:
+        cached = cache_get(key)
+        if cached is None:
+            # While the program is evaluated, the cache holds the evaluation,
+            # so that the same program queued by another problem awaits it.
+            cached = asyncio.ensure_future(_eval_script_async(problem, index, key, scheduler))
+            cache_set(key, cached)
+    if isinstance(cached, asyncio.Future):
+        return await asyncio.shield(cached)
+    return cached
+
+
+async def _eval_script_async(problem, index, cache_entry, scheduler) -> dict:
+    program, _ = cache_entry
+    # The in-process CACHE only covers this run, the execution cache
+    # persists results across runs and tasks.
+    execution_cache = get_execution_cache()
+    if execution_cache:
+        key = cache_key(
+            problem["completions"][index], problem["tests"], problem["language"], None, evaluation_options(problem)
+        )
+        result_dict = execution_cache.get(key)
+        if result_dict is None:
+            result_dict = await _execute(problem, program, scheduler)
+            if is_cacheable(result_dict):
+                execution_cache.set(key, result_dict)
     else:
-        result_yaml = dict()
-        cache_set(program, result_yaml)
-        CACHE_LOCK.release()
-        result_dict = eval_string_script(problem["language"], program)
-        for k in result_dict.keys():
-            result_yaml[k] = result_dict[k]
-            result_yaml["timestamp"] = int(time.time())
-        return result_yaml
+        result_dict = await _execute(problem, program, scheduler)
+    result_yaml = dict(result_dict, timestamp=int(time.time()))
+    with CACHE_LOCK:
+        CACHE[cache_entry] = result_yaml
+    return result_yaml
+
+
+async def _execute(problem, program, scheduler) -> dict:
+    language = problem["language"]
+    options = evaluation_options(problem)
+    if scheduler is None:
+        result_dict = await eval_string_script_async(language, program, **options)
+    else:
+        async with scheduler.admit(language):
+            result_dict = await eval_string_script_async(language, program, **options)
+        scheduler.observe(language, result_dict)
+    resource_report.record(problem_name(problem), result_dict)
+    return result_dict
+
+
+def get_program(problem: dict, index: int) -> str:
+    # here prompt is already included in completions
+    return problem["completions"][index] + "\n" + problem["tests"]
+
+
+def evaluation_options(problem: dict) -> dict:
+    return {key: problem[key] for key in EVALUATION_OPTIONS if key in problem}
+
+
+def problem_name(problem: dict) -> str:
+    # MultiPL-E problems have a name, HumanEval-XL and MxEval ones a task_id.
+    return problem.get("name", problem.get("task_id"))
 
 
 def get_test_results_json_path(
@@ -56,26 +119,118 @@ def get_test_results_json_path(
     return Path(output_dir) / (problem_name + suffixes)
 
 
-def evaluate_problem(
-    output_dir: str, problem_json_path: str, max_workers: int
-):
+def evaluate_problem(output_dir: str, problem_json_path: str):
+    """Evaluates the problem saved at `problem_json_path` and writes its results next to it in `output_dir`."""
     with open(problem_json_path, "r") as f:
         problem = json.load(f)
+    [test_results] = evaluate_problems([problem])
     test_results_path = get_test_results_json_path(output_dir, problem_json_path)
     test_results_path.parent.mkdir(mode=0o755, parents=True, exist_ok=True)
-
-    test_results = problem.copy()
-    del test_results["completions"]
-    test_results["results"] = []
-
-    num_problems = len(problem["completions"])
-    min_problem = len(test_results["results"])
-
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        for j in executor.map(
-            lambda index: cached_eval_script(problem, index),
-            range(min_problem, num_problems),
-        ):
-            test_results["results"].append(j)
-            with open(test_results_path, "w+") as f:
-                f.write(json.dumps(test_results, indent=2))
+    with open(test_results_path, "w+") as f:
+        f.write(json.dumps(test_results, indent=2))
+
+
+def evaluate_problems(problems: List[dict]) -> List[dict]:
+    """
+    Evaluates the completions of all the problems from a single work queue, so
+    that the cores are busy until the last completion of the last problem.
+    Returns the test results of every problem: the problem without its
+    completions, with the list of their results under "results".
+    """
+    all_results = asyncio.run(evaluate_completions(problems))
+    all_test_results = []
+    for problem, results in zip(problems, all_results):
+        test_results = {key: value for key, value in problem.items() if key != "completions"}
+        test_results["results"] = results
+        all_test_results.append(test_results)
+    return all_test_results
+
+
+def save_test_results(all_test_results: List[dict], path: Optional[str] = None):
+    """
+    Writes the test results of all the problems of a task as JSON lines to
+    `path`, by default the EVAL_HARNESS_EXECUTION_RESULTS environment variable,
+    which the evaluator sets from the `execution_results_path` argument.
+    Nothing is written when no path is given.
+    """
+    path = path if path is not None else os.getenv("EVAL_HARNESS_EXECUTION_RESULTS")
+    if not path:
+        return
+    path = os.path.expanduser(path)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        for test_results in all_test_results:
+            f.write(json.dumps(test_results) + "\n")
+    print(f"Execution results saved at {path}")
+
+
+async def evaluate_completions(
+    problems: List[dict], scheduler: Optional[AdmissionScheduler] = None
+) -> List[List[dict]]:
+    """
+    Returns the results of the completions of every problem. The (problem,
+    completion) jobs of all problems are flattened into one queue, drained on
+    the running event loop by as many workers as `scheduler` (by default one
+    with the budgets of the environment, see scheduler.py) can ever admit, so
+    that the number of concurrent executions follows the learned cost of
+    their language rather than a fixed worker count.
+    """
+    if scheduler is None:
+        scheduler = AdmissionScheduler()
+    journal = get_results_journal()
+    all_results = {id(problem): [None] * len(problem["completions"]) for problem in problems}
+
+    def set_results(problem, indices, result):
+        for index in indices:
+            all_results[id(problem)][index] = dict(result, program=get_program(problem, index))
+
+    # Equivalent completions are executed once, and every completion of a
+    # group gets the result of its first completion. When resuming, groups
+    # with a journaled result are not executed again.
+    queue = asyncio.Queue()
+    queued = 0
+    setups = set()
+    for problem in problems:
+        for indices in group_candidates(problem["completions"], problem["language"]):
+            journaled = [
+                journal.get(problem_name(problem), index, get_program(problem, index), evaluation_options(problem))
+                for index in indices
+            ] if journal else []
+            result = next((result for result in journaled if result is not None), None)
+            if result is None:
+                queue.put_nowait((problem, indices))
+                queued += len(indices)
+                setups.add((problem["language"], bool(problem.get("test_functions"))))
+                continue
+            set_results(problem, indices, result)
+            for index, journaled_result in zip(indices, journaled):
+                if journaled_result is None:
+                    journal.append(
+                        problem_name(problem), index, get_program(problem, index), result, evaluation_options(problem)
+                    )
+    # The setup of the evaluators blocks, so it runs on a thread rather than
+    # from the evaluators on the event loop.
+    loop = asyncio.get_running_loop()
+    for language, test_functions in setups:
+        await loop.run_in_executor(None, prepare_evaluator, language, test_functions)
+    progress = tqdm(total=queued, desc="Evaluating")
+
+    async def worker():
+        while not queue.empty():
+            problem, indices = queue.get_nowait()
+            result = await cached_eval_script_async(problem, indices[0], scheduler)
+            set_results(problem, indices, result)
+            if journal:
+                result = {key: value for key, value in result.items() if key != "program"}
+                for index in indices:
+                    journal.append(
+                        problem_name(problem), index, get_program(problem, index), result, evaluation_options(problem)
+                    )
+            progress.update(len(indices))
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(min(queue.qsize(), scheduler.max_concurrency()))))
+    finally:
+        progress.close()
+        scheduler.costs.save()
+    return [all_results[id(problem)] for problem in problems]
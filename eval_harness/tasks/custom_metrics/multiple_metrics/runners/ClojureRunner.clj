@@ -0,0 +1,237 @@
+;; Persistent worker evaluating Clojure candidates, see worker_pool.py.
+;;
+;; Every request holds the "filename" of a program, which is loaded into a
+;; fresh namespace, as `clojure -M <file>` would load it into `user`. The
+;; namespaces the program creates are removed afterwards, so that its
+;; definitions are not visible to the next candidates. The program runs on a
+;; fresh thread while *out*, *err*, clojure.test/*test-out*, System.out and
+;; System.err are captured, and clojure.test/report is wrapped to count the
+;; tests the program runs, returned in "tests" as {"test", "pass", "fail",
+;; "error", "summary"}, so that the status does not depend on the summary
+;; surviving the output limit. A candidate that does not return before the
+;; timeout is abandoned and the worker asks to be replaced, since JVM threads
+;; cannot be killed. An uncaught exception is
+;; reported on stderr as clojure.main would report it.
+
+(ns eval-harness.clojure-runner
+  (:require [clojure.main :as main]
+            [clojure.test :as t])
+  (:import (java.io BufferedReader ByteArrayInputStream ByteArrayOutputStream File FileOutputStream
+                    InputStreamReader OutputStream OutputStreamWriter PrintStream PrintWriter StringReader)
+           (clojure.lang LineNumberingPushbackReader)))
+
+;; Stack of the thread running a candidate, like the main thread of a JVM.
+(def ^:private stack-size (* 512 1024 1024))
+
+(defn- read-json
+  "Reads the flat JSON objects of the requests: strings, numbers, booleans and null."
+  [^String s]
+  (let [i (volatile! 0)
+        next-char! (fn [] (let [c (.charAt s @i)] (vswap! i inc) c))
+        skip! (fn [] (while (and (< @i (count s)) (Character/isWhitespace (.charAt s @i))) (vswap! i inc)))
+        expect! (fn [c]
+                  (when-not (= c (next-char!))
+                    (throw (IllegalArgumentException. (str "Expected " c " at " (dec @i))))))
+        read-string! (fn []
+                       (expect! \")
+                       (let [b (StringBuilder.)]
+                         (loop []
+                           (let [c (next-char!)]
+                             (cond
+                               (= c \") (str b)
+                               (not= c \\) (do (.append b c) (recur))
+                               :else (let [escaped (next-char!)]
+                                       (case escaped
+                                         \n (.append b \newline)
+                                         \t (.append b \tab)
+                                         \r (.append b \return)
+                                         \b (.append b \backspace)
+                                         \f (.append b \formfeed)
+                                         \u (do (.append b (char (Integer/parseInt (subs s @i (+ @i 4)) 16)))
+                                                (vswap! i + 4))
+                                         (.append b escaped))
+                                       (recur)))))))
+        read-value! (fn []
+                      (if (= \" (.charAt s @i))
+                        (read-string!)
+                        (if-let [[literal value] (first (filter #(.startsWith s (first %) @i)
+                                                                [["true" true] ["false" false] ["null" nil]]))]
+                          (do (vswap! i + (count literal)) value)
+                          (let [start @i]
+                            (while (and (< @i (count s)) (<= 0 (.indexOf "+-0123456789.eE" (int (.charAt s @i)))))
+                              (vswap! i inc))
+                            (Double/parseDouble (subs s start @i))))))]
+    (skip!)
+    (expect! \{)
+    (skip!)
+    (if (= \} (.charAt s @i))
+      {}
+      (loop [result {}]
+        (skip!)
+        (let [key (read-string!)
+              _ (do (skip!) (expect! \:) (skip!))
+              result (assoc result key (read-value!))
+              _ (skip!)
+              c (next-char!)]
+          (case c
+            \} result
+            \, (recur result)
+            (throw (IllegalArgumentException. (str "Expected , or } at " (dec @i))))))))))
+
+(defn- json
+  "Writes strings, numbers, booleans, nil and maps of them as JSON."
+  [value]
+  (cond
+    (nil? value) "null"
+    (boolean? value) (str value)
+    (number? value) (str value)
+    (map? value) (str "{" (apply str (interpose "," (for [[k v] value] (str (json (name k)) ":" (json v))))) "}")
+    :else (let [b (StringBuilder. "\"")]
+            (doseq [c (str value)]
+              (case c
+                \" (.append b "\\\"")
+                \\ (.append b "\\\\")
+                \newline (.append b "\\n")
+                \return (.append b "\\r")
+                \tab (.append b "\\t")
+                (if (or (< (int c) 0x20) (> (int c) 0x7e))
+                  (.append b (format "\\u%04x" (int c)))
+                  (.append b c))))
+            (str (.append b "\"")))))
+
+(defn- limited-output
+  "Returns an OutputStream keeping the first `limit` bytes written to it, and a
+  function returning them as text."
+  [limit]
+  (let [buffer (ByteArrayOutputStream.)
+        write! (fn [^bytes b off len]
+                 (locking buffer
+                   (.write buffer b (int off) (int (max 0 (min len (- limit (.size buffer))))))))]
+    [(proxy [OutputStream] []
+       (write
+         ([b]
+          (if (bytes? b)
+            (write! b 0 (alength ^bytes b))
+            (write! (byte-array [(unchecked-byte b)]) 0 1)))
+         ([b off len]
+          (write! b off len))))
+     (fn [] (locking buffer (String. (.toByteArray buffer) "UTF-8")))]))
+
+(defn- counting-report
+  "Wraps clojure.test/report to count the events of the tests in `counters`."
+  [counters]
+  (let [report t/report]
+    (fn [m]
+      (case (:type m)
+        (:pass :fail :error) (swap! counters update (name (:type m)) inc)
+        :begin-test-var (swap! counters update "test" inc)
+        :summary (swap! counters update "summary" inc)
+        nil)
+      (report m))))
+
+(defn- load-candidate
+  "Loads `filename` into a fresh namespace and removes the namespaces it created."
+  [filename]
+  (let [before (set (all-ns))]
+    (try
+      (binding [*ns* (create-ns (gensym "candidate"))]
+        (refer-clojure)
+        (load-file filename))
+      (finally
+        (doseq [n (all-ns)
+                :when (not (before n))]
+          (remove-ns (ns-name n)))))))
+
+(defn- handle [request]
+  (let [limit (long (get request "max_output_size"))
+        [stdout stdout-text] (limited-output limit)
+        [stderr stderr-text] (limited-output limit)
+        out (OutputStreamWriter. ^OutputStream stdout "UTF-8")
+        err (OutputStreamWriter. ^OutputStream stderr "UTF-8")
+        captured-out (PrintStream. ^OutputStream stdout true "UTF-8")
+        captured-err (PrintStream. ^OutputStream stderr true "UTF-8")
+        counters (atom {"test" 0 "pass" 0 "fail" 0 "error" 0 "summary" 0})
+        failure (volatile! nil)
+        thread (Thread. nil
+                        ^Runnable (fn []
+                                    (binding [*out* out
+                                              *err* err
+                                              *in* (LineNumberingPushbackReader. (StringReader. ""))
+                                              t/*test-out* out
+                                              t/report (counting-report counters)]
+                                      (try
+                                        (load-candidate (get request "filename"))
+                                        (catch Throwable e
+                                          (vreset! failure e))
+                                        (finally
+                                          (.flush out)
+                                          (.flush err)))))
+                        "main"
+                        (long stack-size))
+        original-out System/out
+        original-err System/err
+        start (System/nanoTime)]
+    (.setDaemon thread true)
+    (System/setOut captured-out)
+    (System/setErr captured-err)
+    (try
+      (.start thread)
+      (.join thread (long (Math/ceil (* 1000 (get request "timeout")))))
+      (finally
+        (System/setOut original-out)
+        (System/setErr original-err)))
+    (let [run-time (/ (- (System/nanoTime) start) 1e9)
+          timed-out (.isAlive thread)
+          e @failure
+          limit-exceeded (when (and (not timed-out) (instance? OutOfMemoryError e)) "memory")]
+      (when (and (not timed-out) e)
+        ;; As reported by clojure.main with -Dclojure.main.report=stderr.
+        (.print captured-err (-> e Throwable->map main/ex-triage main/ex-str)))
+      (.flush captured-out)
+      (.flush captured-err)
+      {"id" (long (get request "id"))
+       "phase" "run"
+       "exit_code" (cond timed-out -1 e 1 :else 0)
+       "timeout" timed-out
+       ;; After a timeout the candidate still runs, and after running out of
+       ;; memory the state of the JVM is unknown.
+       "restart" (boolean (or timed-out limit-exceeded))
+       "stdout" (stdout-text)
+       "stderr" (stderr-text)
+       "limit_exceeded" limit-exceeded
+       "tests" @counters
+       "run_time" run-time})))
+
+(defn- warm-up []
+  (let [file (File/createTempFile "warmup" ".clj")]
+    (try
+      (spit file (str "(require '[clojure.test :refer [deftest is run-test]])\n"
+                      "(deftest warmup (is (= 2 (+ 1 1))))\n"
+                      "(run-test warmup)\n"))
+      (handle {"id" 0 "filename" (str file) "timeout" 600.0 "max_output_size" 0})
+      (finally
+        (.delete file)))))
+
+(defn -main []
+  (let [responses (PrintStream. (FileOutputStream. (str "/dev/fd/" (System/getenv "EVAL_HARNESS_WORKER_FD")))
+                                true "UTF-8")
+        requests (BufferedReader. (InputStreamReader. System/in "UTF-8"))]
+    (System/setIn (ByteArrayInputStream. (byte-array 0)))
+    (warm-up)
+    (.println responses "{\"ready\":true}")
+    (loop []
+      (when-let [line (.readLine requests)]
+        (let [id (volatile! -1)]
+          (.println responses
+                    (json (try
+                            (let [request (read-json line)]
+                              (vreset! id (long (get request "id")))
+                              (handle request))
+                            (catch Throwable e
+                              {"id" @id "phase" "run" "exit_code" 1 "timeout" false "restart" true
+                               "stdout" "" "stderr" (with-out-str (.printStackTrace e (PrintWriter. *out*)))})))))
+        (recur)))
+    (shutdown-agents)
+    (System/exit 0)))
+
+(-main)
@@ -0,0 +1,357 @@
+import java.io.BufferedReader;
+import java.io.ByteArrayInputStream;
+import java.io.ByteArrayOutputStream;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.io.StringWriter;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.net.URI;
+import java.nio.charset.StandardCharsets;
+import java.util.Arrays;
+import java.util.HashMap;
+import java.util.List;
+import java.util.Map;
+import java.util.concurrent.atomic.AtomicReference;
+import javax.tools.FileObject;
+import javax.tools.ForwardingJavaFileManager;
+import javax.tools.JavaCompiler;
+import javax.tools.JavaFileObject;
+import javax.tools.SimpleJavaFileObject;
+import javax.tools.StandardJavaFileManager;
+import javax.tools.ToolProvider;
+
+/**
+ * Persistent worker evaluating Java candidates, see worker_pool.py.
+ *
+ * Every request holds the "source" of a program and the name of its "class"
+ * with a main method. The program is compiled in memory with the compiler of
+ * the JDK, loaded in a class loader of its own, so that static state does not
+ * leak between candidates, and its main method runs with assertions enabled on
+ * a fresh thread while System.out and System.err are captured. A candidate
+ * that does not return before the timeout is abandoned and the worker asks to
+ * be replaced, since Java threads cannot be killed.
+ */
+public class JavaRunner {
+    // Stack of the thread running a candidate, like the main thread of a JVM.
+    private static final long STACK_SIZE = 512L * 1024 * 1024;
+
+    private static PrintStream responses;
+    private static JavaCompiler compiler;
+    private static StandardJavaFileManager standardFileManager;
+    private static List<String> options;
+
+    public static void main(String[] args) throws IOException {
+        responses = new PrintStream(
+            new FileOutputStream("/dev/fd/" + System.getenv("EVAL_HARNESS_WORKER_FD")), true, "UTF-8");
+        BufferedReader requests = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        System.setIn(new ByteArrayInputStream(new byte[0]));
+
+        compiler = ToolProvider.getSystemJavaCompiler();
+        if (compiler == null) {
+            System.err.println("The Java compiler is unavailable, a JDK is required");
+            System.exit(1);
+        }
+        standardFileManager = compiler.getStandardFileManager(null, null, StandardCharsets.UTF_8);
+        options = Arrays.asList("-classpath", System.getProperty("java.class.path"), "-proc:none");
+        // Warm up the compiler before the first candidate.
+        compile("Warmup", "class Warmup { public static void main(String[] args) {} }", new HashMap<>(), new StringWriter());
+        responses.println("{\"ready\":true}");
+
+        String line;
+        while ((line = requests.readLine()) != null) {
+            long id = -1;
+            try {
+                Map<String, Object> request = new JsonReader(line).object();
+                id = ((Number) request.get("id")).longValue();
+                handle(id, request);
+            } catch (Throwable e) {
+                StringWriter trace = new StringWriter();
+                e.printStackTrace(new java.io.PrintWriter(trace));
+                respond(id, "run", 1, false, true, "", trace.toString(), null, 0, 0);
+            }
+        }
+    }
+
+    private static void handle(long id, Map<String, Object> request) throws Exception {
+        String source = (String) request.get("source");
+        String className = (String) request.get("class");
+        double timeout = ((Number) request.get("timeout")).doubleValue();
+        int maxOutputSize = ((Number) request.get("max_output_size")).intValue();
+
+        long start = System.nanoTime();
+        Map<String, byte[]> classes = new HashMap<>();
+        StringWriter diagnostics = new StringWriter();
+        boolean compiled = compile(className, source, classes, diagnostics);
+        double compileTime = (System.nanoTime() - start) / 1e9;
+        if (!compiled) {
+            String errors = diagnostics.toString();
+            respond(id, "compile", 1, false, false, "", errors.substring(0, Math.min(errors.length(), maxOutputSize)),
+                null, compileTime, 0);
+            return;
+        }
+
+        MemoryClassLoader loader = new MemoryClassLoader(classes);
+        AtomicReference<Throwable> failure = new AtomicReference<>();
+        Thread thread = new Thread(null, () -> {
+            try {
+                Method main = loader.loadClass(className).getMethod("main", String[].class);
+                main.invoke(null, (Object) new String[0]);
+            } catch (InvocationTargetException e) {
+                failure.set(e.getCause());
+            } catch (Throwable e) {
+                failure.set(e);
+            }
+        }, "main", STACK_SIZE);
+        thread.setDaemon(true);
+        thread.setContextClassLoader(loader);
+
+        LimitedOutputStream stdout = new LimitedOutputStream(maxOutputSize);
+        LimitedOutputStream stderr = new LimitedOutputStream(maxOutputSize);
+        PrintStream capturedOut = new PrintStream(stdout, true, "UTF-8");
+        PrintStream capturedErr = new PrintStream(stderr, true, "UTF-8");
+        PrintStream originalOut = System.out;
+        PrintStream originalErr = System.err;
+        long runStart = System.nanoTime();
+        System.setOut(capturedOut);
+        System.setErr(capturedErr);
+        try {
+            thread.start();
+            thread.join((long) Math.ceil(timeout * 1000));
+        } finally {
+            System.setOut(originalOut);
+            System.setErr(originalErr);
+        }
+        double runTime = (System.nanoTime() - runStart) / 1e9;
+
+        boolean timedOut = thread.isAlive();
+        int exitCode = 0;
+        String limitExceeded = null;
+        Throwable error = failure.get();
+        if (timedOut) {
+            exitCode = -1;
+        } else if (error != null) {
+            // As reported by the JVM for an uncaught exception of the main thread.
+            exitCode = 1;
+            capturedErr.print("Exception in thread \"main\" ");
+            error.printStackTrace(capturedErr);
+            if (error instanceof OutOfMemoryError) {
+                limitExceeded = "memory";
+            }
+        }
+        capturedOut.flush();
+        capturedErr.flush();
+        // After a timeout the candidate still runs, and after running out of
+        // memory the state of the JVM is unknown.
+        boolean restart = timedOut || limitExceeded != null;
+        respond(id, "run", exitCode, timedOut, restart, stdout.text(), stderr.text(), limitExceeded, compileTime, runTime);
+    }
+
+    private static boolean compile(String className, String source, Map<String, byte[]> classes, StringWriter diagnostics) {
+        JavaFileObject file = new SimpleJavaFileObject(
+                URI.create("string:///" + className + JavaFileObject.Kind.SOURCE.extension), JavaFileObject.Kind.SOURCE) {
+            @Override
+            public CharSequence getCharContent(boolean ignoreEncodingErrors) {
+                return source;
+            }
+        };
+        ForwardingJavaFileManager<StandardJavaFileManager> fileManager =
+                new ForwardingJavaFileManager<StandardJavaFileManager>(standardFileManager) {
+            @Override
+            public JavaFileObject getJavaFileForOutput(
+                    Location location, String name, JavaFileObject.Kind kind, FileObject sibling) {
+                return new SimpleJavaFileObject(URI.create("bytes:///" + name.replace('.', '/') + kind.extension), kind) {
+                    @Override
+                    public OutputStream openOutputStream() {
+                        return new ByteArrayOutputStream() {
+                            @Override
+                            public void close() throws IOException {
+                                super.close();
+                                classes.put(name, toByteArray());
+                            }
+                        };
+                    }
+                };
+            }
+        };
+        return compiler.getTask(diagnostics, fileManager, null, options, null, Arrays.asList(file)).call();
+    }
+
+    private static void respond(long id, String phase, int exitCode, boolean timeout, boolean restart, String stdout,
+            String stderr, String limitExceeded, double compileTime, double runTime) {
+        responses.println("{\"id\":" + id
+            + ",\"phase\":" + quote(phase)
+            + ",\"exit_code\":" + exitCode
+            + ",\"timeout\":" + timeout
+            + ",\"restart\":" + restart
+            + ",\"stdout\":" + quote(stdout)
+            + ",\"stderr\":" + quote(stderr)
+            + ",\"limit_exceeded\":" + (limitExceeded == null ? "null" : quote(limitExceeded))
+            + ",\"compile_time\":" + compileTime
+            + ",\"run_time\":" + runTime
+            + "}");
+    }
+
+    private static String quote(String s) {
+        StringBuilder b = new StringBuilder("\"");
+        for (int i = 0; i < s.length(); i++) {
+            char c = s.charAt(i);
+            switch (c) {
+                case '"': b.append("\\\""); break;
+                case '\\': b.append("\\\\"); break;
+                case '\n': b.append("\\n"); break;
+                case '\r': b.append("\\r"); break;
+                case '\t': b.append("\\t"); break;
+                default:
+                    if (c < 0x20 || c > 0x7e) {
+                        b.append(String.format("\\u%04x", (int) c));
+                    } else {
+                        b.append(c);
+                    }
+            }
+        }
+        return b.append('"').toString();
+    }
+
+    /** Loads the classes of a candidate from their compiled bytes, with assertions enabled. */
+    private static final class MemoryClassLoader extends ClassLoader {
+        private final Map<String, byte[]> classes;
+
+        MemoryClassLoader(Map<String, byte[]> classes) {
+            super(JavaRunner.class.getClassLoader());
+            this.classes = classes;
+            setDefaultAssertionStatus(true);
+        }
+
+        @Override
+        protected Class<?> findClass(String name) throws ClassNotFoundException {
+            byte[] bytes = classes.get(name);
+            if (bytes == null) {
+                throw new ClassNotFoundException(name);
+            }
+            return defineClass(name, bytes, 0, bytes.length);
+        }
+    }
+
+    /** Keeps the first `limit` bytes written to it and discards the rest. */
+    private static final class LimitedOutputStream extends OutputStream {
+        private final ByteArrayOutputStream bytes = new ByteArrayOutputStream();
+        private final int limit;
+
+        LimitedOutputStream(int limit) {
+            this.limit = limit;
+        }
+
+        @Override
+        public synchronized void write(int b) {
+            if (bytes.size() < limit) {
+                bytes.write(b);
+            }
+        }
+
+        @Override
+        public synchronized void write(byte[] b, int off, int len) {
+            bytes.write(b, off, Math.max(0, Math.min(len, limit - bytes.size())));
+        }
+
+        synchronized String text() {
+            return new String(bytes.toByteArray(), StandardCharsets.UTF_8);
+        }
+    }
+
+    /** Reads the flat JSON objects of the requests: strings, numbers, booleans and null. */
+    private static final class JsonReader {
+        private final String s;
+        private int i;
+
+        JsonReader(String s) {
+            this.s = s;
+        }
+
+        Map<String, Object> object() {
+            Map<String, Object> result = new HashMap<>();
+            skipWhitespace();
+            expect('{');
+            skipWhitespace();
+            if (s.charAt(i) == '}') {
+                return result;
+            }
+            while (true) {
+                skipWhitespace();
+                String key = string();
+                skipWhitespace();
+                expect(':');
+                skipWhitespace();
+                result.put(key, value());
+                skipWhitespace();
+                char c = s.charAt(i++);
+                if (c == '}') {
+                    return result;
+                }
+                if (c != ',') {
+                    throw new IllegalArgumentException("Expected , or } at " + (i - 1));
+                }
+            }
+        }
+
+        private Object value() {
+            if (s.charAt(i) == '"') {
+                return string();
+            }
+            for (String literal : new String[] {"true", "false", "null"}) {
+                if (s.startsWith(literal, i)) {
+                    i += literal.length();
+                    return literal.equals("null") ? null : Boolean.valueOf(literal);
+                }
+            }
+            int start = i;
+            while (i < s.length() && "+-0123456789.eE".indexOf(s.charAt(i)) >= 0) {
+                i++;
+            }
+            return Double.parseDouble(s.substring(start, i));
+        }
+
+        private String string() {
+            expect('"');
+            StringBuilder b = new StringBuilder();
+            while (true) {
+                char c = s.charAt(i++);
+                if (c == '"') {
+                    return b.toString();
+                }
+                if (c != '\\') {
+                    b.append(c);
+                    continue;
+                }
+                char escaped = s.charAt(i++);
+                switch (escaped) {
+                    case 'n': b.append('\n'); break;
+                    case 't': b.append('\t'); break;
+                    case 'r': b.append('\r'); break;
+                    case 'b': b.append('\b'); break;
+                    case 'f': b.append('\f'); break;
+                    case 'u':
+                        b.append((char) Integer.parseInt(s.substring(i, i + 4), 16));
+                        i += 4;
+                        break;
+                    default: b.append(escaped);
+                }
+            }
+        }
+
+        private void skipWhitespace() {
+            while (i < s.length() && Character.isWhitespace(s.charAt(i))) {
+                i++;
+            }
+        }
+
+        private void expect(char c) {
+            if (s.charAt(i++) != c) {
+                throw new IllegalArgumentException("Expected " + c + " at " + (i - 1));
+            }
+        }
+    }
+}
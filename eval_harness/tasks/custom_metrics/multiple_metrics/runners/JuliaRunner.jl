@@ -0,0 +1,244 @@
+# Persistent worker evaluating Julia candidates, see worker_pool.py.
+#
+# Every request holds the "filename" of a program, which is included into a
+# fresh anonymous module, so that the definitions of a candidate are not
+# visible to the next ones, while stdout and stderr are captured. `Test` and
+# the code of the worker are compiled once per worker (or ahead of time in a
+# sysimage, see eval_julia.py) rather than for every candidate. The candidate
+# runs on a thread of the default pool, watched by the requests loop, which
+# runs on the interactive thread of the worker (`--threads=1,1`) so that a
+# busy candidate cannot hold it up. A candidate that does not return before the
+# timeout is abandoned and the worker asks to be replaced, since Julia tasks
+# cannot be killed. An uncaught error is reported on stderr as `julia <file>`
+# would report it.
+
+using Test
+
+const responses = fdio(parse(Int, ENV["EVAL_HARNESS_WORKER_FD"]))
+
+# Seconds between two checks of the watchdog.
+const POLL_INTERVAL = 0.005
+
+function respond(response)
+    write(responses, json(response), "\n")
+    flush(responses)
+end
+
+json(s::AbstractString) = json_string(s)
+json(b::Bool) = b ? "true" : "false"
+json(n::Real) = string(n)
+json(::Nothing) = "null"
+json(d::AbstractDict) = "{" * join((json_string(string(k)) * ":" * json(v) for (k, v) in d), ",") * "}"
+
+function json_string(s::AbstractString)
+    b = IOBuffer()
+    write(b, '"')
+    for c in s
+        if c == '"'
+            write(b, "\\\"")
+        elseif c == '\\'
+            write(b, "\\\\")
+        elseif c == '\n'
+            write(b, "\\n")
+        elseif c == '\r'
+            write(b, "\\r")
+        elseif c == '\t'
+            write(b, "\\t")
+        elseif !isvalid(c) || c < ' '
+            # Invalid UTF-8 of the candidate's output is replaced as Python would.
+            write(b, isvalid(c) ? "\\u" * string(UInt32(c), base = 16, pad = 4) : "\\ufffd")
+        else
+            write(b, c)
+        end
+    end
+    write(b, '"')
+    String(take!(b))
+end
+
+# Reads the flat JSON objects of the requests: strings, numbers, booleans and null.
+function parse_request(s::String)
+    chars = collect(s)
+    i = 1
+    skip() = while i <= length(chars) && isspace(chars[i]); i += 1; end
+    function expect(c)
+        chars[i] == c || error("Expected $c at $i")
+        i += 1
+    end
+    function hex4()
+        code = parse(UInt32, String(chars[i:i+3]), base = 16)
+        i += 4
+        code
+    end
+    function string_value()
+        expect('"')
+        b = IOBuffer()
+        while true
+            c = chars[i]
+            i += 1
+            c == '"' && return String(take!(b))
+            if c != '\\'
+                write(b, c)
+                continue
+            end
+            escaped = chars[i]
+            i += 1
+            if escaped == 'u'
+                code = hex4()
+                if 0xd800 <= code <= 0xdbff && i + 1 <= length(chars) && chars[i] == '\\' && chars[i+1] == 'u'
+                    i += 2
+                    low = hex4()
+                    code = 0x10000 + ((code - 0xd800) << 10) + (low - 0xdc00)
+                end
+                write(b, Char(code))
+            else
+                write(b, get(Dict('n' => '\n', 't' => '\t', 'r' => '\r', 'b' => '\b', 'f' => '\f'), escaped, escaped))
+            end
+        end
+    end
+    function value()
+        chars[i] == '"' && return string_value()
+        for (literal, v) in (("true", true), ("false", false), ("null", nothing))
+            if String(chars[i:min(end, i + length(literal) - 1)]) == literal
+                i += length(literal)
+                return v
+            end
+        end
+        start = i
+        while i <= length(chars) && chars[i] in "+-0123456789.eE"
+            i += 1
+        end
+        parse(Float64, String(chars[start:i-1]))
+    end
+    result = Dict{String,Any}()
+    skip()
+    expect('{')
+    skip()
+    chars[i] == '}' && return result
+    while true
+        skip()
+        key = string_value()
+        skip()
+        expect(':')
+        skip()
+        result[key] = value()
+        skip()
+        c = chars[i]
+        i += 1
+        c == '}' && return result
+        c == ',' || error("Expected , or } at $(i - 1)")
+    end
+end
+
+# A pipe whose reader keeps the first `limit` bytes written to it.
+function limited_pipe(limit)
+    pipe = Pipe()
+    Base.link_pipe!(pipe; reader_supports_async = true, writer_supports_async = true)
+    text = IOBuffer()
+    reader = @async while !eof(pipe.out)
+        data = readavailable(pipe.out)
+        write(text, data[1:min(length(data), max(0, limit - position(text)))])
+    end
+    pipe, reader, text
+end
+
+function include_candidate(filename)
+    candidate = Module(:Candidate)
+    # As in Main, which `julia <file>` runs the program in.
+    Core.eval(candidate, :(eval(x) = Core.eval($candidate, x)))
+    Core.eval(candidate, :(include(x) = Base.include($candidate, x)))
+    Base.include(candidate, filename)
+    nothing
+end
+
+function handle(request)
+    id = Int(request["id"])
+    timeout = request["timeout"]
+    limit = Int(request["max_output_size"])
+    stdout_pipe, stdout_reader, stdout_text = limited_pipe(limit)
+    stderr_pipe, stderr_reader, stderr_text = limited_pipe(limit)
+    original_stdout, original_stderr = stdout, stderr
+
+    start = time()
+    failure = nothing
+    redirect_stdout(stdout_pipe.in)
+    redirect_stderr(stderr_pipe.in)
+    candidate = Threads.@spawn :default try
+        include_candidate(request["filename"])
+    catch e
+        failure = (e, catch_backtrace())
+    end
+    finished = timedwait(() -> istaskdone(candidate), timeout; pollint = POLL_INTERVAL) == :ok
+    run_time = time() - start
+
+    exit_code = 0
+    limit_exceeded = nothing
+    if !finished
+        exit_code = -1
+    elseif failure !== nothing
+        # As reported by julia for an uncaught error of the program.
+        exit_code = 1
+        e, backtrace = failure
+        print(stderr, "ERROR: ")
+        showerror(stderr, e, backtrace)
+        println(stderr)
+        root = e isa LoadError ? e.error : e
+        if root isa OutOfMemoryError
+            limit_exceeded = "memory"
+        end
+    end
+    redirect_stdout(original_stdout)
+    redirect_stderr(original_stderr)
+    close(stdout_pipe.in)
+    close(stderr_pipe.in)
+    if finished
+        wait(stdout_reader)
+        wait(stderr_reader)
+    end
+    Dict(
+        "id" => id,
+        "phase" => "run",
+        "exit_code" => exit_code,
+        "timeout" => !finished,
+        # After a timeout the candidate still runs, and after running out of
+        # memory the state of the worker is unknown.
+        "restart" => !finished || limit_exceeded !== nothing,
+        "stdout" => String(take!(stdout_text)),
+        "stderr" => String(take!(stderr_text)),
+        "limit_exceeded" => limit_exceeded,
+        "run_time" => run_time,
+    )
+end
+
+function warmup()
+    path, io = mktemp()
+    write(io, "using Test\n@testset \"warmup\" begin\n  @test 1 + 1 == 2\nend\n")
+    close(io)
+    try
+        handle(Dict{String,Any}("id" => 0, "timeout" => 600.0, "max_output_size" => 0, "filename" => path))
+    finally
+        rm(path, force = true)
+    end
+end
+
+function main()
+    warmup()
+    respond(Dict("ready" => true))
+    for line in eachline(stdin)
+        id = -1
+        try
+            request = parse_request(line)
+            id = Int(request["id"])
+            respond(handle(request))
+        catch e
+            message = sprint(showerror, e, catch_backtrace())
+            respond(Dict(
+                "id" => id, "phase" => "run", "exit_code" => 1, "timeout" => false, "restart" => true,
+                "stdout" => "", "stderr" => message,
+            ))
+        end
+    end
+end
+
+Threads.nthreads(:interactive) >= 1 || error("run with --threads=1,1")
+# The main task is bound to thread 1, which may belong to the default pool.
+wait(Threads.@spawn :interactive main())
@@ -0,0 +1,237 @@
+// Persistent worker evaluating JavaScript and TypeScript candidates, see worker_pool.py.
+//
+// Every request holds the "source" of a program and the "filename" it would
+// have been run from. The program runs in a fresh vm context, so that the
+// globals of a candidate do not leak into the next ones, with its console
+// captured and synchronous code interrupted at the timeout. Timers the
+// candidate starts are awaited until the timeout and cleared afterwards. An
+// uncaught error is reported on stderr as node would report it, so that the
+// evaluators classify it the same way (ERR_ASSERTION, SyntaxError, ...).
+//
+// Started with --typescript=<path of the typescript package>, the worker
+// loads the TypeScript compiler once and type checks and transpiles every
+// program as `tsc --target esnext` would, reusing the parsed declaration files
+// of the standard library.
+
+"use strict";
+
+const fs = require("fs");
+const path = require("path");
+const readline = require("readline");
+const util = require("util");
+const vm = require("vm");
+const { Console } = require("console");
+const { Writable } = require("stream");
+const { createRequire } = require("module");
+
+const responses = Number(process.env.EVAL_HARNESS_WORKER_FD);
+const typescript = process.argv.find((arg) => arg.startsWith("--typescript="));
+const ts = typescript ? require(typescript.slice("--typescript=".length)) : null;
+
+function respond(response) {
+  fs.writeSync(responses, JSON.stringify(response) + "\n");
+}
+
+// Keeps the first `limit` characters written to it.
+class LimitedOutput extends Writable {
+  constructor(limit) {
+    super({ decodeStrings: false });
+    this.limit = limit;
+    this.text = "";
+  }
+
+  _write(chunk, encoding, callback) {
+    if (this.text.length < this.limit) {
+      this.text += String(chunk).slice(0, this.limit - this.text.length);
+    }
+    callback();
+  }
+}
+
+// The compiler options of `tsc --target esnext` and a host caching the
+// declaration files, which are parsed once for all candidates.
+const compilerOptions = ts ? { target: ts.ScriptTarget.ESNext } : null;
+const declarationFiles = new Map();
+
+function compileTypeScript(source, filename) {
+  const host = ts.createCompilerHost(compilerOptions);
+  const getSourceFile = host.getSourceFile;
+  host.getSourceFile = (name, languageVersion, onError) => {
+    if (path.resolve(name) === path.resolve(filename)) {
+      return ts.createSourceFile(name, source, languageVersion);
+    }
+    if (!declarationFiles.has(name)) {
+      declarationFiles.set(name, getSourceFile.call(host, name, languageVersion, onError));
+    }
+    return declarationFiles.get(name);
+  };
+  let output = "";
+  host.writeFile = (name, text) => {
+    output = text;
+  };
+  const program = ts.createProgram([filename], compilerOptions, host);
+  program.emit();
+  const diagnostics = ts.getPreEmitDiagnostics(program);
+  return { output, diagnostics: diagnostics.length ? ts.formatDiagnostics(diagnostics, host) : null };
+}
+
+// Timer functions of a candidate, tracking its pending timers.
+function trackedTimers() {
+  // handle => function clearing it
+  const pending = new Map();
+  const track = (start, clear, repeats) => (callback, ...args) => {
+    const handle = start((...callbackArgs) => {
+      if (!repeats) {
+        pending.delete(handle);
+      }
+      callback(...callbackArgs);
+    }, ...args);
+    pending.set(handle, clear);
+    return handle;
+  };
+  const untrack = (clear) => (handle) => {
+    pending.delete(handle);
+    clear(handle);
+  };
+  return {
+    pending,
+    globals: {
+      setTimeout: track(setTimeout, clearTimeout, false),
+      setInterval: track(setInterval, clearInterval, true),
+      setImmediate: track(setImmediate, clearImmediate, false),
+      clearTimeout: untrack(clearTimeout),
+      clearInterval: untrack(clearInterval),
+      clearImmediate: untrack(clearImmediate),
+    },
+    clearAll() {
+      for (const [handle, clear] of pending) {
+        clear(handle);
+      }
+      pending.clear();
+    },
+  };
+}
+
+function report(stderr, error) {
+  if (error instanceof Error || (error && typeof error.stack === "string")) {
+    stderr.write(util.inspect(error) + "\n");
+  } else {
+    stderr.write("Uncaught " + util.inspect(error) + "\n");
+  }
+}
+
+async function run(source, filename, timeout, stdout, stderr) {
+  const timers = trackedTimers();
+  let error;
+  const failed = (e) => {
+    if (error === undefined) {
+      error = e;
+    }
+  };
+  const context = vm.createContext({
+    console: new Console({ stdout, stderr }),
+    require: createRequire(filename),
+    module: { exports: {} },
+    __filename: filename,
+    __dirname: path.dirname(filename),
+    process,
+    Buffer,
+    URL,
+    URLSearchParams,
+    TextEncoder,
+    TextDecoder,
+    queueMicrotask,
+    structuredClone,
+    ...timers.globals,
+  });
+  context.exports = context.module.exports;
+  context.global = context.globalThis = context;
+  process.on("uncaughtException", failed);
+  process.on("unhandledRejection", failed);
+  const deadline = Date.now() + timeout * 1000;
+  let timedOut = false;
+  try {
+    new vm.Script(source, { filename }).runInContext(context, { timeout: timeout * 1000 });
+    // Let promise callbacks and the timers of the candidate run until the timeout.
+    await new Promise((resolve) => setImmediate(resolve));
+    while (error === undefined && timers.pending.size > 0 && Date.now() < deadline) {
+      await new Promise((resolve) => setTimeout(resolve, 10));
+    }
+    timedOut = error === undefined && timers.pending.size > 0;
+  } catch (e) {
+    if (e && e.code === "ERR_SCRIPT_EXECUTION_TIMEOUT") {
+      timedOut = true;
+    } else {
+      failed(e);
+    }
+  } finally {
+    timers.clearAll();
+    process.off("uncaughtException", failed);
+    process.off("unhandledRejection", failed);
+  }
+  if (timedOut) {
+    return { exit_code: -1, timeout: true };
+  }
+  if (error !== undefined) {
+    report(stderr, error);
+    return { exit_code: 1, timeout: false };
+  }
+  return { exit_code: 0, timeout: false };
+}
+
+async function handle(request) {
+  const stdout = new LimitedOutput(request.max_output_size);
+  const stderr = new LimitedOutput(request.max_output_size);
+  let source = request.source;
+  let compileTime = 0;
+  if (ts) {
+    const start = process.hrtime.bigint();
+    const compiled = compileTypeScript(source, request.filename);
+    compileTime = Number(process.hrtime.bigint() - start) / 1e9;
+    if (compiled.diagnostics) {
+      // tsc reports type errors on stdout and exits with 2 when it still emitted the program.
+      return {
+        phase: "compile",
+        exit_code: 2,
+        timeout: false,
+        stdout: compiled.diagnostics.slice(0, request.max_output_size),
+        stderr: "",
+        compile_time: compileTime,
+      };
+    }
+    source = compiled.output;
+  }
+  const start = process.hrtime.bigint();
+  const result = await run(source, request.filename.replace(/\.ts$/, ".js"), request.timeout, stdout, stderr);
+  return {
+    phase: "run",
+    ...result,
+    // A candidate stuck in synchronous code was interrupted, but one that
+    // timed out may have left the worker in any state.
+    restart: result.timeout,
+    stdout: stdout.text,
+    stderr: stderr.text,
+    compile_time: compileTime,
+    run_time: Number(process.hrtime.bigint() - start) / 1e9,
+  };
+}
+
+async function main() {
+  if (ts) {
+    // Parse the declaration files of the standard library before the first candidate.
+    compileTypeScript("", path.join(process.cwd(), "warmup.ts"));
+  }
+  respond({ ready: true });
+  const requests = readline.createInterface({ input: process.stdin, crlfDelay: Infinity });
+  for await (const line of requests) {
+    let request = { id: -1 };
+    try {
+      request = JSON.parse(line);
+      respond({ id: request.id, ...(await handle(request)) });
+    } catch (e) {
+      respond({ id: request.id, phase: "run", exit_code: 1, timeout: false, restart: true, stdout: "", stderr: util.inspect(e) });
+    }
+  }
+}
+
+main();
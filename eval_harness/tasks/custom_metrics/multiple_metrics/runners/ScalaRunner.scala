@@ -0,0 +1,273 @@
+import java.io.{BufferedReader, ByteArrayOutputStream, FileOutputStream, InputStreamReader, OutputStream, PrintStream, PrintWriter, StringWriter}
+import java.lang.reflect.InvocationTargetException
+import java.nio.charset.StandardCharsets
+
+import scala.reflect.internal.util.{AbstractFileClassLoader, BatchSourceFile}
+import scala.reflect.io.VirtualDirectory
+import scala.tools.nsc.{Global, Settings}
+import scala.tools.nsc.reporters.ConsoleReporter
+
+/**
+ * Persistent worker evaluating Scala candidates, see worker_pool.py.
+ *
+ * Every request holds the "source" of a program and the name of the "class"
+ * with its main method. The program is compiled in memory by the Scala
+ * compiler running in this JVM, with a compiler instance of its own so that
+ * the symbols of a candidate are not visible to the next ones, loaded in a
+ * class loader of its own and its main method runs on a fresh thread while
+ * System.out, System.err and Console are captured. A candidate that does not
+ * return before the timeout is abandoned and the worker asks to be replaced,
+ * since JVM threads cannot be killed.
+ */
+object ScalaRunner {
+  // Stack of the thread running a candidate, like the main thread of a JVM.
+  private val StackSize = 512L * 1024 * 1024
+
+  private var responses: PrintStream = _
+
+  def main(args: Array[String]): Unit = {
+    responses = new PrintStream(
+      new FileOutputStream("/dev/fd/" + System.getenv("EVAL_HARNESS_WORKER_FD")), true, "UTF-8")
+    val requests = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8))
+    System.setIn(new java.io.ByteArrayInputStream(new Array[Byte](0)))
+
+    // Warm up the compiler before the first candidate.
+    compile("Warmup", "object Warmup { def main(args: Array[String]): Unit = () }")
+    responses.println("{\"ready\":true}")
+
+    var line = requests.readLine()
+    while (line != null) {
+      var id = -1L
+      try {
+        val request = new JsonReader(line).obj()
+        id = request("id").asInstanceOf[Double].toLong
+        handle(id, request)
+      } catch {
+        case e: Throwable =>
+          val trace = new StringWriter()
+          e.printStackTrace(new PrintWriter(trace))
+          respond(id, "run", 1, timeout = false, restart = true, "", trace.toString, null, 0, 0)
+      }
+      line = requests.readLine()
+    }
+  }
+
+  /** Returns the compiled classes, or the diagnostics of the compiler. */
+  private def compile(className: String, source: String): Either[String, VirtualDirectory] = {
+    val diagnostics = new StringWriter()
+    val writer = new PrintWriter(diagnostics)
+    val settings = new Settings(message => writer.println(message))
+    settings.usejavacp.value = true
+    val output = new VirtualDirectory("(memory)", None)
+    settings.outputDirs.setSingleOutput(output)
+    val reporter = new ConsoleReporter(settings, null, writer)
+    val global = new Global(settings, reporter)
+    val run = new global.Run
+    run.compileSources(List(new BatchSourceFile(className + ".scala", source)))
+    reporter.flush()
+    writer.flush()
+    if (reporter.hasErrors) Left(diagnostics.toString) else Right(output)
+  }
+
+  private def handle(id: Long, request: Map[String, Any]): Unit = {
+    val source = request("source").asInstanceOf[String]
+    val className = request("class").asInstanceOf[String]
+    val timeout = request("timeout").asInstanceOf[Double]
+    val maxOutputSize = request("max_output_size").asInstanceOf[Double].toInt
+
+    val start = System.nanoTime()
+    val compiled = compile(className, source)
+    val compileTime = (System.nanoTime() - start) / 1e9
+    val classes = compiled match {
+      case Left(errors) =>
+        respond(id, "compile", 1, timeout = false, restart = false, "", errors.take(maxOutputSize), null, compileTime, 0)
+        return
+      case Right(output) => output
+    }
+
+    val loader = new AbstractFileClassLoader(classes, getClass.getClassLoader)
+    loader.setDefaultAssertionStatus(true)
+    val stdout = new LimitedOutputStream(maxOutputSize)
+    val stderr = new LimitedOutputStream(maxOutputSize)
+    val capturedOut = new PrintStream(stdout, true, "UTF-8")
+    val capturedErr = new PrintStream(stderr, true, "UTF-8")
+    @volatile var failure: Throwable = null
+    val thread = new Thread(null, new Runnable {
+      def run(): Unit = {
+        Console.withOut(capturedOut) {
+          Console.withErr(capturedErr) {
+            try {
+              val main = loader.loadClass(className).getMethod("main", classOf[Array[String]])
+              main.invoke(null, Array[String]())
+            } catch {
+              case e: InvocationTargetException => failure = e.getCause
+              case e: Throwable => failure = e
+            }
+          }
+        }
+      }
+    }, "main", StackSize)
+    thread.setDaemon(true)
+    thread.setContextClassLoader(loader)
+
+    val originalOut = System.out
+    val originalErr = System.err
+    val runStart = System.nanoTime()
+    System.setOut(capturedOut)
+    System.setErr(capturedErr)
+    try {
+      thread.start()
+      thread.join(math.ceil(timeout * 1000).toLong)
+    } finally {
+      System.setOut(originalOut)
+      System.setErr(originalErr)
+    }
+    val runTime = (System.nanoTime() - runStart) / 1e9
+
+    val timedOut = thread.isAlive
+    var exitCode = 0
+    var limitExceeded: String = null
+    if (timedOut) {
+      exitCode = -1
+    } else if (failure != null) {
+      // As reported by the JVM for an uncaught exception of the main thread.
+      exitCode = 1
+      capturedErr.print("Exception in thread \"main\" ")
+      failure.printStackTrace(capturedErr)
+      if (failure.isInstanceOf[OutOfMemoryError]) {
+        limitExceeded = "memory"
+      }
+    }
+    capturedOut.flush()
+    capturedErr.flush()
+    // After a timeout the candidate still runs, and after running out of
+    // memory the state of the JVM is unknown.
+    val restart = timedOut || limitExceeded != null
+    respond(id, "run", exitCode, timedOut, restart, stdout.text, stderr.text, limitExceeded, compileTime, runTime)
+  }
+
+  private def respond(id: Long, phase: String, exitCode: Int, timeout: Boolean, restart: Boolean, stdout: String,
+      stderr: String, limitExceeded: String, compileTime: Double, runTime: Double): Unit = {
+    responses.println("{\"id\":" + id +
+      ",\"phase\":" + quote(phase) +
+      ",\"exit_code\":" + exitCode +
+      ",\"timeout\":" + timeout +
+      ",\"restart\":" + restart +
+      ",\"stdout\":" + quote(stdout) +
+      ",\"stderr\":" + quote(stderr) +
+      ",\"limit_exceeded\":" + (if (limitExceeded == null) "null" else quote(limitExceeded)) +
+      ",\"compile_time\":" + compileTime +
+      ",\"run_time\":" + runTime +
+      "}")
+  }
+
+  private def quote(s: String): String = {
+    val b = new StringBuilder("\"")
+    for (c <- s) {
+      c match {
+        case '"' => b.append("\\\"")
+        case '\\' => b.append("\\\\")
+        case '\n' => b.append("\\n")
+        case '\r' => b.append("\\r")
+        case '\t' => b.append("\\t")
+        case _ if c < 0x20 || c > 0x7e => b.append("\\u%04x".format(c.toInt))
+        case _ => b.append(c)
+      }
+    }
+    b.append('"').toString
+  }
+
+  /** Keeps the first `limit` bytes written to it and discards the rest. */
+  private class LimitedOutputStream(limit: Int) extends OutputStream {
+    private val bytes = new ByteArrayOutputStream()
+
+    override def write(b: Int): Unit = synchronized {
+      if (bytes.size < limit) bytes.write(b)
+    }
+
+    override def write(b: Array[Byte], off: Int, len: Int): Unit = synchronized {
+      bytes.write(b, off, math.max(0, math.min(len, limit - bytes.size)))
+    }
+
+    def text: String = synchronized {
+      new String(bytes.toByteArray, StandardCharsets.UTF_8)
+    }
+  }
+
+  /** Reads the flat JSON objects of the requests: strings, numbers (as Double), booleans and null. */
+  private class JsonReader(s: String) {
+    private var i = 0
+
+    def obj(): Map[String, Any] = {
+      var result = Map.empty[String, Any]
+      skipWhitespace()
+      expect('{')
+      skipWhitespace()
+      if (s.charAt(i) == '}') return result
+      while (true) {
+        skipWhitespace()
+        val key = string()
+        skipWhitespace()
+        expect(':')
+        skipWhitespace()
+        result += key -> value()
+        skipWhitespace()
+        val c = s.charAt(i)
+        i += 1
+        if (c == '}') return result
+        if (c != ',') throw new IllegalArgumentException("Expected , or } at " + (i - 1))
+      }
+      result
+    }
+
+    private def value(): Any = {
+      if (s.charAt(i) == '"') return string()
+      for (literal <- Seq("true", "false", "null")) {
+        if (s.startsWith(literal, i)) {
+          i += literal.length
+          return if (literal == "null") null else literal == "true"
+        }
+      }
+      val start = i
+      while (i < s.length && "+-0123456789.eE".indexOf(s.charAt(i)) >= 0) i += 1
+      s.substring(start, i).toDouble
+    }
+
+    private def string(): String = {
+      expect('"')
+      val b = new StringBuilder()
+      while (true) {
+        val c = s.charAt(i)
+        i += 1
+        if (c == '"') return b.toString
+        if (c != '\\') {
+          b.append(c)
+        } else {
+          val escaped = s.charAt(i)
+          i += 1
+          escaped match {
+            case 'n' => b.append('\n')
+            case 't' => b.append('\t')
+            case 'r' => b.append('\r')
+            case 'b' => b.append('\b')
+            case 'f' => b.append('\f')
+            case 'u' =>
+              b.append(Integer.parseInt(s.substring(i, i + 4), 16).toChar)
+              i += 4
+            case other => b.append(other)
+          }
+        }
+      }
+      b.toString
+    }
+
+    private def skipWhitespace(): Unit = {
+      while (i < s.length && Character.isWhitespace(s.charAt(i))) i += 1
+    }
+
+    private def expect(c: Char): Unit = {
+      if (s.charAt(i) != c) throw new IllegalArgumentException("Expected " + c + " at " + i)
+      i += 1
+    }
+  }
+}
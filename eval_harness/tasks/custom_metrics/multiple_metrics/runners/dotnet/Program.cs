@@ -0,0 +1,350 @@
+// Persistent worker evaluating C# and F# candidates, see worker_pool.py.
+//
+// Started with the language, "cs" or "fs", as argument. Every request holds the
+// "source" of a program and the "filename" it was saved to. C# programs are
+// compiled in memory with Roslyn and F# scripts with the F# compiler service,
+// both loaded once per worker, with DEBUG defined as the evaluators did. Each
+// candidate is loaded in a collectible AssemblyLoadContext of its own, unloaded
+// after it ran, and its entry point runs on a fresh thread while the console
+// is captured. A failed Debug.Assert (F# `assert`) stops the candidate as an
+// exception. A candidate that does not return before the timeout is abandoned
+// and the worker asks to be replaced, since .NET threads cannot be aborted.
+
+using System;
+using System.Collections.Generic;
+using System.Diagnostics;
+using System.IO;
+using System.Linq;
+using System.Reflection;
+using System.Runtime.Loader;
+using System.Text;
+using System.Text.Json;
+using System.Threading;
+using FSharp.Compiler.CodeAnalysis;
+using FSharp.Compiler.Diagnostics;
+using Microsoft.CodeAnalysis;
+using Microsoft.CodeAnalysis.CSharp;
+using Microsoft.FSharp.Control;
+using Microsoft.Win32.SafeHandles;
+
+static class DotnetRunner
+{
+    // Stack of the thread running a candidate, like the main thread of a process.
+    const int StackSize = 256 * 1024 * 1024;
+
+    static Stream responses;
+    static string language;
+    static string[] referencePaths;
+    static List<MetadataReference> references;
+    static FSharpChecker checker;
+    static int compilations;
+
+    static void Main(string[] args)
+    {
+        language = args[0];
+        var fd = int.Parse(Environment.GetEnvironmentVariable("EVAL_HARNESS_WORKER_FD"));
+        responses = new FileStream(new SafeFileHandle((IntPtr)fd, true), FileAccess.Write, 1);
+        var requests = new StreamReader(Console.OpenStandardInput(), new UTF8Encoding(false));
+        Console.SetIn(TextReader.Null);
+
+        Trace.Listeners.Clear();
+        Trace.Listeners.Add(new AssertListener());
+
+        // Programs are compiled against the assemblies of the shared framework.
+        var frameworkDirectory = Path.GetDirectoryName(typeof(object).Assembly.Location);
+        referencePaths = ((string)AppContext.GetData("TRUSTED_PLATFORM_ASSEMBLIES"))
+            .Split(Path.PathSeparator)
+            .Where(path => Path.GetDirectoryName(path) == frameworkDirectory)
+            .ToArray();
+        if (language == "cs")
+        {
+            references = referencePaths.Select(path => (MetadataReference)MetadataReference.CreateFromFile(path)).ToList();
+        }
+        else
+        {
+            referencePaths = referencePaths.Append(typeof(FSharpAsync).Assembly.Location).ToArray();
+            checker = CreateChecker();
+        }
+        Warmup();
+        Respond(new Dictionary<string, object> { ["ready"] = true });
+
+        string line;
+        while ((line = requests.ReadLine()) != null)
+        {
+            long id = -1;
+            try
+            {
+                var request = JsonDocument.Parse(line).RootElement;
+                id = request.GetProperty("id").GetInt64();
+                Respond(Handle(id, request));
+            }
+            catch (Exception e)
+            {
+                Respond(Response(id, "run", 1, false, true, "", e.ToString()));
+            }
+        }
+    }
+
+    static void Warmup()
+    {
+        var directory = Directory.CreateTempSubdirectory("eval-harness-warmup-");
+        try
+        {
+            var path = Path.Combine(directory.FullName, language == "cs" ? "Warmup.cs" : "Warmup.fsx");
+            var source = language == "cs" ? "class Warmup { static void Main() {} }" : "printf \"\"";
+            File.WriteAllText(path, source);
+            Compile(source, path, out _);
+        }
+        finally
+        {
+            directory.Delete(true);
+        }
+    }
+
+    static Dictionary<string, object> Handle(long id, JsonElement request)
+    {
+        var source = request.GetProperty("source").GetString();
+        var filename = request.GetProperty("filename").GetString();
+        var timeout = request.GetProperty("timeout").GetDouble();
+        var maxOutputSize = request.GetProperty("max_output_size").GetInt32();
+
+        var watch = Stopwatch.StartNew();
+        var assembly = Compile(source, filename, out var diagnostics);
+        var compileTime = watch.Elapsed.TotalSeconds;
+        if (assembly == null)
+        {
+            // csc reports errors on stdout, the F# compiler on stderr.
+            diagnostics = Truncate(diagnostics, maxOutputSize);
+            var compileResponse = language == "cs"
+                ? Response(id, "compile", 1, false, false, diagnostics, "")
+                : Response(id, "compile", 1, false, false, "", diagnostics);
+            compileResponse["compile_time"] = compileTime;
+            return compileResponse;
+        }
+
+        var context = new AssemblyLoadContext("candidate", isCollectible: true);
+        var stdout = new LimitedWriter(maxOutputSize);
+        var stderr = new LimitedWriter(maxOutputSize);
+        Exception failure = null;
+        var exitCode = 0;
+        var thread = new Thread(() =>
+        {
+            try
+            {
+                var entryPoint = context.LoadFromStream(new MemoryStream(assembly)).EntryPoint;
+                var arguments = entryPoint.GetParameters().Length == 0 ? null : new object[] { new string[0] };
+                if (entryPoint.Invoke(null, arguments) is int code)
+                {
+                    exitCode = code;
+                }
+            }
+            catch (TargetInvocationException e)
+            {
+                failure = e.InnerException;
+            }
+            catch (Exception e)
+            {
+                failure = e;
+            }
+        }, StackSize);
+        thread.IsBackground = true;
+
+        var originalOut = Console.Out;
+        var originalError = Console.Error;
+        watch.Restart();
+        Console.SetOut(stdout);
+        Console.SetError(stderr);
+        bool finished;
+        try
+        {
+            thread.Start();
+            finished = thread.Join(TimeSpan.FromSeconds(timeout));
+        }
+        finally
+        {
+            Console.SetOut(originalOut);
+            Console.SetError(originalError);
+        }
+        var runTime = watch.Elapsed.TotalSeconds;
+
+        string limitExceeded = null;
+        if (!finished)
+        {
+            exitCode = -1;
+        }
+        else
+        {
+            if (failure != null)
+            {
+                // As reported by mono and dotnet fsi for an unhandled exception.
+                exitCode = 1;
+                stderr.Write("Unhandled Exception:\n" + failure + "\n");
+                if (failure is OutOfMemoryException)
+                {
+                    limitExceeded = "memory";
+                }
+            }
+            context.Unload();
+        }
+        var response = Response(id, "run", exitCode, !finished, !finished || limitExceeded != null, stdout.ToString(), stderr.ToString());
+        response["limit_exceeded"] = limitExceeded;
+        response["compile_time"] = compileTime;
+        response["run_time"] = runTime;
+        return response;
+    }
+
+    /// Returns the bytes of the compiled assembly, or null and the diagnostics of the compiler.
+    static byte[] Compile(string source, string filename, out string diagnostics)
+    {
+        compilations++;
+        return language == "cs" ? CompileCSharp(source, filename, out diagnostics) : CompileFSharp(filename, out diagnostics);
+    }
+
+    static byte[] CompileCSharp(string source, string filename, out string diagnostics)
+    {
+        var tree = CSharpSyntaxTree.ParseText(
+            source, new CSharpParseOptions(preprocessorSymbols: new[] { "DEBUG" }), path: filename, encoding: Encoding.UTF8);
+        var compilation = CSharpCompilation.Create(
+            $"candidate{compilations}",
+            new[] { tree },
+            references,
+            new CSharpCompilationOptions(OutputKind.ConsoleApplication));
+        using var output = new MemoryStream();
+        var result = compilation.Emit(output);
+        diagnostics = string.Join("\n", result.Diagnostics.Where(d => d.Severity == DiagnosticSeverity.Error));
+        return result.Success ? output.ToArray() : null;
+    }
+
+    static byte[] CompileFSharp(string filename, out string diagnostics)
+    {
+        var directory = Directory.CreateTempSubdirectory("eval-harness-fsc-");
+        try
+        {
+            var assemblyPath = Path.Combine(directory.FullName, $"candidate{compilations}.dll");
+            var argv = new List<string>
+            {
+                "fsc.exe", $"--out:{assemblyPath}", "--target:exe", "--define:DEBUG", "--noframework",
+                "--targetprofile:netcore", "--nowin32manifest", "--nologo", "--optimize-", "--nowarn:FS0988",
+            };
+            argv.AddRange(referencePaths.Select(path => $"-r:{path}"));
+            argv.Add(filename);
+            var errors = RunCompiler(argv.ToArray())
+                .Where(d => d.Severity == FSharpDiagnosticSeverity.Error)
+                .ToList();
+            diagnostics = string.Join("\n", errors);
+            return errors.Count == 0 && File.Exists(assemblyPath) ? File.ReadAllBytes(assemblyPath) : null;
+        }
+        finally
+        {
+            directory.Delete(true);
+        }
+    }
+
+    // The optional parameters of the F# compiler service, which vary between
+    // its versions, are all left to their default (None, i.e. null).
+    static FSharpChecker CreateChecker()
+    {
+        var create = typeof(FSharpChecker).GetMethod("Create");
+        return (FSharpChecker)create.Invoke(null, new object[create.GetParameters().Length]);
+    }
+
+    static IEnumerable<FSharpDiagnostic> RunCompiler(string[] argv)
+    {
+        var compile = typeof(FSharpChecker).GetMethods().First(
+            m => m.Name == "Compile" && m.GetParameters()[0].ParameterType == typeof(string[]));
+        var arguments = new object[compile.GetParameters().Length];
+        arguments[0] = argv;
+        var computation = compile.Invoke(checker, arguments);
+        // FSharpAsync<(FSharpDiagnostic[] * _)>
+        var resultType = computation.GetType().GetGenericArguments()[0];
+        var run = typeof(FSharpAsync).GetMethod("RunSynchronously").MakeGenericMethod(resultType);
+        var result = run.Invoke(null, new[] { computation, null, null });
+        return (FSharpDiagnostic[])resultType.GetProperty("Item1").GetValue(result);
+    }
+
+    static Dictionary<string, object> Response(
+        long id, string phase, int exitCode, bool timeout, bool restart, string stdout, string stderr)
+    {
+        return new Dictionary<string, object>
+        {
+            ["id"] = id,
+            ["phase"] = phase,
+            ["exit_code"] = exitCode,
+            ["timeout"] = timeout,
+            ["restart"] = restart,
+            ["stdout"] = stdout,
+            ["stderr"] = stderr,
+        };
+    }
+
+    static void Respond(Dictionary<string, object> response)
+    {
+        var line = JsonSerializer.SerializeToUtf8Bytes(response);
+        responses.Write(line);
+        responses.WriteByte((byte)'\n');
+        responses.Flush();
+    }
+
+    static string Truncate(string text, int length) => text.Length <= length ? text : text.Substring(0, length);
+
+    /// Reports failed assertions on the captured stderr and stops the candidate.
+    class AssertListener : TraceListener
+    {
+        public override void Write(string message) => Console.Error.Write(message);
+
+        public override void WriteLine(string message) => Console.Error.WriteLine(message);
+
+        public override void Fail(string message, string detailMessage)
+        {
+            throw new AssertionFailedException(
+                $"Assertion failed. {message} {detailMessage}".TrimEnd() + "\n" + new StackTrace(2, true));
+        }
+    }
+
+    class AssertionFailedException : Exception
+    {
+        public AssertionFailedException(string message) : base(message) { }
+    }
+
+    /// Keeps the first `limit` characters written to it.
+    class LimitedWriter : TextWriter
+    {
+        readonly StringBuilder text = new StringBuilder();
+        readonly int limit;
+
+        public LimitedWriter(int limit) => this.limit = limit;
+
+        public override Encoding Encoding => Encoding.UTF8;
+
+        public override void Write(char value)
+        {
+            lock (text)
+            {
+                if (text.Length < limit)
+                {
+                    text.Append(value);
+                }
+            }
+        }
+
+        public override void Write(string value)
+        {
+            if (value == null)
+            {
+                return;
+            }
+            lock (text)
+            {
+                text.Append(value, 0, Math.Min(value.Length, Math.Max(0, limit - text.Length)));
+            }
+        }
+
+        public override string ToString()
+        {
+            lock (text)
+            {
+                return text.ToString();
+            }
+        }
+    }
+}
@@ -1,12 +1,62 @@
+import asyncio
+import contextlib
+import contextvars
 import fcntl
 import os
+import selectors
 import signal
 import subprocess
+import sys
 import time
 from typing import List
 
-MAX_BYTES_PER_READ = 1024
-SLEEP_BETWEEN_READS = 0.1
+from ..execute import limited_command, resource_limits
+
+MAX_BYTES_PER_READ = 65536
+
+# Bounds of the interval between checks for the exit of the process on
+# platforms without pidfd_open, where its exit cannot be waited for with select.
+MIN_POLL_INTERVAL = 0.001
+MAX_POLL_INTERVAL = 0.05
+
+# Runtimes that reserve much more virtual memory than they use, whose memory
+# limit bounds the data segment rather than the address space.
+DATA_LIMITED_EXECUTABLES = [
+    "clojure",
+    "csc",
+    "dotnet",
+    "go",
+    "java",
+    "javac",
+    "julia",
+    "mono",
+    "node",
+    "runghc",
+    "scala",
+    "scalac",
+    "tsc",
+]
+
+# Messages of the runtimes of the MultiPL-E languages when an allocation fails,
+# matched case-insensitively against the output of a process that failed
+# under a memory limit.
+OUT_OF_MEMORY_MESSAGES = [
+    "allowed memory size of",
+    "cannot allocate memory",
+    "cannot allocate vector of size",
+    "failed to allocate memory",
+    "memory allocation of",
+    "memoryerror",
+    "not enough memory",
+    "out of memory",
+    "out_of_memory",
+    "outofmemory",
+    "std::bad_alloc",
+]
+
+
+# The runs recorded by `record_resources` in the current thread or task, or None.
+_RECORDED_RUNS = contextvars.ContextVar("recorded_runs", default=None)
 
 
 class Result:
@@ -14,12 +64,56 @@ class Result:
     exit_code: int
     stdout: str
     stderr: str
+    wall_time: float
+    user_time: float
+    sys_time: float
+    peak_rss: int
+    limit_exceeded: str
 
-    def __init__(self, timeout, exit_code, stdout, stderr):
+    def __init__(
+        self,
+        timeout,
+        exit_code,
+        stdout,
+        stderr,
+        wall_time=None,
+        user_time=None,
+        sys_time=None,
+        peak_rss=None,
+        limit_exceeded=None,
+    ):
         self.timeout = timeout
         self.exit_code = exit_code
         self.stdout = stdout
         self.stderr = stderr
+        self.wall_time = wall_time
+        self.user_time = user_time
+        self.sys_time = sys_time
+        self.peak_rss = peak_rss
+        # "memory" or "cpu" when the process failed by exceeding a resource limit.
+        self.limit_exceeded = limit_exceeded
+
+
+@contextlib.contextmanager
+def record_resources():
+    """
+    Collects the resources used by every `run` in the current thread, or every
+    `run_async` in the current asyncio task, while the context is active, as a
+    list of `(phase, result)` pairs.
+    """
+    runs = []
+    token = _RECORDED_RUNS.set(runs)
+    try:
+        yield runs
+    finally:
+        _RECORDED_RUNS.reset(token)
+
+
+def record_run(phase, result):
+    """Records `result` under `phase` in the runs collected by `record_resources`, if any."""
+    runs = _RECORDED_RUNS.get()
+    if runs is not None:
+        runs.append((phase, result))
 
 
 def set_nonblocking(reader):
@@ -28,62 +122,240 @@ def set_nonblocking(reader):
     fcntl.fcntl(fd, fcntl.F_SETFL, fl | os.O_NONBLOCK)
 
 
+def _pidfd_open(pid):
+    """Returns a file descriptor that becomes readable when `pid` exits, or None if unsupported."""
+    try:
+        return os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        return None
+
+
+class _Process:
+    """A process started by `run` or `run_async`, with the output captured so far."""
+
+    def __init__(self, args, timeout_seconds, max_output_size, env, phase):
+        memory, cpu, nproc = resource_limits(timeout_seconds)
+        # Compilers are trusted and some of them, such as rustc, swiftc and
+        # ghc, need more memory than a candidate is allowed, so only their
+        # CPU time and processes are bounded.
+        self.limits = (None if phase == "compile" else memory, cpu, nproc)
+        address_space = os.path.basename(str(args[0])) not in DATA_LIMITED_EXECUTABLES
+        self.start = time.monotonic()
+        self.deadline = self.start + timeout_seconds
+        self.max_output_size = max_output_size
+        self.popen = subprocess.Popen(
+            limited_command(args, self.limits, address_space=address_space, env=env),
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True,
+        )
+        self.process_group_id = os.getpgid(self.popen.pid)
+        self.stdout_fd = self.popen.stdout.fileno()
+        self.stderr_fd = self.popen.stderr.fileno()
+        set_nonblocking(self.popen.stdout)
+        set_nonblocking(self.popen.stderr)
+        self.saved = {self.stdout_fd: [], self.stderr_fd: []}
+        self.bytes_read = {self.stdout_fd: 0, self.stderr_fd: 0}
+        self.exit_code = None
+        self.rusage = None
+        self.pidfd = _pidfd_open(self.popen.pid)
+
+    def read(self, fd):
+        """Reads what is available on `fd`. Returns None at end of file, and b"" if nothing is available."""
+        try:
+            data = os.read(fd, MAX_BYTES_PER_READ)
+        except BlockingIOError:
+            return b""
+        if not data:
+            return None
+        # Output beyond max_output_size is read, so that the process does not
+        # block on a full pipe, and discarded.
+        if self.bytes_read[fd] < self.max_output_size:
+            self.saved[fd].append(data[: self.max_output_size - self.bytes_read[fd]])
+        self.bytes_read[fd] += len(data)
+        return data
+
+    def drain(self, fds):
+        """
+        Collects the output the process wrote before exiting. Pipes still held
+        open by its descendants are not waited for, they are killed by `finish`.
+        """
+        for fd in fds:
+            while time.monotonic() < self.deadline and self.read(fd):
+                pass
+
+    def reap(self):
+        """Reaps the process if it exited, with wait4 rather than poll() to get its rusage."""
+        pid, status, rusage = os.wait4(self.popen.pid, os.WNOHANG)
+        if pid != 0:
+            self.exit_code = os.waitstatus_to_exitcode(status)
+            self.rusage = rusage
+
+    def finish(self, phase):
+        """Kills the process group, reaps the process and returns its `Result`."""
+        if self.pidfd is not None:
+            os.close(self.pidfd)
+            self.pidfd = None
+        try:
+            # Kills the process group. Without this line, test_fork_once fails.
+            os.killpg(self.process_group_id, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        if self.exit_code is None:
+            _, _, self.rusage = os.wait4(self.popen.pid, 0)
+        self.popen.returncode = self.exit_code if self.exit_code is not None else -signal.SIGKILL
+        self.popen.stdout.close()
+        self.popen.stderr.close()
+        wall_time = time.monotonic() - self.start
+
+        timeout = self.exit_code is None
+        exit_code = self.exit_code if self.exit_code is not None else -1
+        stdout = b"".join(self.saved[self.stdout_fd]).decode("utf-8", errors="ignore")
+        stderr = b"".join(self.saved[self.stderr_fd]).decode("utf-8", errors="ignore")
+        limit_exceeded = None
+        memory_limit, cpu_limit, _ = self.limits
+        cpu_time = self.rusage.ru_utime + self.rusage.ru_stime
+        if not timeout and exit_code != 0:
+            # RLIMIT_CPU applies to every process on its own, while the rusage
+            # of wait4 includes the children of the process, so the CPU time
+            # alone does not tell that the limit was hit. The kernel sends
+            # SIGXCPU at the soft limit and SIGKILL at the hard one.
+            if cpu_limit is not None and (
+                exit_code == -signal.SIGXCPU or (exit_code == -signal.SIGKILL and cpu_time >= cpu_limit)
+            ):
+                limit_exceeded = "cpu"
+            elif memory_limit is not None and any(
+                message in (stdout + stderr).lower() for message in OUT_OF_MEMORY_MESSAGES
+            ):
+                limit_exceeded = "memory"
+        result = Result(
+            timeout=timeout,
+            exit_code=exit_code,
+            stdout=stdout,
+            stderr=stderr,
+            wall_time=wall_time,
+            user_time=self.rusage.ru_utime,
+            sys_time=self.rusage.ru_stime,
+            # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+            peak_rss=self.rusage.ru_maxrss * (1 if sys.platform == "darwin" else 1024),
+            limit_exceeded=limit_exceeded,
+        )
+        record_run(phase, result)
+        return result
+
+
 def run(
     args: List[str],
     timeout_seconds: int = 50,
     max_output_size: int = 2048,
     env=None,
+    phase: str = "run",
 ) -> Result:
     """
     Runs the given program with arguments. After the timeout elapses, kills the process
     and all other processes in the process group. Captures at most max_output_size bytes
     of stdout and stderr each, and discards any output beyond that.
+
+    The pipes and the exit of the process (through a pidfd) are waited for with a
+    selector, so the call returns as soon as the process exits.
+
+    The wall time, CPU time and peak RSS of the process are reported in the result,
+    and recorded under `phase` ("compile" or "run") by `record_resources`.
+
+    The process runs under the memory, CPU and process limits of the Python sandbox
+    (see `resource_limits` in execute.py), with the CPU limit derived from the timeout.
+    Compile steps are not bound by the memory limit.
     """
-    p = subprocess.Popen(
-        args,
-        env=env,
-        stdin=subprocess.DEVNULL,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        start_new_session=True,
-        bufsize=MAX_BYTES_PER_READ,
-    )
-    set_nonblocking(p.stdout)
-    set_nonblocking(p.stderr)
-
-    process_group_id = os.getpgid(p.pid)
-
-    # We sleep for 0.1 seconds in each iteration.
-    max_iterations = timeout_seconds * 10
-    stdout_saved_bytes = []
-    stderr_saved_bytes = []
-    stdout_bytes_read = 0
-    stderr_bytes_read = 0
-
-    for _ in range(max_iterations):
-        this_stdout_read = p.stdout.read(MAX_BYTES_PER_READ)
-        this_stderr_read = p.stderr.read(MAX_BYTES_PER_READ)
-        # this_stdout_read and this_stderr_read may be None if stdout or stderr
-        # are closed. Without these checks, test_close_output fails.
-        if this_stdout_read is not None and stdout_bytes_read < max_output_size:
-            stdout_saved_bytes.append(this_stdout_read)
-            stdout_bytes_read += len(this_stdout_read)
-        if this_stderr_read is not None and stderr_bytes_read < max_output_size:
-            stderr_saved_bytes.append(this_stderr_read)
-            stderr_bytes_read += len(this_stderr_read)
-        exit_code = p.poll()
-        if exit_code is not None:
-            break
-        time.sleep(SLEEP_BETWEEN_READS)
+    process = _Process(args, timeout_seconds, max_output_size, env, phase)
+    open_fds = [process.stdout_fd, process.stderr_fd]
+    try:
+        with selectors.DefaultSelector() as selector:
+            for fd in open_fds:
+                selector.register(fd, selectors.EVENT_READ)
+            if process.pidfd is not None:
+                selector.register(process.pidfd, selectors.EVENT_READ)
+            # Without a pidfd, the exit of the process is polled with a backoff.
+            poll_interval = MIN_POLL_INTERVAL
+
+            while process.exit_code is None:
+                remaining = process.deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                wait = remaining if process.pidfd is not None else min(remaining, poll_interval)
+                for key, _ in selector.select(wait):
+                    if key.fd != process.pidfd and process.read(key.fd) is None:
+                        selector.unregister(key.fd)
+                        open_fds.remove(key.fd)
+                if process.pidfd is None:
+                    poll_interval = min(poll_interval * 2, MAX_POLL_INTERVAL)
+                process.reap()
+
+        if process.exit_code is not None:
+            process.drain(open_fds)
+    finally:
+        result = process.finish(phase)
+    return result
+
+
+async def run_async(
+    args: List[str],
+    timeout_seconds: int = 50,
+    max_output_size: int = 2048,
+    env=None,
+    phase: str = "run",
+) -> Result:
+    """
+    Like `run`, but supervises the process from the running asyncio event loop,
+    so that one thread can wait for many processes at once.
+
+    This does not use asyncio.create_subprocess_exec, whose child watcher
+    reaps the process itself (from a thread per process by default) and
+    loses its rusage.
+    """
+    loop = asyncio.get_running_loop()
+    process = _Process(args, timeout_seconds, max_output_size, env, phase)
+    open_fds = [process.stdout_fd, process.stderr_fd]
+    exited = loop.create_future()
+
+    def on_output(fd):
+        if process.read(fd) is None:
+            loop.remove_reader(fd)
+            open_fds.remove(fd)
+
+    def on_exit():
+        loop.remove_reader(process.pidfd)
+        if not exited.done():
+            exited.set_result(None)
 
     try:
-        # Kills the process group. Without this line, test_fork_once fails.
-        os.killpg(process_group_id, signal.SIGKILL)
-    except ProcessLookupError:
-        pass
-
-    timeout = exit_code is None
-    exit_code = exit_code if exit_code is not None else -1
-    stdout = b"".join(stdout_saved_bytes).decode("utf-8", errors="ignore")
-    stderr = b"".join(stderr_saved_bytes).decode("utf-8", errors="ignore")
-    return Result(timeout=timeout, exit_code=exit_code, stdout=stdout, stderr=stderr)
+        for fd in open_fds:
+            loop.add_reader(fd, on_output, fd)
+        if process.pidfd is not None:
+            loop.add_reader(process.pidfd, on_exit)
+            try:
+                await asyncio.wait_for(exited, max(0, process.deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+            process.reap()
+        else:
+            # Without a pidfd, the exit of the process is polled with a backoff.
+            poll_interval = MIN_POLL_INTERVAL
+            process.reap()
+            while process.exit_code is None:
+                remaining = process.deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(min(remaining, poll_interval))
+                poll_interval = min(poll_interval * 2, MAX_POLL_INTERVAL)
+                process.reap()
+    finally:
+        for fd in open_fds:
+            loop.remove_reader(fd)
+        if process.pidfd is not None:
+            loop.remove_reader(process.pidfd)
+        if process.exit_code is not None:
+            process.drain(open_fds)
+        result = process.finish(phase)
+    return result
@@ -15,8 +15,12 @@ def estimator(n: int, c: int, k: int) -> float:
 def for_file(path):
     with open(path, "r") as f:
         data = json.load(f)
-    n = len(data["results"])
+    return for_results(data["results"])
+
+
+def for_results(results):
+    n = len(results)
     c = len(
-        [True for r in data["results"] if r["status"] == "OK" and r["exit_code"] == 0]
+        [True for r in results if r["status"] == "OK" and r["exit_code"] == 0]
     )
     return np.array([estimator(n, c, 1), estimator(n, c, 10), estimator(n, c, 25), estimator(n, c, 100)])
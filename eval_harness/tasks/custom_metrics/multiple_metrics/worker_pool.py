@@ -0,0 +1,386 @@
+"""
+Pools of persistent worker processes evaluating candidates.
+
+Starting a runtime such as a JVM for every candidate often costs much more
+than running the candidate itself. A `WorkerPool` keeps long-lived worker
+processes of a runtime, started on demand up to the size of the pool, each
+evaluating one request at a time:
+
+  - A request is written as a line of JSON on the standard input of an idle
+    worker. The worker writes its response as a line of JSON to the file
+    descriptor in its EVAL_HARNESS_WORKER_FD environment variable, so that
+    nothing a candidate prints can corrupt the protocol. The first line a
+    worker writes is {"ready": true}, once it is ready for requests.
+  - A response holds the "exit_code", "stdout" and "stderr" the candidate
+    would have had in a process of its own, whether it "timeout", the
+    resource limit it exceeded in "limit_exceeded", if any, and fields
+    specific to the runtime. A worker whose state may be damaged, e.g. by a
+    candidate that never returned, sets "restart" and is replaced.
+  - A worker that does not answer TIMEOUT_GRACE seconds after the timeout of
+    a request is killed and replaced, and the request reported as a timeout.
+    When a worker dies while evaluating a request, e.g. because the
+    candidate exited the process, its exit code is reported.
+  - Workers are replaced after the `recycle_after` requests of their pool,
+    RECYCLE_AFTER by default, which bounds the state a candidate can leak to
+    the next ones.
+
+Evaluators (see engine.py) yield a `Request` to a pool where they would yield
+a `Command`, and receive a `WorkerResult`, or None when persistent workers are
+disabled or the pool could not start a worker, in which case they run the
+candidate with commands as before.
+
+Workers run under the memory and process limits of safe_subprocess.py, but not
+under its CPU limit, which would count the CPU time of all their requests.
+
+Persistent workers are enabled by setting the EVAL_HARNESS_PERSISTENT_WORKERS
+environment variable to "1". They are off by default: tests/test_worker_pools.py
+checks that every runner gives the statuses of the per-process evaluator, and
+should pass on the toolchains of a machine before they are enabled there.
+"""
+
+import asyncio
+import atexit
+import functools
+import hashlib
+import json
+import os
+import selectors
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from ..execute import limited_command, memory_limit_bytes, nproc_limit
+from ..scheduler import default_cpu_budget
+from .safe_subprocess import MAX_BYTES_PER_READ, Result
+
+# Requests evaluated by a worker before it is replaced.
+RECYCLE_AFTER = 500
+
+# Seconds a worker may take to start, including the compilation of its runtime.
+STARTUP_TIMEOUT = 120
+
+# Seconds a worker has after the timeout of a request to report the timeout itself.
+TIMEOUT_GRACE = 2
+
+# Directory of the runners built by `build_once`.
+BUILD_DIR = "~/.cache/eval_harness/workers"
+
+_POOLS = []
+
+
+def persistent_workers_enabled():
+    return os.getenv("EVAL_HARNESS_PERSISTENT_WORKERS", "0") == "1"
+
+
+class WorkerUnavailable(Exception):
+    """Raised when a worker cannot be built or started."""
+
+
+class Request:
+    """A request to a worker of `pool`, the counterpart of `Command` for persistent workers."""
+
+    def __init__(self, pool, payload, timeout_seconds=50, max_output_size=2048, phase="run"):
+        self.pool = pool
+        self.payload = payload
+        self.timeout_seconds = timeout_seconds
+        self.max_output_size = max_output_size
+        self.phase = phase
+
+    def options(self):
+        return dict(timeout_seconds=self.timeout_seconds, max_output_size=self.max_output_size)
+
+
+class WorkerResult(Result):
+    """
+    The `Result` of a request, with the full `response` of the worker. Its
+    `peak_rss` is None, since the peak RSS of the worker covers every request
+    it has served and not only this one.
+    """
+
+    def __init__(self, response, **kwargs):
+        super().__init__(**kwargs)
+        self.response = response
+
+
+def build_once(name, inputs, build):
+    """
+    Returns a directory under BUILD_DIR filled by `build(directory)`, which is
+    only called once for every distinct list of strings `inputs`, such as the
+    source of a runner and the version of its toolchain.
+    """
+    h = hashlib.sha256()
+    for part in inputs:
+        data = str(part).encode("utf-8")
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+    path = Path(BUILD_DIR).expanduser() / f"{name}-{h.hexdigest()[:16]}"
+    if path.exists():
+        return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Build in a temporary directory renamed into place, so that concurrent
+    # runs never use a partial build.
+    directory = Path(tempfile.mkdtemp(prefix=f".{name}-", dir=path.parent))
+    try:
+        build(directory)
+        os.rename(directory, path)
+    except subprocess.CalledProcessError as e:
+        output = (e.stdout or b"") + (e.stderr or b"")
+        raise WorkerUnavailable(f"building {name} failed: {output.decode('utf-8', errors='ignore')[-2048:]}")
+    except subprocess.TimeoutExpired as e:
+        raise WorkerUnavailable(f"building {name} timed out after {e.timeout} seconds")
+    except OSError as e:
+        if not path.exists():
+            raise WorkerUnavailable(f"building {name} failed: {e}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return path
+
+
+class _Worker:
+    """A worker process and the pipe of its responses."""
+
+    def __init__(self, args, env):
+        read_fd, write_fd = os.pipe()
+        limits = (memory_limit_bytes(), None, nproc_limit())
+        self.log = tempfile.TemporaryFile()
+        try:
+            self.popen = subprocess.Popen(
+                limited_command(args, limits, address_space=False, env=env),
+                env=dict(env, EVAL_HARNESS_WORKER_FD=str(write_fd)),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=self.log,
+                pass_fds=(write_fd,),
+                start_new_session=True,
+            )
+        except OSError:
+            os.close(read_fd)
+            self.log.close()
+            raise
+        finally:
+            os.close(write_fd)
+        self.process_group_id = os.getpgid(self.popen.pid)
+        self.responses = read_fd
+        self.buffer = b""
+        self.requests = 0
+
+    def send(self, message):
+        self.popen.stdin.write(json.dumps(message).encode("utf-8") + b"\n")
+        self.popen.stdin.flush()
+
+    def receive(self, timeout):
+        """Returns the next response, or None after `timeout` seconds. Raises EOFError if the worker exited."""
+        deadline = time.monotonic() + timeout
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.responses, selectors.EVENT_READ)
+            while b"\n" not in self.buffer:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not selector.select(remaining):
+                    return None
+                data = os.read(self.responses, MAX_BYTES_PER_READ)
+                if not data:
+                    raise EOFError
+                self.buffer += data
+        line, self.buffer = self.buffer.split(b"\n", 1)
+        return json.loads(line)
+
+    def cpu_times(self):
+        """Returns the (user, sys) CPU time of the worker so far, or (None, None) without /proc."""
+        try:
+            with open(f"/proc/{self.popen.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            return None, None
+        ticks = os.sysconf("SC_CLK_TCK")
+        return int(fields[11]) / ticks, int(fields[12]) / ticks
+
+    def errors(self):
+        """Returns the end of what the worker wrote to its stderr."""
+        self.log.seek(0, os.SEEK_END)
+        self.log.seek(max(0, self.log.tell() - 2048))
+        return self.log.read().decode("utf-8", errors="ignore")
+
+    def kill(self):
+        """Kills the worker and its descendants and returns its exit code."""
+        try:
+            os.killpg(self.process_group_id, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        exit_code = self.popen.wait()
+        for close in (self.popen.stdin.close, lambda: os.close(self.responses)):
+            try:
+                close()
+            except OSError:
+                pass
+        return exit_code
+
+
+class WorkerPool:
+    """
+    Up to `size` workers running `command(prepared)`, where `prepared` is what
+    `prepare()` returned, e.g. the directory of a runner built by `build_once`.
+    `prepare` runs once, before the first worker starts. If it fails, or a
+    worker fails to start, the pool stays unavailable for the rest of the run.
+    Workers are replaced after `recycle_after` requests.
+    """
+
+    def __init__(self, name, command, prepare=None, size=None, env=None, recycle_after=RECYCLE_AFTER):
+        self.name = name
+        self.command = command
+        self.prepare = prepare
+        self.size = size
+        self.env = env or {}
+        self.recycle_after = recycle_after
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+        self._prepare_lock = threading.Lock()
+        self._prepared = None
+        self._idle = []
+        self._workers = set()
+        self._starting = 0
+        self._unavailable = None
+        self._executor = None
+        _POOLS.append(self)
+
+    def request(self, payload, timeout_seconds=50, max_output_size=2048):
+        """
+        Evaluates `payload` on a worker and returns its `WorkerResult`, or None
+        if the pool is unavailable.
+        """
+        worker = self._acquire()
+        if worker is None:
+            return None
+        worker.requests += 1
+        message = dict(payload, id=worker.requests, timeout=timeout_seconds, max_output_size=max_output_size)
+        start = time.monotonic()
+        user_before, sys_before = worker.cpu_times()
+        exit_code = None
+        try:
+            worker.send(message)
+            response = worker.receive(timeout_seconds + TIMEOUT_GRACE)
+        except (OSError, EOFError, ValueError):
+            response = None
+            exit_code = worker.kill()
+        wall_time = time.monotonic() - start
+        user_after, sys_after = worker.cpu_times() if exit_code is None else (None, None)
+
+        if response is None:
+            if exit_code is None:
+                # The worker did not even report the timeout.
+                worker.kill()
+                response = dict(timeout=True, exit_code=-1, stdout="", stderr="")
+            else:
+                response = dict(timeout=False, exit_code=exit_code, stdout="", stderr=worker.errors()[-max_output_size:])
+            self._discard(worker)
+        elif response.get("timeout") or response.get("restart") or worker.requests >= self.recycle_after:
+            worker.kill()
+            self._discard(worker)
+        else:
+            self._release(worker)
+
+        return WorkerResult(
+            response,
+            timeout=bool(response.get("timeout")),
+            exit_code=response["exit_code"],
+            stdout=response.get("stdout", "")[:max_output_size],
+            stderr=response.get("stderr", "")[:max_output_size],
+            wall_time=wall_time,
+            user_time=user_after - user_before if user_after is not None and user_before is not None else 0.0,
+            sys_time=sys_after - sys_before if sys_after is not None and sys_before is not None else 0.0,
+            limit_exceeded=response.get("limit_exceeded"),
+        )
+
+    async def request_async(self, payload, timeout_seconds=50, max_output_size=2048):
+        """Like `request`, waiting for the worker from a thread of the pool rather than the event loop."""
+        if not persistent_workers_enabled() or self._unavailable is not None:
+            return None
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._size(), thread_name_prefix=f"{self.name}-pool")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(self.request, payload, timeout_seconds, max_output_size)
+        )
+
+    def close(self):
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+            self._idle.clear()
+            executor, self._executor = self._executor, None
+        for worker in workers:
+            worker.kill()
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _size(self):
+        return self.size or max(1, int(default_cpu_budget()))
+
+    def _acquire(self):
+        if not persistent_workers_enabled():
+            return None
+        with self._lock:
+            while True:
+                if self._unavailable is not None:
+                    return None
+                if self._idle:
+                    return self._idle.pop()
+                if len(self._workers) + self._starting < self._size():
+                    self._starting += 1
+                    break
+                self._released.wait()
+        worker = None
+        try:
+            worker = self._start()
+        except WorkerUnavailable as e:
+            with self._lock:
+                if self._unavailable is None:
+                    self._unavailable = str(e)
+                    print(f"Persistent {self.name} workers are unavailable, running one process per candidate: {e}")
+        finally:
+            with self._lock:
+                self._starting -= 1
+                if worker is not None:
+                    self._workers.add(worker)
+                self._released.notify_all()
+        return worker
+
+    def _start(self):
+        with self._prepare_lock:
+            if self._prepared is None:
+                self._prepared = self.prepare() if self.prepare is not None else True
+        try:
+            worker = _Worker(self.command(self._prepared), dict(os.environ, **self.env))
+        except OSError as e:
+            raise WorkerUnavailable(str(e))
+        try:
+            ready = worker.receive(STARTUP_TIMEOUT)
+        except (EOFError, ValueError):
+            ready = None
+        if not ready or not ready.get("ready"):
+            errors = worker.errors()
+            worker.kill()
+            raise WorkerUnavailable(f"the worker did not start: {errors}")
+        return worker
+
+    def _release(self, worker):
+        with self._lock:
+            if worker in self._workers:
+                self._idle.append(worker)
+            self._released.notify()
+
+    def _discard(self, worker):
+        with self._lock:
+            self._workers.discard(worker)
+            self._released.notify()
+
+
+@atexit.register
+def _close_pools():
+    for pool in _POOLS:
+        pool.close()
@@ -8,6 +8,7 @@ from concurrent.futures import (
     ThreadPoolExecutor, 
     as_completed
 )
+from eval_harness.tasks.custom_metrics.execution_cache import cache_key, get_execution_cache, is_cacheable
 from eval_harness.tasks.custom_metrics.pal_metric.python_executor import run_program
 
 # adapted from https://github.com/huggingface/evaluate/blob/main/metrics/code_eval/code_eval.py
@@ -61,24 +62,34 @@ def compute(
     if os.name == "nt":
         raise NotImplementedError("This metric is currently not supported on Windows.")
 
+    cache = get_execution_cache()
+
     with ThreadPoolExecutor(max_workers=num_workers) as executor:
-        futures = []
+        futures = {}
         completion_id = Counter()
         n_samples = 0
         results = defaultdict(list)
 
         for task_id, candidates in enumerate(predictions):
             for candidate in candidates:
-                args = (candidate, timeout, task_id, completion_id[task_id])
-                if answer_symbol:
-                    args += (answer_symbol,)
-                future = executor.submit(run_program, *args)
-                futures.append(future)
+                key = cache_key(candidate, answer_symbol or "", "sandbox-pal", timeout) if cache else None
+                cached = cache.get(key) if cache else None
+                if cached is not None:
+                    result = dict(task_id=task_id, result=cached["result"], completion_id=completion_id[task_id])
+                    results[task_id].append((result["completion_id"], result))
+                else:
+                    args = (candidate, timeout, task_id, completion_id[task_id])
+                    if answer_symbol:
+                        args += (answer_symbol,)
+                    future = executor.submit(run_program, *args)
+                    futures[future] = key
                 completion_id[task_id] += 1
                 n_samples += 1
 
         for future in as_completed(futures):
             result = future.result()
+            if cache and is_cacheable(result):
+                cache.set(futures[future], dict(result=result["result"]))
             results[result["task_id"]].append((result["completion_id"], result))
 
     answers = [None] * len(results)
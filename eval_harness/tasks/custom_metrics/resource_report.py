@@ -0,0 +1,101 @@
+"""Per-problem accounting of the resources used to execute candidates.
+
+Metrics record the resources of every candidate they execute (see
+`run_job_with_resources` in execute.py and `record_resources` in
+multiple_metrics/safe_subprocess.py) under the name of its problem. The
+evaluator resets the report before evaluating a task and prints a summary of
+the slowest and most memory-hungry problems afterwards, optionally saving it
+as JSON to the path in the EVAL_HARNESS_RESOURCE_REPORT environment variable.
+
+Results served from the execution cache or shared by deduplicated candidates
+were not executed and are not recorded.
+"""
+
+import json
+import os
+import threading
+
+# Resources summed over the executions of a problem. peak_rss is the maximum.
+SUMMED_RESOURCES = ["wall_time", "user_time", "sys_time", "compile_time", "run_time"]
+
+_LOCK = threading.Lock()
+_PROBLEMS = {}
+
+
+def reset():
+    with _LOCK:
+        _PROBLEMS.clear()
+
+
+def record(problem, resources):
+    """Records one execution of a candidate of `problem`. Missing or None resources are ignored."""
+    with _LOCK:
+        stats = _PROBLEMS.setdefault(str(problem), dict(executions=0, peak_rss=None, max_wall_time=None))
+        stats["executions"] += 1
+        for name in SUMMED_RESOURCES:
+            if resources.get(name) is not None:
+                stats[name] = stats.get(name, 0) + resources[name]
+        if resources.get("wall_time") is not None:
+            stats["max_wall_time"] = max(stats["max_wall_time"] or 0, resources["wall_time"])
+        if resources.get("peak_rss") is not None:
+            stats["peak_rss"] = max(stats["peak_rss"] or 0, resources["peak_rss"])
+
+
+def summary(top=10):
+    """
+    Returns the totals over all problems and the `top` problems with the largest
+    total wall time and the largest peak RSS, or None if nothing was recorded.
+    """
+    with _LOCK:
+        problems = {problem: dict(stats) for problem, stats in _PROBLEMS.items()}
+    if not problems:
+        return None
+
+    def ranked(resource):
+        measured = [(problem, stats) for problem, stats in problems.items() if stats.get(resource) is not None]
+        measured.sort(key=lambda item: item[1][resource], reverse=True)
+        return [dict(stats, problem=problem) for problem, stats in measured[:top]]
+
+    totals = dict(problems=len(problems), executions=sum(stats["executions"] for stats in problems.values()))
+    for name in SUMMED_RESOURCES:
+        values = [stats[name] for stats in problems.values() if name in stats]
+        totals[name] = sum(values) if values else None
+    return dict(totals=totals, slowest=ranked("wall_time"), largest=ranked("peak_rss"))
+
+
+def print_summary(task_name, report):
+    totals = report["totals"]
+    print(
+        f"Resources of {task_name}: {totals['executions']} executions over {totals['problems']} problems, "
+        f"{_seconds(totals['wall_time'])} wall, {_seconds(totals['user_time'])} user, "
+        f"{_seconds(totals['sys_time'])} sys"
+    )
+    if report["slowest"]:
+        print("  Slowest problems (total wall time / compile / run / slowest execution):")
+        for stats in report["slowest"]:
+            print(
+                f"    {stats['problem']}: {_seconds(stats['wall_time'])} / {_seconds(stats.get('compile_time'))} / "
+                f"{_seconds(stats.get('run_time'))} / {_seconds(stats['max_wall_time'])}"
+            )
+    if report["largest"]:
+        print("  Most memory-hungry problems (peak RSS):")
+        for stats in report["largest"]:
+            print(f"    {stats['problem']}: {stats['peak_rss'] / 2**20:.1f} MiB")
+
+
+def save(path, task_name, report):
+    """Adds the report of `task_name` to the JSON file at `path`, keeping the other tasks."""
+    path = os.path.expanduser(path)
+    try:
+        with open(path) as f:
+            reports = json.load(f)
+    except (OSError, ValueError):
+        reports = {}
+    reports[task_name] = report
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(reports, f, indent=2)
+
+
+def _seconds(value):
+    return "-" if value is None else f"{value:.2f}s"
@@ -0,0 +1,125 @@
+"""Append-only journal of execution results, to resume interrupted evaluations.
+
+Metrics append the result of every candidate to the journal as soon as it is
+known, one JSON line per candidate keyed by the task, the problem, the
+completion id and a hash of the executed program and of the options it was
+executed with, such as its timeout, so that a run with other settings does not
+reuse the results. When an evaluation dies
+(out of memory, preempted node, ...) it can be rerun in resume mode: results
+journaled for the same key are read back instead of executing the candidate
+again, so only the candidates that had not finished are executed.
+
+Unlike the execution cache (see execution_cache.py), the journal records every
+candidate of a run, including the ones sharing the result of an equivalent
+candidate, and is only read when resuming.
+
+The journal is configured with environment variables, which the evaluator sets
+from its arguments:
+    EVAL_HARNESS_JOURNAL   path of the journal, "" disables it
+    EVAL_HARNESS_RESUME    "1" to reuse the results journaled by earlier runs
+    EVAL_HARNESS_TASK      name of the evaluated task
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import threading
+
+
+def program_hash(program, options=None):
+    """Hashes `program` and the `options` dict it is executed with, if any."""
+    if not options:
+        return hashlib.sha256(program.encode("utf-8")).hexdigest()
+    h = hashlib.sha256()
+    for part in (program, repr(sorted(options.items()))):
+        data = part.encode("utf-8")
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+    return h.hexdigest()
+
+
+class ResultsJournal:
+    """
+    Results of the candidates of `task`, appended to the JSON lines file at
+    `path`. With `resume`, the results journaled earlier for `task` are loaded
+    and returned by `get`; the latest entry of a key wins.
+    """
+
+    def __init__(self, path, task, resume=False):
+        self.path = os.path.expanduser(path)
+        self.task = task
+        self._lock = threading.Lock()
+        self._results = self._load() if resume else {}
+        self.resumed = 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # Every entry is written with a single write to a file opened in append
+        # mode, so that entries of concurrent writers do not interleave.
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def get(self, problem, completion_id, program, options=None):
+        """Returns the result journaled for the candidate executed with `options`, or None."""
+        result = self._results.get((str(problem), completion_id, program_hash(program, options)))
+        if result is not None:
+            with self._lock:
+                self.resumed += 1
+        return result
+
+    def append(self, problem, completion_id, program, result, options=None):
+        entry = dict(
+            task=self.task,
+            problem=str(problem),
+            completion_id=completion_id,
+            program=program_hash(program, options),
+            result=result,
+        )
+        line = (json.dumps(entry, default=str) + "\n").encode("utf-8")
+        with self._lock:
+            if self._fd is not None:
+                os.write(self._fd, line)
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def _load(self):
+        results = {}
+        try:
+            with open(self.path, "rb") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # The last entry of a run that died while writing it.
+                        continue
+                    if entry.get("task") == self.task:
+                        results[(entry["problem"], entry["completion_id"], entry["program"])] = entry["result"]
+        except OSError:
+            pass
+        return results
+
+
+_JOURNALS = {}
+_JOURNALS_LOCK = threading.Lock()
+
+
+def get_results_journal():
+    """
+    Returns the journal of the current task configured by the environment
+    variables, or None when journaling is disabled.
+    """
+    path = os.getenv("EVAL_HARNESS_JOURNAL")
+    if not path:
+        return None
+    task = os.getenv("EVAL_HARNESS_TASK", "")
+    resume = os.getenv("EVAL_HARNESS_RESUME", "0") == "1"
+    with _JOURNALS_LOCK:
+        if (path, task, resume) not in _JOURNALS:
+            journal = ResultsJournal(path, task, resume)
+            _JOURNALS[(path, task, resume)] = journal
+            atexit.register(journal.close)
+            if resume:
+                print(f"Resuming {task} from {len(journal._results)} journaled results")
+        return _JOURNALS[(path, task, resume)]
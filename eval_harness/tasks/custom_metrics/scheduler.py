@@ -0,0 +1,249 @@
+"""Admission of candidate executions against CPU and memory budgets.
+
+Instead of a fixed number of workers per task, every execution is admitted
+once the cores and memory it is expected to use fit in what the running
+executions leave of the budgets. The expected cost of an execution depends on
+its language: a Lua script uses one core and a few megabytes for milliseconds,
+while a rustc or javac build can use several cores and gigabytes. Costs start
+from rough defaults and are learned from the resources of the executions
+(see `summarize_resources` in multiple_metrics/containerized_eval.py): the CPU
+cost is the number of cores an execution kept busy, (user + sys) / wall time,
+and the memory cost its peak RSS. Learned costs are saved in a JSON file so
+that later runs, and tasks running the same language through other metrics,
+start from them.
+
+Waiting executions are admitted in order, but an execution that does not fit
+can be overtaken by cheaper ones that do, so that light interpreters fill the
+cores left by heavy compilers. Once it has been overtaken MAX_BYPASSES times,
+nothing else is admitted until it fits. An execution is always admitted when
+nothing else runs, even if it exceeds the budgets on its own.
+
+The scheduler is configured with environment variables, which the evaluator
+sets from its arguments:
+    EVAL_HARNESS_CPU_BUDGET      cores available to executions, "" for all usable cores
+    EVAL_HARNESS_MEMORY_BUDGET   memory in MB available to executions, "" for
+                                 DEFAULT_MEMORY_FRACTION of the physical memory
+    EVAL_HARNESS_LANGUAGE_COSTS  path of the learned costs
+"""
+
+import asyncio
+import collections
+import contextlib
+import json
+import os
+import tempfile
+import threading
+
+DEFAULT_COSTS_PATH = "~/.cache/eval_harness/language_costs.json"
+
+# Share of the physical memory executions may use when no budget is given.
+DEFAULT_MEMORY_FRACTION = 0.75
+
+# Weight of a new observation in the moving averages of the costs.
+SMOOTHING = 0.1
+
+# Executions mostly waiting, e.g. sleeping until their timeout, still count as
+# this many cores, which bounds the number of concurrent executions.
+MIN_CPU_COST = 0.25
+
+# Times a waiting execution can be overtaken by cheaper ones before it blocks the queue.
+MAX_BYPASSES = 32
+
+MB = 2**20
+
+# (cores, memory in MB) of an execution of a language that was never observed.
+# Interpreters use DEFAULT_COST, compilers and virtual machines are heavier.
+DEFAULT_COST = (1.0, 128)
+DEFAULT_COSTS = {
+    "clj": (2.0, 512),
+    "cpp": (1.0, 256),
+    "cs": (1.5, 256),
+    "d": (1.0, 256),
+    "fs": (2.0, 512),
+    "go": (2.0, 384),
+    "hs": (1.0, 512),
+    "java": (2.0, 384),
+    "jl": (1.5, 512),
+    "rs": (1.0, 512),
+    "rust": (1.0, 512),
+    "scala": (2.5, 768),
+    "swift": (1.0, 512),
+    "ts": (1.5, 384),
+}
+
+_COSTS_LOCK = threading.Lock()
+
+
+def default_cpu_budget():
+    budget = os.getenv("EVAL_HARNESS_CPU_BUDGET", "")
+    if budget:
+        return float(budget)
+    return float(len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count())
+
+
+def default_memory_budget():
+    """Returns the memory budget in bytes."""
+    budget = os.getenv("EVAL_HARNESS_MEMORY_BUDGET", "")
+    if budget:
+        return float(budget) * MB
+    return DEFAULT_MEMORY_FRACTION * os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+
+
+class LanguageCosts:
+    """
+    The expected cores and memory of an execution of every language, as
+    moving averages of the observed executions, persisted in a JSON file.
+    """
+
+    def __init__(self, path=None):
+        path = path if path is not None else os.getenv("EVAL_HARNESS_LANGUAGE_COSTS", DEFAULT_COSTS_PATH)
+        self.path = os.path.expanduser(path) if path else None
+        self.costs = _load_costs(self.path) if self.path else {}
+        self._observed = set()
+
+    def cost(self, language):
+        """Returns the expected (cores, bytes of memory) of an execution of `language`."""
+        if language in self.costs:
+            return self.costs[language]["cpu"], self.costs[language]["memory"]
+        cpu, memory = DEFAULT_COSTS.get(language, DEFAULT_COST)
+        return cpu, memory * MB
+
+    def observe(self, language, resources):
+        """
+        Updates the cost of `language` from the resources of one of its
+        executions. Executions whose peak RSS is unknown, such as those run by
+        persistent workers, are skipped.
+        """
+        if not resources.get("wall_time") or resources.get("peak_rss") is None:
+            return
+        cpu = max(MIN_CPU_COST, (resources["user_time"] + resources["sys_time"]) / resources["wall_time"])
+        memory = resources["peak_rss"]
+        if language in self.costs:
+            cost = self.costs[language]
+            cost["cpu"] += SMOOTHING * (cpu - cost["cpu"])
+            cost["memory"] += SMOOTHING * (memory - cost["memory"])
+            cost["observations"] += 1
+        else:
+            self.costs[language] = dict(cpu=cpu, memory=memory, observations=1)
+        self._observed.add(language)
+
+    def save(self):
+        if not self.path or not self._observed:
+            return
+        _save_costs(self.path, {language: self.costs[language] for language in self._observed})
+        self._observed.clear()
+
+
+class AdmissionScheduler:
+    """
+    Admits executions on the running event loop while the expected cost of
+    the admitted executions fits in the CPU and memory budgets.
+
+        async with scheduler.admit(language):
+            result = await ...
+        scheduler.observe(language, result)
+    """
+
+    def __init__(self, cpu_budget=None, memory_budget=None, costs=None):
+        self.cpu_budget = cpu_budget if cpu_budget is not None else default_cpu_budget()
+        self.memory_budget = memory_budget if memory_budget is not None else default_memory_budget()
+        self.costs = costs if costs is not None else LanguageCosts()
+        self.cpu_used = 0.0
+        self.memory_used = 0.0
+        self.running = 0
+        self._waiters = collections.deque()
+
+    def max_concurrency(self):
+        """Returns the largest number of executions the CPU budget can ever admit at once."""
+        return max(1, int(self.cpu_budget / MIN_CPU_COST))
+
+    def concurrency(self, language):
+        """Returns how many executions of `language` fit in the budgets at once."""
+        cpu, memory = self.costs.cost(language)
+        return max(1, min(int(self.cpu_budget / cpu), int(self.memory_budget / max(memory, 1))))
+
+    @contextlib.asynccontextmanager
+    async def admit(self, language):
+        cost = self.costs.cost(language)
+        waiter = _Waiter(cost, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        self._admit_waiters()
+        try:
+            await waiter.admitted
+        except asyncio.CancelledError:
+            if waiter.admitted.done() and not waiter.admitted.cancelled():
+                self._release(cost)
+            else:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                self._admit_waiters()
+            raise
+        try:
+            yield
+        finally:
+            self._release(cost)
+
+    def observe(self, language, resources):
+        self.costs.observe(language, resources)
+
+    def _fits(self, cost):
+        cpu, memory = cost
+        if self.running == 0:
+            return True
+        return self.cpu_used + cpu <= self.cpu_budget + 1e-9 and self.memory_used + memory <= self.memory_budget
+
+    def _admit_waiters(self):
+        head = None
+        for waiter in list(self._waiters):
+            if waiter.admitted.done():
+                # Cancelled while waiting.
+                self._waiters.remove(waiter)
+                continue
+            if head is not None and head.bypasses >= MAX_BYPASSES:
+                break
+            if not self._fits(waiter.cost):
+                if head is None:
+                    head = waiter
+                continue
+            self._waiters.remove(waiter)
+            cpu, memory = waiter.cost
+            self.cpu_used += cpu
+            self.memory_used += memory
+            self.running += 1
+            waiter.admitted.set_result(None)
+            if head is not None:
+                head.bypasses += 1
+
+    def _release(self, cost):
+        cpu, memory = cost
+        self.cpu_used -= cpu
+        self.memory_used -= memory
+        self.running -= 1
+        self._admit_waiters()
+
+
+class _Waiter:
+    def __init__(self, cost, admitted):
+        self.cost = cost
+        self.admitted = admitted
+        self.bypasses = 0
+
+
+def _load_costs(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_costs(path, costs):
+    # Merge with costs saved concurrently by other runs, and replace the file
+    # atomically so that readers never see a partial file.
+    with _COSTS_LOCK:
+        merged = _load_costs(path)
+        merged.update(costs)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(path), delete=False) as f:
+            json.dump(merged, f, indent=2)
+        os.replace(f.name, path)
@@ -0,0 +1,141 @@
+"""Per-problem timeouts calibrated on the runtime of the reference solutions.
+
+The static timeouts of the tasks are sized for the slowest problem, so a
+candidate stuck in an infinite loop holds a worker for the full budget. When
+calibration is enabled, the canonical solution of every problem is executed
+against its tests and the timeout of the problem becomes
+
+    min(static timeout, max(floor, multiplier * reference runtime))
+
+Problems without a (passing) reference solution keep the static timeout.
+Measured runtimes are cached in a JSON file, keyed by the solution, its tests,
+the toolchain version (see execution_cache.py) and the options of the
+measurement, so calibration only costs anything on the first run.
+
+Calibration is configured with environment variables, which the evaluator sets
+from its arguments:
+    EVAL_HARNESS_CALIBRATE_TIMEOUTS   "1" to enable calibration
+    EVAL_HARNESS_TIMEOUT_MULTIPLIER   multiplier of the reference runtime
+    EVAL_HARNESS_TIMEOUT_FLOOR        smallest timeout in seconds
+    EVAL_HARNESS_TIMEOUT_CACHE        path of the runtime cache
+"""
+
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .execute import run_job_with_resources
+from .execution_cache import cache_key
+
+DEFAULT_MULTIPLIER = 10.0
+DEFAULT_FLOOR = 0.5
+DEFAULT_CACHE_PATH = "~/.cache/eval_harness/reference_runtimes.json"
+
+# Every reference is measured this many times and its median runtime is kept,
+# which discards warm-up effects such as a first compilation of dependencies.
+CALIBRATION_RUNS = 3
+
+_CACHE_LOCK = threading.Lock()
+
+
+def calibration_enabled():
+    return os.getenv("EVAL_HARNESS_CALIBRATE_TIMEOUTS", "0") == "1"
+
+
+def measure_python(solution, reference, timeout):
+    """Returns the runtime of a Python solution in the sandbox, or None if it fails."""
+    result, resources = run_job_with_resources("check_program", (solution + "\n" + reference, timeout), timeout)
+    return resources["wall_time"] if result == "passed" else None
+
+
+def reference_solutions(task, references, get_solution):
+    """
+    Returns the output of `get_solution(doc)` for the doc of every reference,
+    matching docs to references through `task.get_reference`, or None for
+    references without a doc.
+    """
+    solutions = {task.get_reference(doc): get_solution(doc) for doc in task.get_dataset()}
+    return [solutions.get(reference) for reference in references]
+
+
+def calibrate_timeouts(
+    language, solutions, references, timeout, measure=measure_python, num_workers=4, options=None
+):
+    """
+    Returns the timeout of every problem, or `timeout` for every problem when
+    calibration is disabled.
+
+    :param language: the language of the solutions, see `cache_key`
+    :param solutions: the reference solution of every problem, or None
+    :param references: the tests of every problem
+    :param timeout: the static timeout, which is never exceeded
+    :param measure: a function `(solution, reference, timeout)` returning the
+        runtime of a solution in seconds, or None if the solution fails
+    :param options: a dict of whatever else determines the runtimes `measure`
+        returns, such as how the solutions are run, keyed with them
+    """
+    if not calibration_enabled():
+        return [timeout] * len(references)
+
+    path = os.path.expanduser(os.getenv("EVAL_HARNESS_TIMEOUT_CACHE", DEFAULT_CACHE_PATH))
+    runtimes = _load_runtimes(path)
+
+    keys = [
+        cache_key(solution, reference, language, timeout, options) if solution is not None else None
+        for solution, reference in zip(solutions, references)
+    ]
+    missing = sorted({
+        (key, solution, reference)
+        for key, solution, reference in zip(keys, solutions, references)
+        if key is not None and key not in runtimes
+    })
+
+    def calibrate(args):
+        key, solution, reference = args
+        measured = []
+        for _ in range(CALIBRATION_RUNS):
+            runtime = measure(solution, reference, timeout)
+            if runtime is None:
+                return key, None
+            measured.append(runtime)
+        return key, sorted(measured)[len(measured) // 2]
+
+    if missing:
+        print(f"Calibrating timeouts on {len(missing)} reference solutions...")
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            measured = dict(executor.map(calibrate, missing))
+        _save_runtimes(path, measured)
+        runtimes.update(measured)
+
+    return [calibrated_timeout(runtimes.get(key), timeout) for key in keys]
+
+
+def calibrated_timeout(runtime, timeout):
+    """Returns the timeout of a problem whose reference solution runs in `runtime` seconds."""
+    if runtime is None or not calibration_enabled():
+        return timeout
+    multiplier = float(os.getenv("EVAL_HARNESS_TIMEOUT_MULTIPLIER", DEFAULT_MULTIPLIER))
+    floor = float(os.getenv("EVAL_HARNESS_TIMEOUT_FLOOR", DEFAULT_FLOOR))
+    return min(timeout, max(floor, multiplier * runtime))
+
+
+def _load_runtimes(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_runtimes(path, runtimes):
+    # Merge with runtimes saved concurrently by other runs, and replace the
+    # file atomically so that readers never see a partial file.
+    with _CACHE_LOCK:
+        merged = _load_runtimes(path)
+        merged.update(runtimes)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(path), delete=False) as f:
+            json.dump(merged, f)
+        os.replace(f.name, path)
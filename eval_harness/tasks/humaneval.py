@@ -11,6 +11,7 @@ Homepage: https://github.com/openai/human-eval
 
 from eval_harness.base import Task
 from eval_harness.tasks.custom_metrics.code_eval import compute_code_eval
+from eval_harness.tasks.custom_metrics.timeout_calibration import calibrate_timeouts, reference_solutions
 import os
 
 _CITATION = """
@@ -96,11 +97,18 @@ class GeneralHumanEval(Task):
         :param references: list(str)
             list of str containing refrences
         """
+        timeouts = calibrate_timeouts(
+            "sandbox",
+            reference_solutions(self, references, lambda doc: doc["prompt"] + doc["canonical_solution"]),
+            references,
+            self.timeout,
+            num_workers=self.num_workers,
+        )
         results, _ = compute_code_eval(
             references=references,
             predictions=generations,
             k=self.k,
             num_workers=self.num_workers,
-            timeout=self.timeout,
+            timeout=timeouts,
         )
         return results
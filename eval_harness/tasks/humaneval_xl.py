@@ -8,18 +8,13 @@ Homepage: https://github.com/FloatAI/HumanEval-XL
 """
 
 
-import json
-import os
-import tempfile
-from pathlib import Path
 
 import numpy as np
 from datasets import load_dataset
-from tqdm import tqdm
 
 from eval_harness.base import Task
-from eval_harness.tasks.custom_metrics.multiple_metrics.evaluation import evaluate_problem
-from eval_harness.tasks.custom_metrics.multiple_metrics.single_experiment_pass_k import for_file
+from eval_harness.tasks.custom_metrics.multiple_metrics.evaluation import evaluate_problems, save_test_results
+from eval_harness.tasks.custom_metrics.multiple_metrics.single_experiment_pass_k import for_results
 
 
 _CITATION = """
@@ -129,10 +124,9 @@ class GeneralHumanEvalXL(Task):
     DATASET_NAME = None
     DATASET_REVISION = "2f2044483da160d6fb736741ae657ccf784227ba"
 
-    def __init__(self, natural_language, programming_language, num_workers=16):
+    def __init__(self, natural_language, programming_language):
         self.natural_language = natural_language
         self.programming_language = programming_language
-        self.workers = min(num_workers, os.cpu_count() - 1)
         self.DATASET_NAME = programming_language
         # we need the dataset to get stop words for each language
         self.dataset = load_dataset(
@@ -184,35 +178,26 @@ class GeneralHumanEvalXL(Task):
             for i, doc in enumerate(self.get_dataset())
             if i < len(generations)
         ]
-        # a common temp dir for all the problems
-        temp_dir = tempfile.gettempdir()
-        list_files = []
-        for (prompt_name, generation, reference) in zip(
-            prompts_names, generations, references
-        ):
-            problem = {
+        problems = [
+            {
                 "task_id": prompt_name["task_id"],
                 "language": EXT_MAP[self.programming_language],
                 "prompt": prompt_name["prompt"],
                 "completions": generation,
                 "tests": reference,
             }
-            # each problem is save in a json file
-            temp_file_name = os.path.join(temp_dir, f"{prompt_name['task_id']}.json")
-            list_files.append(temp_file_name)
-            with open(temp_file_name, "wt") as f:
-                json.dump(problem, f)
-        print(
-            f"Saved {len(list_files)} problems in {temp_dir} for evaluation, each problem has {len(generations[0])} completions"
-        )
+            for (prompt_name, generation, reference) in zip(
+                prompts_names, generations, references
+            )
+        ]
 
-        # execute the problems to evaluate them
-        for file in tqdm(list_files):
-            evaluate_problem(temp_dir, file, self.workers)
+        # execute the completions of all the problems from a single work queue
+        test_results = evaluate_problems(problems)
+        save_test_results(test_results)
 
         # compute pass@k scores
         result_array = np.array(
-            [for_file(p) for p in Path(temp_dir).glob("*.results.json")]
+            [for_results(problem_results["results"]) for problem_results in test_results]
         )
         result = result_array.mean(axis=0)
         results = {
@@ -1,8 +1,20 @@
 import json
 import re
 import os
+import time
+from collections import defaultdict
+import numpy as np
 from evaluate import load
 from eval_harness.base import Task
+from eval_harness.tasks.custom_metrics.code_eval import estimate_pass_at_k
+from eval_harness.tasks.custom_metrics.execution_cache import cache_key, get_execution_cache, is_cacheable
+from eval_harness.tasks.custom_metrics.multiple_metrics.containerized_eval import eval_string_script
+from eval_harness.tasks.custom_metrics.multiple_metrics.eval_go import GO_CACHE_DIR
+from eval_harness.tasks.custom_metrics.multiple_metrics.evaluation import evaluate_problems, save_test_results
+from eval_harness.tasks.custom_metrics.multiple_metrics.worker_pool import persistent_workers_enabled
+from eval_harness.tasks.custom_metrics.results_journal import get_results_journal
+from eval_harness.tasks.custom_metrics.scheduler import AdmissionScheduler
+from eval_harness.tasks.custom_metrics.timeout_calibration import calibrate_timeouts, calibration_enabled
 
 _CITATION = """
 @article{muennighoff2023octopack,
@@ -54,19 +66,28 @@ LANGUAGE_TO_TIMEOUT = {
     "js": 100,
     "java": 100,
     "go": 100,
-    "rust": 300, # Necessary for first-time compilation of cargo
+    "rust": 100,
 }
 
-# Java sometimes fails with more workers; For JS it's twice as fast with 4 workers
-LANGUAGE_TO_NUM_WORKERS = {
-    "python": 4,
-    "cpp": 4,
-    "js": 4,
-    "java": 1,
-    "go": 4,
-    "rust": 1,
+# Languages of the learned execution costs (see custom_metrics/scheduler.py),
+# shared with the MultiPL-E tasks
+LANGUAGE_TO_COST_LANGUAGE = {
+    "python": "py",
+    "cpp": "cpp",
+    "js": "js",
+    "java": "java",
+    "go": "go",
+    "rust": "rs",
 }
 
+# Languages evaluated by the MultiPL-E evaluators of this repository rather
+# than by the metric, e.g. to run Java candidates on persistent JVMs, to
+# compile C++ candidates against a precompiled header of IMPORT_HELPER and
+# Rust candidates in parallel against prebuilt crates instead of one at a time
+# in a cargo project (see custom_metrics/multiple_metrics/eval_java.py,
+# eval_cpp.py and eval_rust.py)
+EVALUATOR_LANGUAGES = ["cpp", "java", "rust"]
+
 # https://github.com/THUDM/CodeGeeX/blob/23ee51505a2bcd34d59d2e271b22e5bd91475462/codegeex/benchmark/utils.py#L6
 IMPORT_HELPER = {
     "python": [
@@ -334,8 +355,20 @@ class HumanEvalPackGenerative(HumanEvalPack):
         """
         code_metric = load("Muennighoff/code_eval_octopack")
         timeout = LANGUAGE_TO_TIMEOUT[self.DATASET_NAME]
-        num_workers = min(LANGUAGE_TO_NUM_WORKERS[self.DATASET_NAME], os.cpu_count()-1)
+        # The metric runs a fixed number of workers, sized by the cost of the
+        # language against the CPU and memory budgets
+        num_workers = AdmissionScheduler().concurrency(LANGUAGE_TO_COST_LANGUAGE[self.DATASET_NAME])
         language = self.DATASET_NAME if self.DATASET_NAME != "js" else "javascript"
+        if self.DATASET_NAME == "go":
+            # The go commands of the metric share the build cache of the MultiPL-E evaluator.
+            os.environ.setdefault("GOCACHE", os.path.expanduser(GO_CACHE_DIR))
+
+        # The canonical solutions are calibrated with the same imports and
+        # wrapping as the generations, so they ride along as the last candidate.
+        calibrate = calibration_enabled() and not self.prompt.startswith("diff")
+        if calibrate:
+            ds = self.get_dataset().select(range(len(generations)))
+            generations = [gen + [self.get_reference(doc, get_solution=True)] for gen, doc in zip(generations, ds)]
 
         ### CUSTOM MUTATE METHOD CHANGES ###
         if self.prompt == "diff":
@@ -443,13 +476,54 @@ class HumanEvalPackGenerative(HumanEvalPack):
                     gen[i] = new_gen
 
         ### EVALUATION ###
-        results, logs = code_metric.compute(
-            references=references,
-            predictions=generations,
-            language=language,
-            timeout=timeout,
-            num_workers=num_workers,
-        )
+        if calibrate:
+            solutions = [gen[-1] for gen in generations]
+            generations = [gen[:-1] for gen in generations]
+
+            def measure(solution, reference, timeout):
+                if self.DATASET_NAME in EVALUATOR_LANGUAGES:
+                    # The timeout bounds the runs of the evaluator, not the compilation.
+                    result = eval_string_script(
+                        language, solution + "\n" + reference, **evaluation_options(language, timeout)
+                    )
+                    return result["run_time"] if result["status"] == "OK" and result["exit_code"] == 0 else None
+                start = time.monotonic()
+                solution_results, _ = code_metric.compute(
+                    references=[reference],
+                    predictions=[[solution]],
+                    language=language,
+                    timeout=timeout,
+                    num_workers=1,
+                )
+                runtime = time.monotonic() - start
+                return runtime if solution_results["pass@1"] == 1 else None
+
+            if self.DATASET_NAME in EVALUATOR_LANGUAGES:
+                # A persistent worker does not start the runtime for every
+                # candidate, so its runtimes do not carry over to processes.
+                options = dict(evaluation_options(language, timeout), persistent_workers=persistent_workers_enabled())
+            else:
+                options = None
+            timeouts = calibrate_timeouts(language, solutions, references, timeout, measure, num_workers, options)
+        else:
+            timeouts = [timeout] * len(references)
+
+        if self.DATASET_NAME in EVALUATOR_LANGUAGES:
+            results, logs = compute_with_evaluator(
+                references=references,
+                predictions=generations,
+                language=language,
+                timeouts=timeouts,
+            )
+        else:
+            results, logs = compute_with_cache(
+                code_metric,
+                references=references,
+                predictions=generations,
+                language=language,
+                timeouts=timeouts,
+                num_workers=num_workers,
+            )
         # Write logs to json
         os.makedirs(f"/Outputs/Exec_Logs/{language}", exist_ok=True)
         with open(f"/Outputs/Exec_Logs/{language}/compile_logs.json", "a") as f:
@@ -484,6 +558,151 @@ class HumanEvalPackGenerative(HumanEvalPack):
         return results
 
 
+# When journaling, the metric is run on chunks of problems with at least this
+# many candidates per worker, so that results are journaled while the
+# evaluation runs without leaving workers idle.
+JOURNAL_CANDIDATES_PER_WORKER = 4
+
+
+def journal_chunks(tasks, num_workers):
+    """Splits `tasks`, pairs of a task id and the ids of its missing candidates, into chunks to journal."""
+    chunk, size = [], 0
+    for task in tasks:
+        chunk.append(task)
+        size += len(task[1])
+        if size >= JOURNAL_CANDIDATES_PER_WORKER * num_workers:
+            yield chunk
+            chunk, size = [], 0
+    if chunk:
+        yield chunk
+
+
+def compute_with_cache(code_metric, references, predictions, language, timeouts, num_workers, k=[1, 10, 100]):
+    """
+    Runs `code_metric.compute` on the candidates missing from the execution
+    cache (and, when resuming, from the results journal), once per distinct
+    timeout, and merges in the cached results, returning pass@k and logs in
+    the same format as the metric.
+
+    :param timeouts: the timeout of every problem
+    """
+    cache = get_execution_cache()
+    journal = get_results_journal()
+    # The Python candidates are run in-process by the metric.
+    cache_language = "sandbox-octopack" if language == "python" else language
+    logs = defaultdict(list)
+    missing = defaultdict(list)
+    for task_id, (candidates, reference, timeout) in enumerate(zip(predictions, references, timeouts)):
+        missing_ids = []
+        for completion_id, candidate in enumerate(candidates):
+            options = dict(timeout=timeout)
+            cached = journal.get(task_id, completion_id, candidate + reference, options) if journal else None
+            if cached is None and cache:
+                cached = cache.get(cache_key(candidate, reference, cache_language, timeout))
+                if cached is not None and journal:
+                    journal.append(task_id, completion_id, candidate + reference, cached, options)
+            if cached is not None:
+                logs[task_id].append(
+                    (completion_id, dict(task_id=task_id, completion_id=completion_id, **cached))
+                )
+            else:
+                missing_ids.append(completion_id)
+        if missing_ids:
+            missing[timeout].append((task_id, missing_ids))
+
+    chunks = [
+        (timeout, chunk)
+        for timeout, tasks in missing.items()
+        for chunk in (journal_chunks(tasks, num_workers) if journal else [tasks])
+    ]
+    for timeout, tasks in chunks:
+        _, missing_logs = code_metric.compute(
+            references=[references[task_id] for task_id, _ in tasks],
+            predictions=[[predictions[task_id][i] for i in missing_ids] for task_id, missing_ids in tasks],
+            language=language,
+            timeout=timeout,
+            num_workers=num_workers,
+        )
+        for missing_task_id, (task_id, missing_ids) in enumerate(tasks):
+            for missing_completion_id, result in missing_logs[missing_task_id]:
+                completion_id = missing_ids[missing_completion_id]
+                candidate = predictions[task_id][completion_id]
+                if cache and is_cacheable(result):
+                    cache.set(
+                        cache_key(candidate, references[task_id], cache_language, timeout),
+                        dict(passed=result["passed"], result=result["result"]),
+                    )
+                if journal:
+                    journal.append(
+                        task_id, completion_id, candidate + references[task_id],
+                        dict(passed=result["passed"], result=result["result"]), dict(timeout=timeout),
+                    )
+                logs[task_id].append(
+                    (completion_id, dict(result, task_id=task_id, completion_id=completion_id))
+                )
+
+    total, correct = [], []
+    for task_id in sorted(logs):
+        logs[task_id].sort(key=lambda log: log[0])
+        passed = [log[1]["passed"] for log in logs[task_id]]
+        total.append(len(passed))
+        correct.append(sum(passed))
+    total = np.array(total)
+    correct = np.array(correct)
+    ks = k
+    results = {f"pass@{k}": estimate_pass_at_k(total, correct, k).mean() for k in ks if (total >= k).all()}
+    return results, logs
+
+
+def evaluation_options(language, timeout):
+    """Returns the options of the MultiPL-E evaluator of `language` for a problem with `timeout`."""
+    # The Rust tests are #[test] functions, run like `cargo test` would.
+    return dict(timeout_seconds=timeout, test_functions=language == "rust")
+
+
+def compute_with_evaluator(references, predictions, language, timeouts, k=[1, 10, 100]):
+    """
+    Runs the candidates with the MultiPL-E evaluator of `language`, which
+    goes through the execution cache and the results journal itself,
+    returning pass@k and logs in the same format as `compute_with_cache`.
+
+    :param timeouts: the timeout of every problem, which bounds the runs of its candidates
+    """
+    problems = [
+        dict(
+            task_id=task_id,
+            language=language,
+            completions=candidates,
+            tests=reference,
+            **evaluation_options(language, timeout),
+        )
+        for task_id, (candidates, reference, timeout) in enumerate(zip(predictions, references, timeouts))
+    ]
+    all_test_results = evaluate_problems(problems)
+    save_test_results(all_test_results)
+    logs = defaultdict(list)
+    total, correct = [], []
+    for task_id, test_results in enumerate(all_test_results):
+        for completion_id, result in enumerate(test_results["results"]):
+            passed = result["status"] == "OK" and result["exit_code"] == 0
+            if passed:
+                log = "passed"
+            elif result["status"] == "Timeout":
+                log = "timed out"
+            else:
+                log = f"failed: {result['status']}\n{result['stderr'] or result['stdout']}"
+            logs[task_id].append(
+                (completion_id, dict(task_id=task_id, completion_id=completion_id, passed=passed, result=log))
+            )
+        total.append(len(test_results["results"]))
+        correct.append(sum(log["passed"] for _, log in logs[task_id]))
+    total = np.array(total)
+    correct = np.array(correct)
+    ks = k
+    results = {f"pass@{k}": estimate_pass_at_k(total, correct, k).mean() for k in ks if (total >= k).all()}
+    return results, logs
+
+
 class HumanEvalFixBase(HumanEvalPackGenerative):
     def get_filename_with_extension(self, input_file):
         """Returns the synthetic filename for different datasets"""
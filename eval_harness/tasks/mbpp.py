@@ -12,6 +12,7 @@ Homepage:: https://github.com/google-research/google-research/tree/master/mbpp
 
 from eval_harness.base import Task
 from eval_harness.tasks.custom_metrics.code_eval import compute_code_eval
+from eval_harness.tasks.custom_metrics.timeout_calibration import calibrate_timeouts, reference_solutions
 
 _CITATION = """
 @article{austin2021program,
@@ -79,8 +80,15 @@ class MBPP(Task):
         :param references: list(str)
             list of str containing refrences
         """
+        timeouts = calibrate_timeouts(
+            "sandbox",
+            reference_solutions(self, references, lambda doc: doc["code"]),
+            references,
+            timeout=3.0,
+        )
         results, _ = compute_code_eval(
             references=references,
             predictions=generations,
+            timeout=timeouts,
         )
         return results
@@ -7,18 +7,13 @@ It takes the OpenAI "HumanEval" Python benchmark and uses little transpilers to
 Homepage: https://nuprl.github.io/MultiPL-E/
 """
 
-import json
-import os
-import tempfile
-from pathlib import Path
 
 import numpy as np
 from datasets import load_dataset
-from tqdm import tqdm
 
 from eval_harness.base import Task
-from eval_harness.tasks.custom_metrics.multiple_metrics.evaluation import evaluate_problem
-from eval_harness.tasks.custom_metrics.multiple_metrics.single_experiment_pass_k import for_file
+from eval_harness.tasks.custom_metrics.multiple_metrics.evaluation import evaluate_problems, save_test_results
+from eval_harness.tasks.custom_metrics.multiple_metrics.single_experiment_pass_k import for_results
 
 
 _CITATION = """
@@ -81,9 +76,8 @@ class GeneralMultiPLE(Task):
     DATASET_NAME = None
     DATASET_REVISION = "f9fdbc55da90b963a9d53769179b777bbe0235b5"
 
-    def __init__(self, language, num_workers=16):
+    def __init__(self, language):
         self.language = language
-        self.workers = min(num_workers, os.cpu_count() - 1)
         self.DATASET_NAME = language
         # we need the dataset to get stop words for each language
         self.dataset = load_dataset(
@@ -134,35 +128,26 @@ class GeneralMultiPLE(Task):
             for i, doc in enumerate(self.get_dataset())
             if i < len(generations)
         ]
-        # a common temp dir for all the problems
-        temp_dir = tempfile.gettempdir()
-        list_files = []
-        for (prompt_name, generation, reference) in zip(
-            prompts_names, generations, references
-        ):
-            problem = {
+        problems = [
+            {
                 "name": prompt_name["name"],
                 "language": self.language,
                 "prompt": prompt_name["prompt"],
                 "completions": generation,
                 "tests": reference,
             }
-            # each problem is save in a json file
-            temp_file_name = os.path.join(temp_dir, f"{prompt_name['name']}.json")
-            list_files.append(temp_file_name)
-            with open(temp_file_name, "wt") as f:
-                json.dump(problem, f)
-        print(
-            f"Saved {len(list_files)} problems in {temp_dir} for evaluation, each problem has {len(generations[0])} completions"
-        )
+            for (prompt_name, generation, reference) in zip(
+                prompts_names, generations, references
+            )
+        ]
 
-        # execute the problems to evaluate them
-        for file in tqdm(list_files):
-            evaluate_problem(temp_dir, file, self.workers)
+        # execute the completions of all the problems from a single work queue
+        test_results = evaluate_problems(problems)
+        save_test_results(test_results)
 
         # compute pass@k scores
         result_array = np.array(
-            [for_file(p) for p in Path(temp_dir).glob("*.results.json")]
+            [for_results(problem_results["results"]) for problem_results in test_results]
         )
         result = result_array.mean(axis=0)
         results = {
@@ -1,9 +1,10 @@
 """QuixBugs"""
 
 import re
+from collections import defaultdict
 
 from eval_harness.base import Task
-from eval_harness.tasks.custom_metrics.code_eval import compute_code_eval
+from eval_harness.tasks.custom_metrics.code_eval import compute_pass_at_k, stream_code_eval
 
 _CITATION = """
 @inproceedings{lin2017quixbugs,
@@ -119,14 +120,20 @@ class QuixBugs(Task):
         :param references: list(str)
             list of str containing refrences
         """
+        # All problems share a single stream, so that the small problems do not
+        # each pay for a pool of workers of their own.
+        jobs = (
+            (name, candidate, ref, 10) # Levenshtein distance is slow
+            for gen, (name, ref) in zip(generations, references)
+            for candidate in gen
+        )
+        problem_results = defaultdict(list)
+        for result in stream_code_eval(jobs):
+            problem_results[result["task_id"]].append((result["completion_id"], result))
+
         results = {}
-        for i, (gen, (name, ref)) in enumerate(zip(generations, references)):
-            sub_results, _ = compute_code_eval(
-                references=[ref],
-                predictions=[gen],
-                timeout=10, # Levenshtein distance is slow
-            )
-            results[name] = sub_results
+        for name, _ in references:
+            results[name] = compute_pass_at_k({name: problem_results[name]})
         # Provide average of all metrics computed
         if results:
             results["all"] = {
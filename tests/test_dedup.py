@@ -0,0 +1,36 @@
+import pytest
+
+from eval_harness.tasks.custom_metrics.dedup import group_candidates
+
+# Pairs of candidates that differ inside a literal containing a comment marker
+# or significant whitespace, and must not be merged.
+DIFFERENT_CANDIDATES = [
+    ("js", "const re = /a\\//; return x + 1;", "const re = /a\\//; return x + 2;"),
+    ("ts", "const re = /a\\//; return x + 1;", "const re = /a\\//; return x + 2;"),
+    ("rs", 'let p = r"C:\\"; x + 1', 'let p = r"C:\\"; x + 2'),
+    ("cs", 'var p = @"C:\\"; return x + 1;', 'var p = @"C:\\"; return x + 2;'),
+    ("rb", "s = %q{ #a}", "s = %q{ #b}"),
+    ("pl", "$s =~ s/a/ #b/;", "$s =~ s/a/ #c/;"),
+    ("lua", "local s = [=[ --a ]=]", "local s = [=[ --b ]=]"),
+    ("js", "const s = `a  \nb`;", "const s = `a\nb`;"),
+    ("go", "s := `a\n\nb`", "s := `a\nb`"),
+]
+
+
+@pytest.mark.parametrize("language, first, second", DIFFERENT_CANDIDATES)
+def test_different_candidates_are_not_merged(language, first, second):
+    assert group_candidates([first, second], language) == [[0], [1]]
+
+
+def test_identical_candidates_are_merged():
+    assert group_candidates(["x + 1", "x + 2", "x + 1"], "js") == [[0, 2], [1]]
+
+
+def test_python_candidates_are_merged_by_ast():
+    candidates = ["def f(x):\n    return x + 1\n", "def f(x):  # add one\n\n    return (x + 1)\n", "def f(x):\n    return x + 2\n"]
+    assert group_candidates(candidates, "python") == [[0, 1], [2]]
+
+
+def test_deduplication_can_be_disabled(monkeypatch):
+    monkeypatch.setenv("EVAL_HARNESS_DEDUPLICATE", "0")
+    assert group_candidates(["x + 1", "x + 1"], "js") == [[0], [1]]
@@ -0,0 +1,69 @@
+import shutil
+
+import pytest
+
+from eval_harness.tasks.custom_metrics.multiple_metrics.containerized_eval import eval_string_script
+
+pytestmark = pytest.mark.skipif(shutil.which("rustc") is None, reason="rustc is not installed")
+
+WRONG_ADD = """
+fn add(a: i32, b: i32) -> i32 {
+    a - b
+}
+"""
+
+CORRECT_ADD = """
+fn add(a: i32, b: i32) -> i32 {
+    a + b
+}
+"""
+
+# A test module a model may generate along with its candidate, which passes
+# for the wrong `add`.
+CANDIDATE_TESTS = """
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn test_add() {
+        assert_eq!(add(2, 0), 2);
+    }
+}
+"""
+
+# MultiPL-E tests are assertions in `main`.
+MULTIPLE_TESTS = """
+fn main() {
+    assert_eq!(add(1, 2), 3);
+}
+"""
+
+# HumanEvalPack tests are #[test] functions, with an empty `main`.
+HUMANEVALPACK_TESTS = """
+fn main() {}
+
+#[cfg(test)]
+mod humanevalpack_tests {
+    use super::*;
+
+    #[test]
+    fn test_add() {
+        assert_eq!(add(1, 2), 3);
+    }
+}
+"""
+
+
+def test_multiple_program_with_test_module_runs_main():
+    assert eval_string_script("rust", WRONG_ADD + CANDIDATE_TESTS + MULTIPLE_TESTS)["status"] == "Exception"
+    assert eval_string_script("rust", CORRECT_ADD + CANDIDATE_TESTS + MULTIPLE_TESTS)["status"] == "OK"
+
+
+def test_multiple_program_without_test_module():
+    assert eval_string_script("rust", WRONG_ADD + MULTIPLE_TESTS)["status"] == "Exception"
+
+
+def test_test_functions_run_the_test_harness():
+    assert eval_string_script("rust", WRONG_ADD + HUMANEVALPACK_TESTS, test_functions=True)["status"] == "Exception"
+    assert eval_string_script("rust", CORRECT_ADD + HUMANEVALPACK_TESTS, test_functions=True)["status"] == "OK"
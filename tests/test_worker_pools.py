@@ -0,0 +1,413 @@
+"""
+Parity of the persistent workers (see multiple_metrics/worker_pool.py) with the
+per-process evaluators: every program must get the same status from both.
+A language is skipped when the toolchain of either path is not installed.
+"""
+
+import shutil
+
+import pytest
+
+from eval_harness.tasks.custom_metrics.multiple_metrics import (
+    eval_clj,
+    eval_cs,
+    eval_fs,
+    eval_java,
+    eval_javascript,
+    eval_julia,
+    eval_r,
+    eval_scala,
+    eval_ts,
+)
+from eval_harness.tasks.custom_metrics.multiple_metrics.containerized_eval import eval_string_script
+
+POOLS = {
+    "clj": eval_clj.POOL,
+    "cs": eval_cs.POOL,
+    "fs": eval_fs.POOL,
+    "java": eval_java.POOL,
+    "jl": eval_julia.POOL,
+    "js": eval_javascript.POOL,
+    "r": eval_r.POOL,
+    "scala": eval_scala.POOL,
+    "ts": eval_ts.POOL,
+}
+
+# The commands both paths of the evaluator of each language need.
+TOOLCHAINS = {
+    "clj": ["clojure"],
+    "cs": ["dotnet", "csc", "mono"],
+    "fs": ["dotnet"],
+    "java": ["java", "javac"],
+    "jl": ["julia"],
+    "js": ["node"],
+    "r": ["Rscript"],
+    "scala": ["scala", "scalac"],
+    "ts": ["node", "tsc"],
+}
+
+PROGRAMS = {
+    "clj": {
+        "ok": """
+(defn add [a b] (+ a b))
+(println (add 1 2))
+(require '[clojure.test :refer [deftest is run-test]])
+(def candidate add)
+(deftest test-humaneval
+  (is (= (candidate 1 2) 3)))
+(run-test test-humaneval)
+""",
+        "assertion": """
+(defn add [a b] (- a b))
+(require '[clojure.test :refer [deftest is run-test]])
+(def candidate add)
+(deftest test-humaneval
+  (is (= (candidate 1 2) 3)))
+(run-test test-humaneval)
+""",
+        "error": """
+(defn add [a b] (throw (IllegalStateException. "boom")))
+(require '[clojure.test :refer [deftest is run-test]])
+(def candidate add)
+(deftest test-humaneval
+  (is (= (candidate 1 2) 3)))
+(run-test test-humaneval)
+""",
+        "no tests": """
+(defn add [a b] (+ a b))
+(println "0 failures")
+""",
+        "long output": """
+(defn add [a b] (+ a b))
+(dotimes [i 1000] (println "line" i))
+(require '[clojure.test :refer [deftest is run-test]])
+(def candidate add)
+(deftest test-humaneval
+  (is (= (candidate 1 2) 3)))
+(run-test test-humaneval)
+""",
+        "exception": """
+(throw (IllegalStateException. "boom"))
+""",
+        "syntax": """
+(defn add [a b] (+ a b)
+""",
+        "exit": """
+(System/exit 3)
+""",
+    },
+    "cs": {
+        "ok": """
+using System;
+using System.Diagnostics;
+class Problem {
+    public static long Add(long a, long b) { return a + b; }
+    public static void Main(string[] args) {
+        Console.WriteLine(Add(1, 2));
+        Debug.Assert(Add(1, 2) == 3);
+    }
+}
+""",
+        "assertion": """
+using System;
+using System.Diagnostics;
+class Problem {
+    public static long Add(long a, long b) { return a - b; }
+    public static void Main(string[] args) {
+        Debug.Assert(Add(1, 2) == 3);
+    }
+}
+""",
+        "exception": """
+using System;
+class Problem {
+    public static void Main(string[] args) {
+        throw new InvalidOperationException("boom");
+    }
+}
+""",
+        "syntax": """
+class Problem {
+    public static void Main(string[] args) {
+        long x = ;
+    }
+}
+""",
+    },
+    "fs": {
+        "ok": """
+let add a b = a + b
+printfn "%d" (add 1 2)
+if add 1 2 <> 3 then failwith "add"
+""",
+        "exception": """
+let add a b = a - b
+if add 1 2 <> 3 then failwith "add"
+""",
+        "syntax": """
+let add a b = a +
+""",
+        "exit": """
+exit 3
+""",
+    },
+    "java": {
+        "ok": """
+import java.util.*;
+class Problem {
+    public static long add(long a, long b) { return a + b; }
+    public static void main(String[] args) {
+        System.out.println(add(1, 2));
+        assert(add(1, 2) == 3);
+    }
+}
+""",
+        "assertion": """
+class Problem {
+    public static long add(long a, long b) { return a - b; }
+    public static void main(String[] args) {
+        assert(add(1, 2) == 3);
+    }
+}
+""",
+        "exception": """
+class Problem {
+    public static void main(String[] args) {
+        throw new IllegalStateException("boom");
+    }
+}
+""",
+        "syntax": """
+class Problem {
+    public static void main(String[] args) {
+        long x = ;
+    }
+}
+""",
+        "exit": """
+class Problem {
+    public static void main(String[] args) {
+        System.exit(3);
+    }
+}
+""",
+        "public class": """
+import java.util.*;
+public class Main {
+    public static void main(String[] args) {
+        List<Integer> xs = new ArrayList<>(Arrays.asList(3, 1, 2));
+        Collections.sort(xs);
+        if (!xs.equals(Arrays.asList(1, 2, 3))) {
+            throw new AssertionError();
+        }
+    }
+}
+""",
+    },
+    "jl": {
+        "ok": """
+using Test
+
+function add(a::Int64, b::Int64)::Int64
+    return a + b
+end
+
+println(add(1, 2))
+
+@testset begin
+    candidate = add;
+    @test(candidate(1, 2) == 3)
+end
+""",
+        "assertion": """
+using Test
+
+function add(a::Int64, b::Int64)::Int64
+    return a - b
+end
+
+@testset begin
+    candidate = add;
+    @test(candidate(1, 2) == 3)
+end
+""",
+        "exception": """
+error("boom")
+""",
+        "syntax": """
+function add(a::Int64, b::Int64)::Int64
+    return a +
+""",
+        "exit": """
+exit(3)
+""",
+        "redefinition": """
+const x = 1
+f() = x
+@assert f() == 1
+""",
+    },
+    "js": {
+        "ok": """
+const assert = require('node:assert');
+function add(a, b) { return a + b; }
+console.log(add(1, 2));
+assert.deepEqual(add(1, 2), 3);
+""",
+        "assertion": """
+const assert = require('node:assert');
+function add(a, b) { return a - b; }
+assert.deepEqual(add(1, 2), 3);
+""",
+        "reference": """
+const assert = require('node:assert');
+assert.deepEqual(sub(1, 2), 3);
+""",
+        "syntax": """
+function add(a, b) { return a + ; }
+""",
+        "exception": """
+throw new Error("boom");
+""",
+        "exit": """
+process.exit(3);
+""",
+    },
+    "scala": {
+        "ok": """
+import scala.collection.mutable._
+object Problem {
+    def add(a : Long, b : Long) : Long = a + b
+    def main(args: Array[String]) = {
+    println(add(1L, 2L))
+    assert(add(1L, 2L) == (3L));
+    }
+}
+""",
+        "assertion": """
+object Problem {
+    def add(a : Long, b : Long) : Long = a - b
+    def main(args: Array[String]) = {
+    assert(add(1L, 2L) == (3L));
+    }
+}
+""",
+        "exception": """
+object Problem {
+    def main(args: Array[String]) = {
+    throw new IllegalStateException("boom")
+    }
+}
+""",
+        "syntax": """
+object Problem {
+    def main(args: Array[String]) = {
+    val x : Long =
+    }
+}
+""",
+        "stderr": """
+object Problem {
+    def main(args: Array[String]) = {
+    System.err.println("warning")
+    }
+}
+""",
+        "exit": """
+object Problem {
+    def main(args: Array[String]) = {
+    System.exit(3)
+    }
+}
+""",
+    },
+    "r": {
+        "ok": """
+add <- function(a, b) {
+    a + b
+}
+print(add(1, 2))
+test_humaneval <- function() {
+candidate <- add
+    if(!identical(candidate(1, 2), 3)){quit('no', 1)}
+}
+test_humaneval()
+""",
+        "assertion": """
+add <- function(a, b) {
+    a - b
+}
+test_humaneval <- function() {
+candidate <- add
+    if(!identical(candidate(1, 2), 3)){quit('no', 1)}
+}
+test_humaneval()
+""",
+        "exception": """
+stop("boom")
+""",
+        "syntax": """
+add <- function(a, b) {
+    a +
+}
+""",
+        "warning": """
+x <- as.integer("a")
+""",
+    },
+    "ts": {
+        "ok": """
+declare var require: any;
+const assert = require('node:assert');
+function add(a: number, b: number): number { return a + b; }
+assert.deepEqual(add(1, 2), 3);
+""",
+        "assertion": """
+declare var require: any;
+const assert = require('node:assert');
+function add(a: number, b: number): number { return a - b; }
+assert.deepEqual(add(1, 2), 3);
+""",
+        "type error": """
+let x: number = "a";
+""",
+        "exception": """
+throw new Error("boom");
+""",
+    },
+}
+
+
+def evaluate(monkeypatch, language, program, persistent_workers):
+    monkeypatch.setenv("EVAL_HARNESS_PERSISTENT_WORKERS", "1" if persistent_workers else "0")
+    return eval_string_script(language, program)
+
+
+@pytest.mark.parametrize(
+    "language, case", [(language, case) for language, programs in PROGRAMS.items() for case in programs]
+)
+def test_worker_matches_process(monkeypatch, language, case):
+    missing = [command for command in TOOLCHAINS[language] if shutil.which(command) is None]
+    if missing:
+        pytest.skip(f"{', '.join(missing)} not installed")
+    program = PROGRAMS[language][case]
+    per_process = evaluate(monkeypatch, language, program, persistent_workers=False)
+    worker = evaluate(monkeypatch, language, program, persistent_workers=True)
+    # Otherwise the evaluator fell back to a process per candidate.
+    assert POOLS[language]._unavailable is None, POOLS[language]._unavailable
+    assert worker["status"] == per_process["status"], (worker, per_process)
+    if case in ("ok", "long output"):
+        assert worker["status"] == "OK", worker
+
+
+@pytest.mark.skipif(shutil.which("Rscript") is None, reason="Rscript not installed")
+def test_r_worker_resets_global_environment(monkeypatch):
+    monkeypatch.setenv("EVAL_HARNESS_PERSISTENT_WORKERS", "1")
+    leaking = 'helper <<- function() 3\nset.seed(1)\nlibrary(stats4)\n'
+    assert eval_string_script("r", leaking)["status"] == "OK"
+    checking = (
+        'if (exists("helper") || exists(".Random.seed", envir = globalenv())) quit("no", 1)\n'
+        'if ("package:stats4" %in% search()) quit("no", 1)\n'
+    )
+    assert eval_string_script("r", checking)["status"] == "OK"
+    assert eval_r.POOL._unavailable is None, eval_r.POOL._unavailable